@@ -0,0 +1,99 @@
+"""
+Concurrent-request throughput: sync threadpool path vs async session path.
+
+Mounts a copy of the previous synchronous `/appointments/available` handler
+(plain `def` on `get_db`) next to the async one and fires the same concurrent
+load at both through an in-process ASGI transport.
+
+    python -m benchmarks.async_throughput [requests] [concurrency]
+
+Against SQLite both paths serialize on the file, so run it with DATABASE_URL
+pointing at Postgres to see the effect of freeing threadpool threads. Once
+concurrency exceeds the threadpool (40) the sync path can starve: threads block
+on pool checkout while the sessions holding connections wait for a thread to
+finish serializing and close, until QueuePool times out.
+"""
+import asyncio
+import datetime
+import sys
+import time
+from typing import List
+
+import httpx
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session, joinedload
+
+from benchmarks.common import reset_schema, summarize
+from src import db
+from src.appointment import models as appointment_models, schemas
+from src.auth.models import User
+from src.main import app
+from src.profiles import models as profile_models
+
+sync_router = APIRouter()
+
+
+@sync_router.get("/bench/sync-available", response_model=List[schemas.Appointment])
+def sync_available(limit: int = 50, db: Session = Depends(db.get_db)):
+    return db.query(appointment_models.Appointment).options(
+        joinedload(appointment_models.Appointment.doctor).joinedload(profile_models.Doctor.user)
+    ).filter(appointment_models.Appointment.status == "available").order_by(
+        appointment_models.Appointment.appointment_datetime, appointment_models.Appointment.id
+    ).limit(limit).all()
+
+
+def seed(doctors=20, slots_per_doctor=100):
+    start = datetime.datetime(2026, 1, 1, 9)
+    with db.SessionLocal() as session:
+        for n in range(doctors):
+            user = User(username=f"bench_doc_{n}", hashed_password="x", role="doctor", first_name="D", last_name=str(n))
+            session.add(profile_models.Doctor(user=user, specialization="general"))
+        session.flush()
+        doctor_ids = [d.doctor_id for d in session.query(profile_models.Doctor)]
+        session.add_all(
+            appointment_models.Appointment(doctor_profile_id=doctor_id, appointment_datetime=start + datetime.timedelta(minutes=15 * i))
+            for doctor_id in doctor_ids for i in range(slots_per_doctor)
+        )
+        session.commit()
+
+
+async def run(client, path, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                response.raise_for_status()
+            except Exception as exc:  # pool timeouts surface here under overload
+                errors.append(exc)
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return len(latencies) / (time.perf_counter() - start), latencies, errors
+
+
+async def main(total, concurrency):
+    reset_schema()
+    seed()
+    app.include_router(sync_router)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for label, path in (("sync (threadpool + get_db)", "/bench/sync-available?limit=50"),
+                            ("async (get_async_db)", "/appointments/available?limit=50")):
+            await run(client, path, min(total, 50), concurrency)  # warm-up
+            throughput, latencies, errors = await run(client, path, total, concurrency)
+            summarize(f"{label} {throughput:7.1f} req/s", latencies or [0.0])
+            if errors:
+                print(f"{'':<40} {len(errors)} failed, first: {errors[0]!r}")
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main(total, concurrency))
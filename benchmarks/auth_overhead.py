@@ -0,0 +1,58 @@
+"""
+Per-request authentication overhead on a protected endpoint.
+
+Measures the authentication dependency in isolation, since a full in-process
+request is dominated by ASGI/test-client overhead:
+
+- "before": decode the JWT, query `users`, then lazy-load the profile the way
+  handlers used to (`current_user.doctor_profile.doctor_id`).
+- "principal cache miss": decode the JWT and load the principal in one query.
+- "principal cache hit": decode the JWT and read the cached principal.
+
+    python -m benchmarks.auth_overhead
+"""
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from benchmarks.common import StatementCounter, reset_schema, signup_and_login, summarize, timed
+from src.auth import models
+from src.auth.dependencies import get_current_user
+from src.auth.principal import principal_cache
+from src.config import settings
+from src.db import SessionLocal
+from src.main import app
+
+ITERATIONS = 5000
+
+
+def main():
+    reset_schema()
+    client = TestClient(app)
+    token = signup_and_login(client, "bench_doctor", "doctor")["Authorization"].split()[1]
+
+    def before():
+        with SessionLocal() as db:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            user = db.query(models.User).filter(models.User.username == payload["sub"]).first()
+            return user.doctor_profile.doctor_id
+
+    def after():
+        with SessionLocal() as db:
+            return get_current_user(token, db).doctor_id
+
+    def cold():
+        principal_cache.clear()
+        return after()
+
+    for label, fn in (("before (user query + profile lazy-load)", before),
+                      ("principal cache miss", cold),
+                      ("principal cache hit", after)):
+        fn()
+        with StatementCounter() as counter:
+            samples = timed(fn, ITERATIONS)
+        summarize(label, samples)
+        print(f"{'':<40} statements/request={counter.count / ITERATIONS:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Concurrent bookings racing for a few popular slots.
+
+Fires `bookings` concurrent POST /appointments/{id}/book requests from distinct
+patients at `slots` slots through an in-process ASGI transport, first at a
+copy of the previous read-check-write handler and then at the atomic one.
+Reports throughput, the conflict (409) rate and double bookings: slots for
+which more than one request was told it succeeded.
+
+    python -m benchmarks.booking_contention [bookings] [slots]
+
+Run it with DATABASE_URL pointing at Postgres for real row-level contention;
+SQLite serializes writers on the file lock.
+"""
+import asyncio
+import datetime
+import random
+import sys
+import time
+from collections import Counter
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from benchmarks.common import reset_schema
+from src import db, utils
+from src.appointment import models as appointment_models
+from src.auth.dependencies import role_checker
+from src.auth.models import User
+from src.auth.principal import Principal, load_principal, principal_cache
+from src.main import app
+from src.profiles import models as profile_models
+
+legacy_router = APIRouter()
+
+
+@legacy_router.post("/bench/legacy-book/{appointment_id}")
+def legacy_book(
+    appointment_id: int,
+    db: Session = Depends(db.get_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient"])),
+):
+    appointment = db.query(appointment_models.Appointment).filter(appointment_models.Appointment.id == appointment_id).first()
+    if not appointment:
+        raise HTTPException(status_code=404, detail="Appointment slot not found")
+    if appointment.status != "available":
+        raise HTTPException(status_code=409, detail="Appointment slot is already booked")
+    appointment.patient_profile_id = current_user.patient_id
+    appointment.status = "booked"
+    db.commit()
+    return {"id": appointment_id}
+
+
+app.include_router(legacy_router)
+
+
+def seed_patients(count):
+    with db.SessionLocal() as session:
+        for n in range(count):
+            user = User(username=f"bench_patient_{n}", hashed_password="x", role="patient", first_name="P", last_name=str(n))
+            session.add(profile_models.Patient(user=user))
+        user = User(username="bench_doctor", hashed_password="x", role="doctor", first_name="D", last_name="0")
+        session.add(profile_models.Doctor(user=user, specialization="general"))
+        session.commit()
+        headers = []
+        for n in range(count):
+            # Logging in caches the principal; do the same so bookers skip the user lookup
+            principal = load_principal(session, f"bench_patient_{n}")
+            principal_cache.put(principal)
+            headers.append({"Authorization": "Bearer " + utils.create_access_token(principal.token_claims())})
+        return headers
+
+
+def seed_slots(count) -> list[int]:
+    start = datetime.datetime(2030, 1, 1, 9)
+    with db.SessionLocal() as session:
+        doctor_id = session.query(profile_models.Doctor.doctor_id).scalar()
+        slots = [
+            appointment_models.Appointment(doctor_profile_id=doctor_id, appointment_datetime=start + datetime.timedelta(minutes=15 * n))
+            for n in range(count)
+        ]
+        session.add_all(slots)
+        session.commit()
+        return [slot.id for slot in slots]
+
+
+async def race(client, path, headers, slot_ids):
+    targets = [random.choice(slot_ids) for _ in headers]
+
+    async def book(slot_id, auth):
+        response = await client.post(path.format(slot_id), headers=auth)
+        return slot_id, response.status_code
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(book(slot_id, auth) for slot_id, auth in zip(targets, headers)))
+    return results, time.perf_counter() - start
+
+
+def report(label, results, elapsed, slot_ids):
+    statuses = Counter(code for _, code in results)
+    winners = Counter(slot_id for slot_id, code in results if code == 200)
+    with db.SessionLocal() as session:
+        booked = session.query(appointment_models.Appointment).filter(
+            appointment_models.Appointment.id.in_(slot_ids), appointment_models.Appointment.status == "booked"
+        ).count()
+    double = sum(1 for count in winners.values() if count > 1)
+    print(
+        f"{label:<22} {len(results) / elapsed:8.1f} req/s  200={statuses[200]:<4} 409={statuses[409]:<4} "
+        f"other={sum(v for k, v in statuses.items() if k not in (200, 409)):<3} "
+        f"conflict rate={statuses[409] / len(results):.1%}  slots booked={booked}/{len(slot_ids)}  "
+        f"double-booked slots={double}"
+    )
+
+
+async def main(bookings, slots):
+    reset_schema()
+    headers = seed_patients(bookings)
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for label, path in (("read-check-write", "/bench/legacy-book/{}"), ("atomic update", "/appointments/{}/book")):
+            slot_ids = seed_slots(slots)
+            results, elapsed = await race(client, path, headers, slot_ids)
+            report(label, results, elapsed, slot_ids)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 300,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+    ))
@@ -0,0 +1,109 @@
+"""
+Calendar months from the counters versus counting appointments.
+
+Seeds `doctors` doctors with `years` years of 16 slots per weekday, builds the
+per-day counters with `calendar.rebuild`, then times one doctor's month and the
+all-doctor month served from the counters against the equivalent GROUP BY
+over the appointments table.
+
+    python -m benchmarks.calendar_counters [doctors] [years]
+"""
+import asyncio
+import datetime
+import random
+import sys
+import time
+
+from sqlalchemy import func, insert, select
+
+from benchmarks.common import reset_schema
+from src.appointment import calendar
+from src.appointment import models as appointment_models
+from src.auth import models as auth_models
+from src.db import AsyncSessionLocal, SessionLocal
+from src.profiles import models as profile_models
+
+Appointment = appointment_models.Appointment
+STATUSES = ["completed"] * 6 + ["cancelled"] * 2 + ["available"] * 2
+
+
+def seed(doctors, years):
+    today = datetime.date.today()
+    first = today - datetime.timedelta(days=365 * years)
+    rng = random.Random(7)
+    with SessionLocal() as db:
+        for i in range(doctors):
+            user = auth_models.User(username=f"calendar_doctor_{i}", hashed_password="x", role="doctor")
+            db.add(profile_models.Doctor(user=user, specialization="General", village=f"Village {i % 10}"))
+        db.commit()
+        doctor_ids = db.execute(select(profile_models.Doctor.doctor_id)).scalars().all()
+        rows = []
+        day = first
+        while day <= today + datetime.timedelta(days=28):
+            if day.weekday() < 5:
+                for doctor_id in doctor_ids:
+                    for slot in range(16):
+                        when = datetime.datetime.combine(day, datetime.time(9)) + datetime.timedelta(minutes=30 * slot)
+                        rows.append({
+                            "doctor_profile_id": doctor_id,
+                            "appointment_datetime": when,
+                            "status": rng.choice(STATUSES) if day < today else "available",
+                        })
+            if len(rows) >= 20_000:
+                db.execute(insert(Appointment.__table__), rows)
+                rows = []
+            day += datetime.timedelta(days=1)
+        if rows:
+            db.execute(insert(Appointment.__table__), rows)
+        calendar.rebuild(db)
+        db.commit()
+        return doctor_ids, db.query(func.count(Appointment.id)).scalar()
+
+
+async def scan_doctor_month(db, doctor_id, first, following):
+    day = func.date(Appointment.appointment_datetime)
+    return (await db.execute(select(day, Appointment.status, func.count()).where(
+        Appointment.doctor_profile_id == doctor_id,
+        Appointment.appointment_datetime >= datetime.datetime.combine(first, datetime.time.min),
+        Appointment.appointment_datetime < datetime.datetime.combine(following, datetime.time.min),
+    ).group_by(day, Appointment.status))).all()
+
+
+async def scan_district_month(db, first, following):
+    day = func.date(Appointment.appointment_datetime)
+    return (await db.execute(select(day, Appointment.status, func.count()).where(
+        Appointment.appointment_datetime >= datetime.datetime.combine(first, datetime.time.min),
+        Appointment.appointment_datetime < datetime.datetime.combine(following, datetime.time.min),
+    ).group_by(day, Appointment.status))).all()
+
+
+async def timed(label, runs, make_call):
+    async with AsyncSessionLocal() as db:
+        await make_call(db)  # warm-up
+        started = time.perf_counter()
+        for _ in range(runs):
+            await make_call(db)
+        elapsed = time.perf_counter() - started
+    print(f"{label:<34} {elapsed * 1000 / runs:8.2f} ms/request")
+
+
+async def measure(doctor_ids):
+    first, following = calendar.month_range(datetime.date.today().strftime("%Y-%m"))
+    doctor_id = doctor_ids[len(doctor_ids) // 2]
+    await timed("doctor month, counters", 200, lambda db: calendar.doctor_month(db, doctor_id, first, following))
+    await timed("doctor month, GROUP BY appointments", 200, lambda db: scan_doctor_month(db, doctor_id, first, following))
+    await timed("all doctors, counters", 50, lambda db: calendar.district_month(db, first, following))
+    await timed("all doctors, GROUP BY appointments", 50, lambda db: scan_district_month(db, first, following))
+    await timed("one village, counters", 50, lambda db: calendar.district_month(db, first, following, village="Village 3"))
+
+
+def main(doctors, years):
+    reset_schema()
+    started = time.perf_counter()
+    doctor_ids, appointments = seed(doctors, years)
+    print(f"seeded {appointments} appointments for {doctors} doctors in {time.perf_counter() - started:.1f}s")
+    asyncio.run(measure(doctor_ids))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50, int(sys.argv[2]) if len(sys.argv) > 2 else 3)
@@ -0,0 +1,119 @@
+"""Shared helpers for the scripts in this package.
+
+Every benchmark runs against the database named by DATABASE_URL (a throwaway
+SQLite file is used when it is unset) and drives the real FastAPI app in-process.
+"""
+import json
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+
+from sqlalchemy import event  # noqa: E402
+
+from src.db import Base, engine  # noqa: E402
+
+
+def reset_schema():
+    import src.main  # noqa: F401  imports every router and therefore every model
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+
+def signup_and_login(client, username, role, password="benchmark-pw"):
+    client.post("/auth/signup", json={
+        "username": username, "password": password, "role": role,
+        "first_name": username, "last_name": "Bench", "birthdate": "1990-01-01", "gender": "f",
+    })
+    response = client.post("/auth/login", data={"username": username, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+class StatementCounter:
+    """Counts statements sent to the database while active."""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self._on_execute)
+
+
+def timed(fn, iterations):
+    """Runs `fn` `iterations` times and returns per-call latencies in seconds."""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def summarize(label, samples):
+    ordered = sorted(samples)
+    pct = lambda p: _percentile(ordered, p) * 1e6
+    print(
+        f"{label:<40} n={len(samples):<6} mean={statistics.fmean(samples) * 1e6:9.1f}us "
+        f"p50={pct(0.50):9.1f}us p95={pct(0.95):9.1f}us p99={pct(0.99):9.1f}us"
+    )
+
+
+def latency_stats(samples, elapsed=None) -> dict:
+    """Recordable summary of latencies in seconds; throughput is per second of `elapsed` (or of the samples)."""
+    ordered = sorted(samples) or [0.0]
+    elapsed = elapsed or sum(samples) or 1.0
+    return {
+        "count": len(samples),
+        "throughput": len(samples) / elapsed,
+        "p50_ms": _percentile(ordered, 0.50) * 1e3,
+        "p95_ms": _percentile(ordered, 0.95) * 1e3,
+        "p99_ms": _percentile(ordered, 0.99) * 1e3,
+    }
+
+
+def add_result_arguments(parser):
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved earlier with --output")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before failing (0.2 = 20%%)")
+
+
+def record_results(results: dict, args, meta: dict | None = None) -> int:
+    """
+    Saves `results` (name -> latency_stats) when --output is given and checks
+    them against --baseline: a p95 more than `tolerance` above the baseline's,
+    or a throughput more than `tolerance` below it, is a regression. Returns
+    the process exit status, 1 when anything regressed.
+    """
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"meta": meta or {}, "results": results}, file, indent=2, sort_keys=True)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)["results"]
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + args.tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {current['p95_ms']:.2f}ms")
+        if current["throughput"] < before["throughput"] * (1 - args.tolerance):
+            regressions.append(f"{name}: throughput {before['throughput']:.1f}/s -> {current['throughput']:.1f}/s")
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
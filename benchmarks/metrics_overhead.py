@@ -0,0 +1,74 @@
+"""
+Per-request cost of MetricsMiddleware.
+
+Drives a bare ASGI app that answers immediately, with and without the
+middleware, on one event loop, so the difference is the collection cost alone:
+the in-flight gauge, the phase context, the query_stats scope and two
+histogram observations per phase. A request that also reports three phases
+(as an authenticated endpoint that queries and serializes does) is measured
+separately. Rendering /metrics is timed after the run.
+
+    python -m benchmarks.metrics_overhead [requests]
+"""
+import asyncio
+import sys
+import time
+
+from benchmarks.common import summarize  # first: sets DATABASE_URL
+from src.metrics import Metrics, MetricsMiddleware, add_phase
+from src.query_stats import begin_request
+
+SCOPE = {"type": "http", "method": "GET", "path": "/bench", "headers": []}
+START = {"type": "http.response.start", "status": 200, "headers": []}
+BODY = {"type": "http.response.body", "body": b"{}"}
+
+
+class _Route:
+    path = "/bench/{item_id}"
+
+
+async def bare(scope, receive, send):
+    scope["route"] = _Route
+    await send(START)
+    await send(BODY)
+
+
+async def with_phases(scope, receive, send):
+    add_phase("jwt", 0.00003)
+    begin_request()[0].seconds += 0.0004
+    add_phase("serialization", 0.00008)
+    await bare(scope, receive, send)
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def measure(app, requests):
+    samples = []
+    for _ in range(requests):
+        scope = dict(SCOPE)
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def main(requests):
+    registry = Metrics()
+    baseline = await measure(bare, requests)
+    summarize("bare app", baseline)
+    summarize("bare app + metrics", await measure(MetricsMiddleware(bare, registry), requests))
+    summarize("3 phases", await measure(with_phases, requests))
+    summarize("3 phases + metrics", await measure(MetricsMiddleware(with_phases, registry), requests))
+    start = time.perf_counter()
+    body = registry.render()
+    print(f"render /metrics: {(time.perf_counter() - start) * 1e3:.2f} ms, {len(body)} bytes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
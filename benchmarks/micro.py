@@ -0,0 +1,105 @@
+"""
+Micro-benchmarks for the per-request hot paths, without the database.
+
+- serialization: a 50-slot `/appointments/available` page (ORM objects with
+  doctor and user) validated against the response model and rendered by each
+  available JSON encoder, and the same page as projected rows (`fields=lite`);
+- auth: minting and decoding an access token, `get_current_user` on a
+  principal cache hit, and bcrypt verification at 4 rounds and at
+  BCRYPT_ROUNDS.
+
+Reports p50/p95/p99 and calls per second per case; --output and --baseline
+work as in `benchmarks.workload`.
+
+    python -m benchmarks.micro [--iterations 2000]
+"""
+import argparse
+import datetime
+import sys
+from typing import List
+
+from benchmarks.common import add_result_arguments, latency_stats, record_results, summarize, timed
+import src.main  # noqa: F401  configures every mapper
+from src.appointment import models as appointment_models, schemas
+from src.appointment.routes import APPOINTMENT_FIELDS
+from src.auth.dependencies import decode_token, get_current_user
+from src.auth.models import User
+from src.auth.principal import Principal, principal_cache
+from src.config import settings
+from src.profiles import models as profile_models
+from src.projection import render_rows
+from src.responses import JSON_ENCODERS, _adapter
+from src.utils import _crypt_context, create_access_token
+
+
+def appointment_page(size=50):
+    start = datetime.datetime(2026, 1, 5, 9)
+    doctors = [
+        profile_models.Doctor(
+            doctor_id=n, user_id=n, specialization="General Medicine", village="Nabha",
+            user=User(id=n, username=f"doctor{n}", hashed_password="x", role="doctor", first_name="Gurpreet", last_name="Singh"),
+        )
+        for n in range(1, 6)
+    ]
+    return [
+        appointment_models.Appointment(
+            id=n, doctor=doctors[n % len(doctors)], doctor_profile_id=doctors[n % len(doctors)].doctor_id,
+            appointment_datetime=start + datetime.timedelta(minutes=15 * n), status="available",
+            updated_at=start, version=1,
+        )
+        for n in range(size)
+    ]
+
+
+def serialization_cases():
+    """Label -> (function, relative cost); a case runs `iterations / cost` times."""
+    page = appointment_page()
+    adapter = _adapter(List[schemas.Appointment])
+    cases = {}
+    for name, encoder in JSON_ENCODERS.items():
+        cases[f"serialize.appointments50.{name}"] = (lambda encoder=encoder: encoder(
+            adapter.dump_python(adapter.validate_python(page, from_attributes=True), mode="json", by_alias=True)
+        ), 1)
+    names = APPOINTMENT_FIELDS.parse("lite")
+    rows = [
+        tuple(getattr(appointment, name, None) if name != "doctor_name" else "Gurpreet Singh" for name in names)
+        for appointment in page
+    ]
+    cases["serialize.appointments50.projection"] = (lambda: render_rows(names, rows), 1)
+    return cases
+
+
+def auth_cases():
+    principal = Principal(id=1, username="bench_doctor", role="doctor", doctor_id=1)
+    principal_cache.put(principal)
+    token = create_access_token(principal.token_claims())
+    cases = {
+        "auth.create_token": (lambda: create_access_token(principal.token_claims()), 1),
+        "auth.decode_token": (lambda: decode_token(token), 1),
+        "auth.current_user_cached": (lambda: get_current_user(token, None), 1),
+    }
+    for rounds in sorted({4, settings.BCRYPT_ROUNDS}):
+        context = _crypt_context(rounds)
+        hashed = context.hash("benchmark-pw")
+        # Each round doubles the cost; production settings take a quarter second per call
+        cases[f"auth.bcrypt_verify.r{rounds}"] = (
+            lambda context=context, hashed=hashed: context.verify("benchmark-pw", hashed), 2 ** (rounds - 4),
+        )
+    return cases
+
+
+def main(args) -> int:
+    results = {}
+    for label, (fn, cost) in {**serialization_cases(), **auth_cases()}.items():
+        fn()
+        samples = timed(fn, max(5, args.iterations // cost))
+        results[label] = latency_stats(samples)
+        summarize(f"{label} {results[label]['throughput']:9.0f}/s", samples)
+    return record_results(results, args, {"iterations": args.iterations, "bcrypt_rounds": settings.BCRYPT_ROUNDS})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.micro", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    add_result_arguments(parser)
+    sys.exit(main(parser.parse_args()))
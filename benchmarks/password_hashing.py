@@ -0,0 +1,82 @@
+"""
+Login storm vs. the rest of the API.
+
+Fires a burst of concurrent logins while a probe client keeps calling a cheap
+protected endpoint (GET /auth/me), once with bcrypt inline on the request
+threadpool (the previous behaviour) and once on the dedicated process pool
+with admission control. Reports login throughput, rejected (503) logins and
+the probe's latency percentiles.
+
+    python -m benchmarks.password_hashing [logins] [bcrypt_rounds]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import reset_schema, summarize
+from src import utils
+from src.main import app
+
+
+async def storm(client, logins, probe_headers):
+    probe_latencies = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            response = await client.get("/auth/me", headers=probe_headers)
+            if response.status_code == 200:
+                probe_latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.005)
+
+    async def login():
+        response = await client.post("/auth/login", data={"username": "storm_user", "password": "benchmark-pw"})
+        return response.status_code
+
+    probe_task = asyncio.create_task(probe())
+    start = time.perf_counter()
+    statuses = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+    return statuses, elapsed, probe_latencies
+
+
+async def main(logins, rounds):
+    reset_schema()
+    hasher = utils.password_hasher
+    hasher.rounds = rounds
+    # Under overload the inline mode fails with pool timeouts; count those as 500s
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for username in ("storm_user", "probe_user"):
+            await client.post("/auth/signup", json={
+                "username": username, "password": "benchmark-pw", "role": "patient",
+                "first_name": username, "last_name": "Bench", "birthdate": "1990-01-01", "gender": "f",
+            })
+        token = (await client.post("/auth/login", data={"username": "probe_user", "password": "benchmark-pw"})).json()["access_token"]
+        probe_headers = {"Authorization": f"Bearer {token}"}
+
+        modes = (
+            ("inline on request threadpool", 0, 10 ** 6),
+            ("process pool + admission control", hasher.workers or 2, 32),
+        )
+        for label, workers, max_pending in modes:
+            hasher.shutdown()
+            hasher.workers = workers
+            hasher.max_pending = hasher._free_slots = max_pending
+            statuses, elapsed, probe_latencies = await storm(client, logins, probe_headers)
+            ok = statuses.count(200)
+            print(f"{label}: {ok} logins in {elapsed:.2f}s ({ok / elapsed:.1f}/s), "
+                  f"{statuses.count(503)} rejected with 503, {statuses.count(500)} failed")
+            summarize("  /auth/me during storm", probe_latencies or [0.0])
+        hasher.shutdown()
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    asyncio.run(main(logins, rounds))
@@ -0,0 +1,69 @@
+"""
+Materializing recurring schedule templates into appointment slots.
+
+Creates doctors with a Monday-Friday 09:00-17:00 template of 15-minute slots
+and times generating their calendars for the given number of days, compared
+with inserting the same slots one ORM object per row and one commit per slot
+(the way `POST /appointments/` builds a calendar).
+
+    python -m benchmarks.schedule_generation [doctors] [days]
+"""
+import datetime
+import sys
+import time
+
+from benchmarks.common import StatementCounter, reset_schema
+from src.appointment import models as appointment_models
+from src.appointment import schedule
+from src.auth import models as auth_models
+from src.db import SessionLocal
+from src.profiles import models as profile_models
+
+
+def seed(db, doctors):
+    templates = []
+    for i in range(doctors):
+        user = auth_models.User(username=f"sched_doctor_{i}", hashed_password="x", role="doctor")
+        doctor = profile_models.Doctor(user=user, specialization="General", village=f"Village {i % 10}")
+        template = appointment_models.ScheduleTemplate(
+            doctor=doctor, start_time=datetime.time(9), end_time=datetime.time(17),
+            slot_minutes=15, valid_from=datetime.date.today(),
+        )
+        template.weekdays = range(5)
+        template.exceptions = []
+        db.add(template)
+        templates.append(template)
+    db.commit()
+    return templates
+
+
+def main(doctors, days):
+    reset_schema()
+    until = datetime.date.today() + datetime.timedelta(days=days)
+    with SessionLocal() as db:
+        templates = seed(db, doctors)
+        with StatementCounter() as counter:
+            start = time.perf_counter()
+            inserted = schedule.materialize(db, templates, until)
+            db.commit()
+            elapsed = time.perf_counter() - start
+        doctor_id = templates[0].doctor_profile_id
+        sample = schedule.slot_times(templates[0], datetime.date.today(), until)[:500]
+    print(f"templates: {doctors} doctors x {days} days -> {inserted} slots in {elapsed:.2f}s "
+          f"({inserted / elapsed:,.0f} slots/s, {counter.count} statements)")
+
+    # Baseline on a sample, one committed ORM insert per slot
+    with SessionLocal() as db:
+        start = time.perf_counter()
+        for when in sample:
+            db.add(appointment_models.Appointment(doctor_profile_id=doctor_id, appointment_datetime=when))
+            db.commit()
+        per_slot = (time.perf_counter() - start) / len(sample)
+    print(f"per-slot inserts: {per_slot * 1e3:.2f}ms/slot -> {per_slot * inserted:.1f}s estimated for the same calendar")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 91,
+    )
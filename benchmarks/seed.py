@@ -0,0 +1,340 @@
+"""
+Synthetic data for benchmarks and local development.
+
+Bulk-loads a district's worth of realistic data into an empty schema: 173
+villages with doctors, pharmacists and their pharmacies, ASHA workers and
+patients (most managed by an ASHA worker from their village), a weekday
+calendar of 16 morning slots per doctor (past slots mostly booked, future
+ones partly), a prescription with line items for most past bookings, stocked
+medicine catalogues per pharmacy, ASHA field logs and the calendar counters.
+
+At the default scale of 1.0 that is about 2.6 million appointments over 16
+weeks, a million medicines, 800 thousand prescriptions with 2 million items
+and 100 thousand patients; `--scale 0.01` loads in about a second. The same
+`--random-seed` produces the same rows, with dates anchored on the Monday
+eight weeks back so half of the calendar lies in the future.
+
+Rows are generated as tuples with explicit ids and written in batches: with
+COPY ... FROM STDIN on Postgres and executemany of Core inserts elsewhere.
+Column defaults that live in Python (`updated_at`, `normalized_name`) are
+filled in by the seeder, since COPY bypasses them. Every seeded user has the
+password SEED_PASSWORD, hashed once.
+
+    python -m benchmarks.seed [--scale 1.0] [--random-seed 1] [--reset]
+"""
+import argparse
+import collections
+import csv
+import datetime
+import io
+import random
+import time
+
+from sqlalchemy import func, insert, select, text
+
+from benchmarks.common import reset_schema
+from src import db
+from src.appointment import models as appointment_models
+from src.asha_worker import models as asha_models
+from src.auth import models as auth_models
+from src.pharmacy import models as pharmacy_models
+from src.pharmacy.search import normalize_medicine_name
+from src.prescriptions import items as prescription_items
+from src.prescriptions import models as prescription_models
+from src.profiles import models as profile_models
+from src.utils import pwd_context
+
+SEED_PASSWORD = "seed-password"
+
+_STEMS = (
+    "Agaul", "Alohran", "Bhadson", "Bhojomajri", "Bhoja", "Binaheri", "Bauran", "Chhintanwala", "Dandrala",
+    "Dhingi", "Duladi", "Ghanurki", "Gunike", "Haripur", "Ikolaha", "Jaspalon", "Kakrala", "Kaidupur",
+    "Kalsana", "Kameli", "Khokh", "Lubana", "Lohar Majra", "Mallewal", "Mandaur", "Matorda", "Nabha",
+    "Pedni", "Raipur", "Ramgarh", "Rohti", "Sadhu Garh", "Sahauli", "Shamaspur", "Sukhewal", "Thuhi",
+    "Tohra", "Todarwal", "Ucha Gaon", "Walipur", "Wazidpur", "Bishanpura", "Dulladi", "Galwatti",
+)
+_SUFFIXES = ("", " Kalan", " Khurd", " Chhanna")
+# The district's 173 villages; the same list on every run
+VILLAGES = [stem + suffix for suffix in _SUFFIXES for stem in _STEMS][:173]
+
+SPECIALIZATIONS = (
+    ("General Medicine", 40), ("Pediatrics", 12), ("Gynecology", 12), ("Orthopedics", 8), ("Dermatology", 6),
+    ("ENT", 6), ("Ophthalmology", 5), ("Cardiology", 4), ("Psychiatry", 4), ("Dentistry", 3),
+)
+FIRST_NAMES = (
+    "Gurpreet", "Harpreet", "Manpreet", "Jaspreet", "Amandeep", "Navdeep", "Simran", "Harjit", "Kulwinder",
+    "Baljit", "Rajinder", "Sukhwinder", "Paramjit", "Kamaljit", "Anita", "Sunita", "Pooja", "Ravi", "Sandeep",
+    "Ramesh", "Suresh", "Neha", "Priya", "Arjun", "Karan", "Meena", "Gurdeep", "Jasleen", "Inderjit", "Lakhvir",
+)
+LAST_NAMES = (
+    "Singh", "Kaur", "Sharma", "Gill", "Sandhu", "Dhillon", "Sidhu", "Brar", "Grewal", "Bains", "Verma",
+    "Kumar", "Garg", "Bansal", "Goyal", "Mittal", "Chahal", "Virk", "Randhawa", "Bajwa",
+)
+_GENERICS = (
+    "Paracetamol", "Ibuprofen", "Diclofenac", "Aceclofenac", "Aspirin", "Amoxicillin", "Azithromycin",
+    "Ciprofloxacin", "Ofloxacin", "Levofloxacin", "Doxycycline", "Cefixime", "Cephalexin", "Metronidazole",
+    "Tinidazole", "Albendazole", "Ivermectin", "Fluconazole", "Clotrimazole", "Acyclovir", "Metformin",
+    "Glimepiride", "Gliclazide", "Sitagliptin", "Insulin Glargine", "Amlodipine", "Telmisartan", "Losartan",
+    "Atenolol", "Metoprolol", "Enalapril", "Ramipril", "Hydrochlorothiazide", "Furosemide", "Spironolactone",
+    "Atorvastatin", "Rosuvastatin", "Clopidogrel", "Warfarin", "Omeprazole", "Pantoprazole", "Rabeprazole",
+    "Ranitidine", "Domperidone", "Ondansetron", "Loperamide", "ORS", "Zinc", "Lactulose", "Bisacodyl",
+    "Cetirizine", "Levocetirizine", "Loratadine", "Montelukast", "Salbutamol", "Budesonide", "Prednisolone",
+    "Dexamethasone", "Hydrocortisone", "Levothyroxine", "Carbimazole", "Iron Folic Acid", "Folic Acid",
+    "Calcium Carbonate", "Vitamin D3", "Vitamin B Complex", "Methylcobalamin", "Multivitamin", "Ascorbic Acid",
+    "Diazepam", "Alprazolam", "Sertraline", "Fluoxetine", "Amitriptyline", "Phenytoin", "Carbamazepine",
+    "Sodium Valproate", "Levetiracetam", "Gabapentin", "Pregabalin", "Tramadol", "Chlorpheniramine",
+    "Dextromethorphan", "Ambroxol", "Guaifenesin", "Mefenamic Acid", "Dicyclomine", "Hyoscine",
+    "Nitrofurantoin", "Tamsulosin", "Finasteride", "Misoprostol", "Oxytocin", "Mebendazole", "Permethrin",
+    "Silver Sulfadiazine", "Mupirocin", "Povidone Iodine", "Chloramphenicol", "Tobramycin", "Timolol",
+    "Artemether", "Chloroquine", "Primaquine", "Isoniazid", "Rifampicin", "Pyrazinamide", "Ethambutol",
+)
+_STRENGTHS = ("", " 50mg", " 100mg", " 250mg", " 500mg", " 650mg", " 5mg", " 10mg", " 20mg", " 40mg")
+_FORMS = ("Tablet", "Capsule", "Syrup", "Injection")
+# About 4,400 distinct product names; pharmacies stock a random subset
+MEDICINE_CATALOGUE = [f"{generic}{strength} {form}" for generic in _GENERICS for strength in _STRENGTHS for form in _FORMS]
+
+SLOT_TIMES = [datetime.time(9 + minute // 60, minute % 60) for minute in range(0, 240, 15)]
+DOSAGES = ("once daily", "twice daily", "three times daily", "at bedtime", "after meals", "as needed")
+
+
+class Loader:
+    """
+    Buffers rows per table and writes them in batches. A table's parents are
+    flushed before it, so foreign keys always point at rows already written.
+    """
+
+    def __init__(self, connection, batch_size: int):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.copy = connection.dialect.name == "postgresql"
+        self.order = [table.name for table in db.Base.metadata.sorted_tables]
+        self.columns: dict[str, tuple] = {}
+        self.buffers: dict[str, list] = collections.defaultdict(list)
+        self.counts: collections.Counter = collections.Counter()
+
+    def add(self, table, columns: tuple, row: tuple):
+        self.columns[table.name] = columns
+        buffer = self.buffers[table.name]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(table.name)
+
+    def flush(self, up_to: str | None = None):
+        """Writes the buffers of `up_to` and every table it may reference; all tables when None."""
+        names = self.order if up_to is None else self.order[:self.order.index(up_to) + 1]
+        for name in names:
+            rows = self.buffers.get(name)
+            if rows:
+                self._write(name, self.columns[name], rows)
+                self.counts[name] += len(rows)
+                rows.clear()
+
+    def _write(self, name: str, columns: tuple, rows: list):
+        if self.copy:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor = self.connection.connection.dbapi_connection.cursor()
+            try:
+                cursor.copy_expert(f"COPY {name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            finally:
+                cursor.close()
+        else:
+            table = db.Base.metadata.tables[name]
+            self.connection.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+    def reset_sequences(self):
+        """Moves Postgres id sequences past the explicit ids."""
+        if not self.copy:
+            return
+        for name in self.counts:
+            column = db.Base.metadata.tables[name].autoincrement_column
+            if column is not None:
+                self.connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{name}', '{column.name}'), "
+                    f"(SELECT coalesce(max({column.name}), 0) + 1 FROM {name}), false)"
+                ))
+
+
+def _scaled(value: float, scale: float, minimum: int = 1) -> int:
+    return max(minimum, round(value * scale))
+
+
+def _person(rng: random.Random, username: str, role: str, hashed_password: str) -> tuple:
+    birthdate = datetime.date(1950, 1, 1) + datetime.timedelta(days=rng.randrange(365 * 55))
+    return (
+        username, hashed_password, role, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+        birthdate, rng.choice(("m", "f")),
+    )
+
+
+def _prescription_items(rng: random.Random) -> list[dict]:
+    items = []
+    for generic in rng.sample(_GENERICS, rng.choice((1, 2, 2, 3, 3, 4))):
+        items.append({
+            "name": f"{generic}{rng.choice(_STRENGTHS)}".strip(),
+            "dosage": rng.choice(DOSAGES),
+            "quantity": rng.choice((None, 5, 10, 14, 15, 30)),
+        })
+    return items
+
+
+def seed(scale: float = 1.0, random_seed: int = 1, batch_size: int = 20000, log=print) -> dict:
+    """Loads the dataset into the (empty) schema and returns the row count per table."""
+    rng = random.Random(random_seed)
+    doctors = _scaled(2000, scale)
+    pharmacies = _scaled(1000, scale)
+    asha_workers = _scaled(600, scale)
+    patients = _scaled(100_000, scale, minimum=10)
+    # Catalogues only shrink for small datasets, so pharmacies stay realistically stocked
+    medicines_per_pharmacy = _scaled(1000, min(1.0, scale * 10), minimum=20)
+    logs_per_asha_worker = 50
+
+    today = datetime.date.today()
+    first_day = today - datetime.timedelta(days=today.weekday() + 56)
+    days = [first_day + datetime.timedelta(days=n) for n in range(112)]
+    now = datetime.datetime.combine(today, datetime.time())
+    hashed_password = pwd_context.hash(SEED_PASSWORD)
+    started = time.perf_counter()
+
+    with db.engine.begin() as connection:
+        if connection.execute(select(func.count()).select_from(auth_models.User)).scalar():
+            raise SystemExit("The users table is not empty; run with --reset to reseed from scratch")
+        loader = Loader(connection, batch_size)
+        users = auth_models.User.__table__
+        user_columns = ("id", "username", "hashed_password", "role", "first_name", "last_name", "birthdate", "gender")
+        user_id = 0
+
+        def add_user(username, role):
+            nonlocal user_id
+            user_id += 1
+            loader.add(users, user_columns, (user_id, *_person(rng, username, role, hashed_password)))
+            return user_id
+
+        weights = [weight for _, weight in SPECIALIZATIONS]
+        doctor_villages = []
+        for doctor_id in range(1, doctors + 1):
+            village = rng.choice(VILLAGES)
+            doctor_villages.append(village)
+            loader.add(
+                profile_models.Doctor.__table__, ("doctor_id", "user_id", "specialization", "village"),
+                (doctor_id, add_user(f"doctor{doctor_id}", "doctor"),
+                 rng.choices(SPECIALIZATIONS, weights)[0][0], village),
+            )
+        for pharmacy_id in range(1, pharmacies + 1):
+            village = rng.choice(VILLAGES)
+            name = f"{village} Medical Store {pharmacy_id}"
+            loader.add(
+                profile_models.Pharmacist.__table__, ("pharmacist_id", "user_id", "pharmacy_name"),
+                (pharmacy_id, add_user(f"pharmacist{pharmacy_id}", "pharmacist"), name),
+            )
+            loader.add(
+                pharmacy_models.Pharmacy.__table__, ("id", "name", "location", "pharmacist_id"),
+                (pharmacy_id, name, village, pharmacy_id),
+            )
+        asha_villages = []
+        for asha_worker_id in range(1, asha_workers + 1):
+            village = VILLAGES[(asha_worker_id - 1) % len(VILLAGES)]
+            asha_villages.append(village)
+            loader.add(
+                profile_models.ASHAWorker.__table__, ("asha_worker_id", "user_id", "village_assigned"),
+                (asha_worker_id, add_user(f"asha{asha_worker_id}", "asha_worker"), village),
+            )
+        for patient_id in range(1, patients + 1):
+            managed_by = rng.randint(1, asha_workers) if rng.random() < 0.7 else None
+            loader.add(
+                profile_models.Patient.__table__, ("patient_id", "user_id", "managed_by_asha_id"),
+                (patient_id, add_user(f"patient{patient_id}", "patient"), managed_by),
+            )
+        log(f"profiles: {user_id} users ({time.perf_counter() - started:.1f}s)")
+
+        medicines = pharmacy_models.Medicine.__table__
+        medicine_columns = ("id", "name", "normalized_name", "quantity", "pharmacy_id", "updated_at")
+        normalized = {name: normalize_medicine_name(name) for name in MEDICINE_CATALOGUE}
+        medicine_id = 0
+        for pharmacy_id in range(1, pharmacies + 1):
+            for name in rng.sample(MEDICINE_CATALOGUE, medicines_per_pharmacy):
+                medicine_id += 1
+                quantity = 0 if rng.random() < 0.1 else rng.randint(1, 500)
+                loader.add(medicines, medicine_columns, (medicine_id, name, normalized[name], quantity, pharmacy_id, now))
+        log(f"medicines: {medicine_id} ({time.perf_counter() - started:.1f}s)")
+
+        appointments = appointment_models.Appointment.__table__
+        appointment_columns = ("id", "doctor_profile_id", "patient_profile_id", "appointment_datetime", "status", "updated_at")
+        prescriptions = prescription_models.Prescription.__table__
+        prescription_columns = (
+            "id", "appointment_id", "doctor_id", "patient_id", "notes", "medications", "created_at", "updated_at",
+        )
+        items = prescription_models.PrescriptionItem.__table__
+        item_columns = ("id", "prescription_id", "position", "name", "normalized_name", "dosage", "quantity")
+        counters = appointment_models.CalendarDay.__table__
+        appointment_id = prescription_id = item_id = 0
+        for doctor_id in range(1, doctors + 1):
+            per_day = collections.Counter()
+            for day in days:
+                if day.weekday() >= 5:
+                    continue
+                past = day < today
+                for slot in SLOT_TIMES:
+                    appointment_id += 1
+                    when = datetime.datetime.combine(day, slot)
+                    roll = rng.random()
+                    if roll < (0.7 if past else 0.3):
+                        status, patient_id = "booked", rng.randint(1, patients)
+                    elif roll < (0.78 if past else 0.33):
+                        status, patient_id = "cancelled", None
+                    else:
+                        status, patient_id = "available", None
+                    per_day[day, status] += 1
+                    loader.add(appointments, appointment_columns, (appointment_id, doctor_id, patient_id, when, status, when))
+                    if past and patient_id is not None and rng.random() < 0.9:
+                        prescription_id += 1
+                        entries = _prescription_items(rng)
+                        written = when + datetime.timedelta(minutes=10)
+                        loader.add(prescriptions, prescription_columns, (
+                            prescription_id, appointment_id, doctor_id, patient_id, "Review after a week",
+                            prescription_items.format_medications(entries), written, written,
+                        ))
+                        for row in prescription_items.item_rows(entries):
+                            item_id += 1
+                            loader.add(items, item_columns, (
+                                item_id, prescription_id, row["position"], row["name"], row["normalized_name"],
+                                row["dosage"], row["quantity"],
+                            ))
+            for (day, status), slots in sorted(per_day.items()):
+                loader.add(counters, ("doctor_profile_id", "day", "status", "slots"), (doctor_id, day, status, slots))
+        log(f"appointments: {appointment_id}, prescriptions: {prescription_id} ({time.perf_counter() - started:.1f}s)")
+
+        field_logs = asha_models.FieldLog.__table__
+        log_columns = ("id", "asha_worker_id", "patient_profile_id", "village", "client_id", "note", "recorded_at", "received_at")
+        log_id = 0
+        for asha_worker_id in range(1, asha_workers + 1):
+            for n in range(logs_per_asha_worker):
+                log_id += 1
+                recorded = now - datetime.timedelta(minutes=rng.randrange(60 * 24 * 56))
+                loader.add(field_logs, log_columns, (
+                    log_id, asha_worker_id, rng.randint(1, patients), asha_villages[asha_worker_id - 1],
+                    f"seed-{asha_worker_id}-{n}", "Home visit: vitals recorded", recorded, recorded,
+                ))
+
+        loader.flush()
+        loader.reset_sequences()
+    log(f"loaded {sum(loader.counts.values())} rows in {time.perf_counter() - started:.1f}s")
+    return dict(loader.counts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.seed", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on the default volumes")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=20000, help="rows per insert batch or COPY")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args(argv)
+    if args.reset:
+        reset_schema()
+    for table, count in seed(args.scale, args.random_seed, args.batch_size).items():
+        print(f"{table:<24} {count:>10,}")
+
+
+if __name__ == "__main__":
+    main()
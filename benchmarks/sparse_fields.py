@@ -0,0 +1,105 @@
+"""
+Full response models versus `fields=` projections on the list endpoints.
+
+Seeds a doctor with `rows` appointments (half of them booked by patients), a
+pharmacy with `rows` medicines and a patient with `rows // 10` prescriptions,
+then requests each list with the full response model, the `lite` profile and
+a minimal field list. Reports rows serialized per second and uncompressed
+bytes per row. The hot response cache is disabled so every request queries.
+
+    python -m benchmarks.sparse_fields [rows] [requests]
+"""
+import datetime
+import os
+import sys
+import time
+
+os.environ["HOT_CACHE_TTL_SECONDS"] = "0"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from benchmarks.common import reset_schema, signup_and_login  # noqa: E402
+from src import db  # noqa: E402
+from src.appointment import models as appointment_models  # noqa: E402
+from src.auth.models import User  # noqa: E402
+from src.main import app  # noqa: E402
+from src.pharmacy import models as pharmacy_models  # noqa: E402
+from src.prescriptions import items as prescription_items  # noqa: E402
+from src.prescriptions import models as prescription_models  # noqa: E402
+from src.profiles import models as profile_models  # noqa: E402
+
+
+def seed(rows):
+    start = datetime.datetime(2026, 1, 5, 9)
+    with db.SessionLocal() as session:
+        doctor = session.query(profile_models.Doctor).one()
+        patient = session.query(profile_models.Patient).one()
+        pharmacist = session.query(profile_models.Pharmacist).one()
+        patients = [patient.patient_id]
+        for n in range(20):
+            user = User(username=f"sparse_patient_{n}", hashed_password="x", role="patient", first_name="P", last_name=str(n))
+            extra = profile_models.Patient(user=user)
+            session.add(extra)
+            session.flush()
+            patients.append(extra.patient_id)
+        session.add_all(
+            appointment_models.Appointment(
+                doctor_profile_id=doctor.doctor_id,
+                appointment_datetime=start + datetime.timedelta(minutes=15 * i),
+                status="booked" if i % 2 else "available",
+                patient_profile_id=patients[i % len(patients)] if i % 2 else None,
+            )
+            for i in range(rows)
+        )
+        pharmacy = pharmacy_models.Pharmacy(name="Sparse Pharmacy", location="Village 1", pharmacist_id=pharmacist.pharmacist_id)
+        session.add(pharmacy)
+        session.flush()
+        session.add_all(
+            pharmacy_models.Medicine(name=f"Medicine {i}", quantity=i % 50, pharmacy_id=pharmacy.id) for i in range(rows)
+        )
+        for i in range(rows // 10):
+            entries = prescription_items.parse_medications(f"Paracetamol 500mg x{i % 9 + 1}, ORS sachets, Zinc 20mg x14")
+            session.add(prescription_models.Prescription(
+                doctor_id=doctor.doctor_id, patient_id=patient.patient_id, notes="Follow up in a week",
+                medications=prescription_items.format_medications(entries),
+                items=[prescription_models.PrescriptionItem(**row) for row in prescription_items.item_rows(entries)],
+            ))
+        session.commit()
+        return pharmacy.id
+
+
+def measure(client, label, path, headers, params, requests):
+    body = b""
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, params=params, headers={**headers, "Accept-Encoding": "identity"})
+        response.raise_for_status()
+        body = response.content
+    elapsed = time.perf_counter() - started
+    count = len(response.json())
+    print(
+        f"{label:<44} {count * requests / elapsed:>10,.0f} rows/s  {len(body) / max(count, 1):>7.1f} bytes/row  "
+        f"{elapsed * 1000 / requests:>7.2f} ms/request"
+    )
+
+
+def main(rows, requests):
+    reset_schema()
+    with TestClient(app) as client:
+        doctor = signup_and_login(client, "sparse_doctor", "doctor")
+        patient = signup_and_login(client, "sparse_patient", "patient")
+        signup_and_login(client, "sparse_pharmacist", "pharmacist")  # seed() attaches the pharmacy to this profile
+        pharmacy_id = seed(rows)
+        cases = [
+            ("/appointments/doctor/me", doctor, "id,appointment_datetime,status"),
+            (f"/pharmacies/{pharmacy_id}/medicines", {}, "id,quantity"),
+            ("/prescriptions/me", patient, "id,created_at"),
+        ]
+        for path, headers, minimal in cases:
+            measure(client, f"{path} (full)", path, headers, {}, requests)
+            measure(client, f"{path} (lite)", path, headers, {"fields": "lite"}, requests)
+            measure(client, f"{path} ({minimal})", path, headers, {"fields": minimal}, requests)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, int(sys.argv[2]) if len(sys.argv) > 2 else 20)
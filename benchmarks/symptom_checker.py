@@ -0,0 +1,104 @@
+"""
+Symptom-checker assessments per second.
+
+Generates random questionnaire answers and times the compiled rule engine with
+a cold memo (every answer set evaluated), with a warm memo (repeated answer
+sets, the common case for short questionnaires) and through `assess_many`,
+compared with interpreting the rule definitions directly for every request.
+No database is involved.
+
+    python -m benchmarks.symptom_checker [answer_sets]
+"""
+import json
+import random
+import sys
+import time
+
+from src.symptom_checker.engine import DEFAULT_RULES_PATH, RuleEngine
+
+
+def random_answers(questions, rng):
+    answers = {}
+    for question in questions:
+        kind = question.get("type", "boolean")
+        if kind == "boolean":
+            answers[question["id"]] = rng.random() < 0.25
+        elif kind == "choice":
+            answers[question["id"]] = rng.choice(question["options"])
+        elif rng.random() < 0.5:
+            bounds = [bound for low, high in question["bands"].values() for bound in (low, high) if bound is not None]
+            answers[question["id"]] = round(rng.uniform(min(bounds) - 5, max(bounds) + 5), 1)
+    return answers
+
+
+def interpret(definition, answers):
+    """Evaluates the rule definitions against raw answers, as a naive implementation would."""
+    findings = set()
+    for question in definition["questions"]:
+        value = answers.get(question["id"])
+        kind = question.get("type", "boolean")
+        if kind == "boolean" and value is True:
+            findings.add(question["id"])
+        elif kind == "choice" and value is not None:
+            findings.add(f"{question['id']}.{value}")
+        elif kind == "number" and value is not None:
+            for name, (low, high) in question.get("bands", {}).items():
+                if (low is None or value >= low) and (high is None or value < high):
+                    findings.add(f"{question['id']}.{name}")
+    matched = []
+    for rule in definition["rules"]:
+        groups = [(rule["any"], rule.get("min_any", 1))] if rule.get("any") else []
+        groups += [(group["any"], group.get("min", 1)) for group in rule.get("groups", ())]
+        if (
+            all(name in findings for name in rule.get("all", ()))
+            and not any(name in findings for name in rule.get("none", ()))
+            and all(sum(name in findings for name in names) >= minimum for names, minimum in groups)
+        ):
+            matched.append(rule)
+    severities = definition["severities"]
+    matched.sort(key=lambda rule: severities.index(rule["severity"]))
+    return matched[0]["severity"] if matched else definition["default"]["severity"]
+
+
+def rate(label, count, elapsed):
+    print(f"{label:<28} {count / elapsed:>12,.0f} assessments/s  ({elapsed * 1e6 / count:.2f} us each)")
+
+
+def main(count):
+    with open(DEFAULT_RULES_PATH, encoding="utf-8") as handle:
+        definition = json.load(handle)
+    rng = random.Random(42)
+    answer_sets = [random_answers(definition["questions"], rng) for _ in range(count)]
+
+    engine = RuleEngine(definition, memo_size=0)
+    started = time.perf_counter()
+    for answers in answer_sets:
+        engine.assess(answers)
+    rate("engine, no memo", count, time.perf_counter() - started)
+
+    engine = RuleEngine(definition, memo_size=count)
+    started = time.perf_counter()
+    for answers in answer_sets:
+        engine.assess(answers)
+    rate("engine, cold memo", count, time.perf_counter() - started)
+    started = time.perf_counter()
+    for answers in answer_sets:
+        engine.assess(answers)
+    rate("engine, warm memo", count, time.perf_counter() - started)
+    started = time.perf_counter()
+    engine.assess_many(answer_sets)
+    rate("engine, assess_many (warm)", count, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for answers in answer_sets:
+        interpret(definition, answers)
+    rate("interpreted definitions", count, time.perf_counter() - started)
+
+    mismatches = sum(
+        engine.assess(answers).severity != interpret(definition, answers) for answers in answer_sets
+    )
+    print(f"distinct answer vectors: {len({engine.encode(answers) for answers in answer_sets})}, mismatches: {mismatches}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,183 @@
+"""
+Mixed workload against the real app on a seeded dataset.
+
+Seeds the schema with `benchmarks.seed` (or, with --no-seed, reuses a
+dataset it loaded earlier), then fires a fixed, seeded sequence of requests
+through an in-process ASGI transport with `concurrency` requests in flight:
+
+- browse (45%): GET /appointments/available from today, unfiltered or by a
+  village or specialization;
+- prescriptions (20%): GET /prescriptions/me as a patient;
+- inventory (15%): PUT /pharmacies/{id}/medicines/{id} as the pharmacist;
+- book (10%): POST /appointments/{id}/book on a distinct available slot;
+- login (10%): POST /auth/login, including bcrypt at BCRYPT_ROUNDS.
+
+Reports throughput and p50/p95/p99 per operation and overall. With --output
+the results are saved as JSON; with --baseline they are compared to an
+earlier run and the script exits with status 1 on a regression, so the same
+command can gate changes:
+
+    python -m benchmarks.workload --scale 0.01 --output baseline.json
+    python -m benchmarks.workload --scale 0.01 --baseline baseline.json
+
+Run it against Postgres for numbers that mean anything for production;
+SQLite serializes every write on the file lock.
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import sys
+import time
+
+import httpx
+from sqlalchemy import select
+
+from benchmarks import seed
+from benchmarks.common import add_result_arguments, latency_stats, record_results, reset_schema, summarize
+from src import db, utils
+from src.appointment import models as appointment_models
+from src.auth.principal import load_principal
+from src.config import settings
+from src.main import app
+from src.pharmacy import models as pharmacy_models
+
+OPERATIONS = (("browse", 45), ("prescriptions", 20), ("inventory", 15), ("book", 10), ("login", 10))
+USERS_PER_ROLE = 200
+
+
+def _tokens(usernames) -> dict:
+    """Access tokens minted directly, so only the login operation pays for bcrypt."""
+    tokens = {}
+    with db.SessionLocal() as session:
+        for username in usernames:
+            principal = load_principal(session, username)
+            if principal is not None:
+                tokens[username] = {"Authorization": f"Bearer {utils.create_access_token(principal.token_claims())}"}
+    return tokens
+
+
+def prepare(rng: random.Random, requests: int) -> dict:
+    """Users, slots and stock the operations draw from."""
+    Appointment = appointment_models.Appointment
+    Medicine = pharmacy_models.Medicine
+    Pharmacy = pharmacy_models.Pharmacy
+    with db.SessionLocal() as session:
+        patients = [f"patient{n}" for n in range(1, USERS_PER_ROLE + 1)]
+        pharmacies = session.execute(select(Pharmacy.id).order_by(Pharmacy.id).limit(USERS_PER_ROLE)).scalars().all()
+        stock = [
+            (pharmacy_id, session.execute(
+                select(Medicine.id).where(Medicine.pharmacy_id == pharmacy_id).limit(50)
+            ).scalars().all())
+            for pharmacy_id in pharmacies
+        ]
+        # Enough distinct future slots for every booking, spread over the calendar
+        slots = session.execute(
+            select(Appointment.id).where(
+                Appointment.status == "available",
+                Appointment.appointment_datetime >= datetime.datetime.combine(datetime.date.today(), datetime.time()),
+            ).order_by(Appointment.id).limit(requests)
+        ).scalars().all()
+    rng.shuffle(slots)
+    return {
+        "patients": _tokens(patients),
+        "pharmacists": _tokens(f"pharmacist{pharmacy_id}" for pharmacy_id, _ in stock),
+        "stock": [(pharmacy_id, medicine_ids) for pharmacy_id, medicine_ids in stock if medicine_ids],
+        "slots": slots,
+    }
+
+
+def plan(rng: random.Random, requests: int, data: dict) -> list:
+    """The request sequence: (operation, method, path, keyword arguments for httpx)."""
+    names = [name for name, _ in OPERATIONS]
+    weights = [weight for _, weight in OPERATIONS]
+    patients = list(data["patients"].items())
+    today = datetime.date.today().isoformat()
+    slots = list(data["slots"])
+    steps = []
+    for operation in rng.choices(names, weights, k=requests):
+        if operation == "book" and not slots:
+            operation = "browse"
+        if operation == "browse":
+            params = {"date_from": today, "limit": 20}
+            kind = rng.random()
+            if kind < 0.33:
+                params["village"] = rng.choice(seed.VILLAGES)
+            elif kind < 0.66:
+                params["specialization"] = rng.choice(seed.SPECIALIZATIONS)[0]
+            steps.append((operation, "GET", "/appointments/available", {"params": params}))
+        elif operation == "prescriptions":
+            steps.append((operation, "GET", "/prescriptions/me", {"headers": rng.choice(patients)[1]}))
+        elif operation == "inventory":
+            pharmacy_id, medicine_ids = rng.choice(data["stock"])
+            steps.append((operation, "PUT", f"/pharmacies/{pharmacy_id}/medicines/{rng.choice(medicine_ids)}", {
+                "headers": data["pharmacists"][f"pharmacist{pharmacy_id}"], "json": {"quantity": rng.randint(0, 500)},
+            }))
+        elif operation == "book":
+            steps.append((operation, "POST", f"/appointments/{slots.pop()}/book", {"headers": rng.choice(patients)[1]}))
+        else:
+            steps.append((operation, "POST", "/auth/login", {
+                "data": {"username": rng.choice(patients)[0], "password": seed.SEED_PASSWORD},
+            }))
+    return steps
+
+
+async def run(client, steps, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {name: [] for name, _ in OPERATIONS}
+    errors = {name: 0 for name, _ in OPERATIONS}
+
+    async def one(operation, method, path, options):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **options)
+                response.raise_for_status()
+            except Exception:
+                errors[operation] += 1
+            else:
+                latencies[operation].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*step) for step in steps))
+    return time.perf_counter() - start, latencies, errors
+
+
+async def main(args) -> int:
+    if not args.no_seed:
+        reset_schema()
+        seed.seed(args.scale, args.random_seed, log=lambda message: None)
+    rng = random.Random(args.random_seed)
+    data = prepare(rng, args.requests)
+    steps = plan(rng, args.requests, data)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await run(client, plan(random.Random(0), min(100, args.requests), {**data, "slots": []}), args.concurrency)
+        elapsed, latencies, errors = await run(client, steps, args.concurrency)
+    utils.password_hasher.shutdown()
+
+    results = {}
+    for name, samples in latencies.items():
+        results[name] = {**latency_stats(samples, elapsed), "errors": errors[name]}
+        summarize(f"{name} {results[name]['throughput']:7.1f} req/s", samples or [0.0])
+        if errors[name]:
+            print(f"{'':<40} {errors[name]} failed")
+    every = [sample for samples in latencies.values() for sample in samples]
+    results["total"] = {**latency_stats(every, elapsed), "errors": sum(errors.values())}
+    summarize(f"total {results['total']['throughput']:7.1f} req/s", every or [0.0])
+    meta = {
+        "database": db.engine.dialect.name, "scale": args.scale, "requests": args.requests,
+        "concurrency": args.concurrency, "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+    }
+    return record_results(results, args, meta)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.workload", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=0.01, help="dataset size, see benchmarks.seed")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--no-seed", action="store_true", help="run against the data already in the database")
+    add_result_arguments(parser)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,37 @@
+"""
+Creates an admin account; the signup endpoint refuses the admin role.
+
+    python create_admin.py <username>
+
+The password is prompted for, or read from ADMIN_PASSWORD when set.
+"""
+import getpass
+import os
+import sys
+
+from src.db import SessionLocal
+from src.utils import hash_password
+
+# Import all models so relationships resolve
+from src.auth.models import User
+from src.appointment.models import Appointment
+from src.pharmacy.models import Pharmacy, Medicine
+from src.profiles.models import Patient, Doctor, Pharmacist, ASHAWorker
+from src.prescriptions.models import Prescription
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.exit(__doc__)
+    username = sys.argv[1]
+    password = os.getenv("ADMIN_PASSWORD") or getpass.getpass(f"Password for {username}: ")
+    with SessionLocal() as db:
+        if db.query(User).filter(User.username == username).first():
+            sys.exit(f"User {username!r} already exists")
+        db.add(User(username=username, hashed_password=hash_password(password), role="admin"))
+        db.commit()
+    print(f"Admin {username!r} created.")
+
+
+if __name__ == "__main__":
+    main()
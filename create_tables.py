@@ -1,18 +1,25 @@
+"""
+Brings the database schema up to date without dropping anything.
+
+    python create_tables.py            # create a new schema or apply pending migrations
+    python create_tables.py --drop     # development only: drop every table first
+
+See src/migrations for the versioned migrations this runs.
+"""
+import sys
+
 from src.db import Base, engine
+from src.migrations import runner
+
 
-# Import all models here
-from src.auth.models import User
-from src.appointment.models import Appointment
-from src.pharmacy.models import Pharmacy, Medicine
-from src.profiles.models import Patient, Doctor, Pharmacist, ASHAWorker
-from src.prescriptions.models import Prescription
+def main():
+    if "--drop" in sys.argv[1:]:
+        runner.load_models()
+        print("Dropping all database tables...")
+        Base.metadata.drop_all(bind=engine)
+        print("Tables dropped.")
+    runner.upgrade(engine, log=print)
 
-print("Dropping all database tables...")
-# This command will drop all tables known to Base
-Base.metadata.drop_all(bind=engine)
-print("Tables dropped.")
 
-print("Creating all database tables...")
-# This command creates all tables
-Base.metadata.create_all(bind=engine)
-print("All tables created successfully.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Atomic slot booking.
+
+A booking is one conditional statement:
+
+    UPDATE appointments SET status = 'booked', patient_profile_id = :patient
+    WHERE id = :slot AND status = 'available' RETURNING id, ...
+
+The database re-checks the condition after acquiring the row, so of any number
+of concurrent bookers exactly one gets the row back and the others see no row
+and get a 409. The row lock is held only for the duration of the statement and
+commit, and nothing is read before the write. `updated_at` and `version` are
+bumped by the column onupdate defaults, so patient sync picks the booking up.
+The winner moves the slot from "available" to "booked" in the calendar
+counters before committing.
+Both booking endpoints are async, so a burst of bookers waits on the event
+loop rather than tying up threadpool threads while the pool is busy.
+"""
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from . import calendar
+from . import models as appointment_models
+from ..responses import hot_responses
+
+Appointment = appointment_models.Appointment
+
+
+async def book_slot(db, appointment_id: int, patient_profile_id: int | None) -> int:
+    """Books an available slot and commits. Raises 404 for an unknown slot and 409 if it is taken."""
+    table = Appointment.__table__
+    try:
+        booked = (await db.execute(
+            update(table)
+            .where(table.c.id == appointment_id, table.c.status == "available")
+            .values(status="booked", patient_profile_id=patient_profile_id)
+            .returning(table.c.id, table.c.doctor_profile_id, table.c.appointment_datetime)
+        )).first()
+        if booked is None:
+            # Lost the race or never existed; only now is a read worth its round trip.
+            # Nothing was written, so the session's close ends the transaction.
+            if (await db.execute(select(table.c.id).where(table.c.id == appointment_id))).scalar() is None:
+                raise HTTPException(status_code=404, detail="Appointment slot not found")
+            raise HTTPException(status_code=409, detail="Appointment slot is already booked")
+        _, doctor_id, when = booked
+        changes = calendar.deltas([(doctor_id, when, "available")], -1)
+        changes.update(calendar.deltas([(doctor_id, when, "booked")]))
+        await calendar.apply_async(db, changes)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Patient not found")
+    hot_responses.invalidate("appointments")
+    return booked.id
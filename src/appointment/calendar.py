@@ -0,0 +1,171 @@
+"""
+Per-day availability counters behind the calendar endpoints.
+
+`doctor_calendar_days` holds one row per doctor, day and status with the
+number of appointments in that state, so a month of a doctor's calendar is at
+most a few dozen rows read through the primary key, however many years of
+appointments lie behind it.
+
+The counters move in the same transaction as the appointments they count. ORM
+inserts, updates and deletes of appointments apply their deltas through the
+mapper events at the bottom of this module; Core statements (slot generation,
+bulk cancel/shift, booking) bypass those events and must pass their deltas to
+`apply` themselves. Deltas are written as one upsert in key order, so two
+transactions touching the same days lock the counter rows in the same order.
+`rebuild` recounts from the appointments table; migration 0006 runs it on
+databases that predate the counters, and it can be rerun after out-of-band
+edits.
+"""
+import datetime
+from collections import Counter
+
+from sqlalchemy import delete, event, func, inspect, select
+
+from . import models as appointment_models
+from .. import db as database
+from ..profiles import models as profile_models
+
+Appointment = appointment_models.Appointment
+CalendarDay = appointment_models.CalendarDay
+
+
+def deltas(slots, change: int = 1) -> Counter:
+    """Counter deltas for `(doctor_profile_id, appointment_datetime, status)` tuples."""
+    changes = Counter()
+    for doctor_id, when, slot_status in slots:
+        if doctor_id is not None:
+            changes[doctor_id, when.date(), slot_status] += change
+    return changes
+
+
+def _upsert(bind, changes: Counter):
+    rows = [
+        {"doctor_profile_id": doctor_id, "day": day, "status": slot_status, "slots": change}
+        for (doctor_id, day, slot_status), change in sorted(changes.items())
+        if change
+    ]
+    if not rows:
+        return None
+    table = CalendarDay.__table__
+    statement = database.dialect_insert(bind, table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.doctor_profile_id, table.c.day, table.c.status],
+        set_={"slots": table.c.slots + statement.excluded.slots},
+    )
+    return statement, rows
+
+
+def apply(db, changes: Counter):
+    """Adds `changes` to the counters on a Session or Connection; does not commit."""
+    upsert = _upsert(db, changes)
+    if upsert is not None:
+        db.execute(*upsert)
+
+
+async def apply_async(db, changes: Counter):
+    upsert = _upsert(db, changes)
+    if upsert is not None:
+        await db.execute(*upsert)
+
+
+def rebuild(db, doctor_ids=None):
+    """Recounts the counters (of the given doctors, or all) from the appointments; does not commit."""
+    day = func.date(Appointment.appointment_datetime)
+    counts = select(Appointment.doctor_profile_id, day, Appointment.status, func.count()).where(
+        Appointment.doctor_profile_id.is_not(None)
+    ).group_by(Appointment.doctor_profile_id, day, Appointment.status)
+    clear = delete(CalendarDay)
+    if doctor_ids is not None:
+        counts = counts.where(Appointment.doctor_profile_id.in_(doctor_ids))
+        clear = clear.where(CalendarDay.doctor_profile_id.in_(doctor_ids))
+    db.execute(clear)
+    rows = [
+        {
+            "doctor_profile_id": doctor_id,
+            # SQLite's date() returns text
+            "day": datetime.date.fromisoformat(slot_day) if isinstance(slot_day, str) else slot_day,
+            "status": slot_status,
+            "slots": count,
+        }
+        for doctor_id, slot_day, slot_status, count in db.execute(counts)
+    ]
+    if rows:
+        db.execute(CalendarDay.__table__.insert(), rows)
+    return len(rows)
+
+
+# --- Reading ---
+
+def month_range(month: str) -> tuple[datetime.date, datetime.date]:
+    """First day of a "YYYY-MM" month and of the month after it. Raises ValueError."""
+    first = datetime.date.fromisoformat(f"{month}-01")
+    following = (first + datetime.timedelta(days=32)).replace(day=1)
+    return first, following
+
+
+def _days(rows) -> list[dict]:
+    days = {}
+    for day, slot_status, count in rows:
+        if isinstance(day, str):
+            day = datetime.date.fromisoformat(day)
+        if count:
+            days.setdefault(day, {})[slot_status] = count
+    return [{"date": day, "counts": counts} for day, counts in sorted(days.items())]
+
+
+async def doctor_month(db, doctor_id: int, first: datetime.date, following: datetime.date) -> list[dict]:
+    rows = await db.execute(select(CalendarDay.day, CalendarDay.status, CalendarDay.slots).where(
+        CalendarDay.doctor_profile_id == doctor_id,
+        CalendarDay.day >= first,
+        CalendarDay.day < following,
+    ))
+    return _days(rows.all())
+
+
+async def district_month(
+    db, first: datetime.date, following: datetime.date, village: str | None = None, specialization: str | None = None
+) -> list[dict]:
+    """Counts summed over every doctor, or over those of a village and/or specialization."""
+    Doctor = profile_models.Doctor
+    query = select(CalendarDay.day, CalendarDay.status, func.sum(CalendarDay.slots)).where(
+        CalendarDay.day >= first,
+        CalendarDay.day < following,
+    ).group_by(CalendarDay.day, CalendarDay.status)
+    if village or specialization:
+        query = query.join(Doctor, Doctor.doctor_id == CalendarDay.doctor_profile_id)
+    if village:
+        query = query.where(func.lower(Doctor.village) == village.lower())
+    if specialization:
+        query = query.where(func.lower(Doctor.specialization) == specialization.lower())
+    return _days((await db.execute(query)).all())
+
+
+# --- Maintenance of ORM changes ---
+
+def _before(target):
+    """The counter key of the row as it was before this flush."""
+    key = []
+    for attribute in ("doctor_profile_id", "appointment_datetime", "status"):
+        history = inspect(target).attrs[attribute].history
+        key.append(history.deleted[0] if history.deleted else getattr(target, attribute))
+    return tuple(key)
+
+
+@event.listens_for(Appointment, "after_insert")
+def _count_insert(mapper, connection, target):
+    apply(connection, deltas([(target.doctor_profile_id, target.appointment_datetime, target.status)]))
+
+
+@event.listens_for(Appointment, "after_update")
+def _count_update(mapper, connection, target):
+    before = _before(target)
+    after = (target.doctor_profile_id, target.appointment_datetime, target.status)
+    if before != after:
+        changes = deltas([before], -1)
+        changes.update(deltas([after]))
+        apply(connection, changes)
+
+
+@event.listens_for(Appointment, "after_delete")
+def _count_delete(mapper, connection, target):
+    apply(connection, deltas([_before(target)], -1))
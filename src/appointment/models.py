@@ -1,9 +1,25 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+import datetime
+import json
+
+from sqlalchemy import Boolean, Column, Date, Integer, String, DateTime, ForeignKey, Index, Text, Time, text
 from sqlalchemy.orm import relationship
-from ..db import Base
+from ..db import Base, utcnow
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Serves the slot search: equality on status, range/keyset scan on time
+        Index("ix_appointments_status_datetime", "status", "appointment_datetime"),
+        # Serves the patient's delta sync and ETag lookups
+        Index("ix_appointments_patient_updated", "patient_profile_id", "updated_at", "id"),
+        # Serves materialization (existing slots) and bulk cancel/shift by doctor and range
+        Index("ix_appointments_doctor_datetime", "doctor_profile_id", "appointment_datetime"),
+        # A doctor has at most one open, booked or completed slot at a time; cancelled ones may repeat
+        Index(
+            "uq_appointments_doctor_datetime", "doctor_profile_id", "appointment_datetime", unique=True,
+            sqlite_where=text("status <> 'cancelled'"), postgresql_where=text("status <> 'cancelled'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     doctor_profile_id = Column(Integer, ForeignKey("doctors.doctor_id"))
@@ -11,7 +27,73 @@ class Appointment(Base):
     
     appointment_datetime = Column(DateTime, nullable=False)
     status = Column(String, default="available", nullable=False)
+    # Set on slots generated from a recurring schedule template
+    template_id = Column(Integer, ForeignKey("schedule_templates.id"), nullable=True, index=True)
+    # Latest symptom-checker summary for the doctor (see src/symptom_checker)
+    triage_report = Column(Text, nullable=True)
+
+    # Maintained on every UPDATE, including Core/bulk statements, for delta sync
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=text("version + 1"))
 
     # Make the relationships more explicit using foreign_keys
     doctor = relationship("Doctor", back_populates="appointments", foreign_keys=[doctor_profile_id])
-    patient = relationship("Patient", back_populates="appointments", foreign_keys=[patient_profile_id])
\ No newline at end of file
+    patient = relationship("Patient", back_populates="appointments", foreign_keys=[patient_profile_id])
+
+
+class CalendarDay(Base):
+    """Number of a doctor's appointments in each status on a day, kept current by calendar.py."""
+    __tablename__ = "doctor_calendar_days"
+    __table_args__ = (
+        # Serves the district calendar, which reads one month across doctors
+        Index("ix_doctor_calendar_days_day", "day"),
+    )
+
+    doctor_profile_id = Column(Integer, ForeignKey("doctors.doctor_id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    status = Column(String, primary_key=True)
+    slots = Column(Integer, nullable=False, default=0)
+
+
+class ScheduleTemplate(Base):
+    """
+    A doctor's weekly availability: slots of `slot_minutes` between `start_time`
+    and `end_time` on the given weekdays, from `valid_from` until `valid_until`
+    (open-ended when unset), skipping the `exceptions` dates. Slots are generated
+    into `appointments` up to `generated_until` (see schedule.py).
+    """
+    __tablename__ = "schedule_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_profile_id = Column(Integer, ForeignKey("doctors.doctor_id"), nullable=False, index=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    weekday_mask = Column(Integer, nullable=False)  # bit 0 = Monday ... bit 6 = Sunday
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    slot_minutes = Column(Integer, nullable=False)
+    valid_from = Column(Date, nullable=False)
+    valid_until = Column(Date, nullable=True)
+    exception_dates = Column(Text, nullable=False, default="[]")  # JSON list of ISO dates
+    active = Column(Boolean, nullable=False, default=True)
+
+    generated_until = Column(Date, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+
+    doctor = relationship("Doctor", foreign_keys=[doctor_profile_id])
+
+    @property
+    def weekdays(self) -> list[int]:
+        return [day for day in range(7) if self.weekday_mask >> day & 1]
+
+    @weekdays.setter
+    def weekdays(self, days):
+        self.weekday_mask = sum(1 << day for day in set(days))
+
+    @property
+    def exceptions(self) -> list[datetime.date]:
+        return [datetime.date.fromisoformat(day) for day in json.loads(self.exception_dates or "[]")]
+
+    @exceptions.setter
+    def exceptions(self, days):
+        self.exception_dates = json.dumps(sorted({day.isoformat() for day in days}))
@@ -1,18 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased, joinedload, contains_eager
 from typing import List
 import datetime
 
 # --- Module Imports ---
-from .. import db
-from . import schemas
+from .. import db, replicas, sync, utils
+from . import booking, schedule, schemas
 from . import models as appointment_models
-from ..auth import models as auth_models
 from ..profiles import models as profile_models
+from ..auth import models as auth_models
 from ..auth.dependencies import role_checker
+from ..auth.principal import Principal
+from ..projection import FieldSet, render_rows
+from ..responses import hot_responses, serialize
 
 router = APIRouter()
 
+_DoctorUser = aliased(auth_models.User, name="doctor_user")
+_PatientUser = aliased(auth_models.User, name="patient_user")
+_Appointment = appointment_models.Appointment
+_Doctor = profile_models.Doctor
+_Patient = profile_models.Patient
+
+# Fields for `?fields=` on the appointment lists (see projection.py)
+APPOINTMENT_FIELDS = FieldSet(
+    _Appointment,
+    fields={
+        "id": _Appointment.id,
+        "appointment_datetime": _Appointment.appointment_datetime,
+        "status": _Appointment.status,
+        "doctor_profile_id": _Appointment.doctor_profile_id,
+        "patient_profile_id": _Appointment.patient_profile_id,
+        "template_id": _Appointment.template_id,
+        "triage_report": _Appointment.triage_report,
+        "updated_at": _Appointment.updated_at,
+        "version": _Appointment.version,
+        "doctor_name": (_DoctorUser.first_name + " " + _DoctorUser.last_name, ("doctor", "doctor_user")),
+        "specialization": (_Doctor.specialization, ("doctor",)),
+        "village": (_Doctor.village, ("doctor",)),
+        "patient_name": (_PatientUser.first_name + " " + _PatientUser.last_name, ("patient", "patient_user")),
+    },
+    joins={
+        "doctor": (_Doctor, _Doctor.doctor_id == _Appointment.doctor_profile_id),
+        "doctor_user": (_DoctorUser, _DoctorUser.id == _Doctor.user_id),
+        "patient": (_Patient, _Patient.patient_id == _Appointment.patient_profile_id, True),
+        "patient_user": (_PatientUser, _PatientUser.id == _Patient.user_id, True),
+    },
+    profiles={"lite": ["id", "appointment_datetime", "status", "doctor_profile_id", "doctor_name"]},
+)
+
+_FIELDS = Query(None, description="Comma-separated fields, or a profile such as `lite`, for a flat projection")
+
+
+def _acting_doctor_id(db: Session, current_user: Principal, doctor_profile_id: int | None) -> int:
+    """Doctors act on their own calendar; ASHA workers must name an existing doctor."""
+    if current_user.role == "doctor":
+        return current_user.doctor_id
+    if not doctor_profile_id:
+        raise HTTPException(status_code=400, detail="doctor_profile_id is required for ASHA worker")
+    doctor_profile = db.query(profile_models.Doctor).filter(
+        profile_models.Doctor.doctor_id == doctor_profile_id
+    ).first()
+    if not doctor_profile:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    return doctor_profile.doctor_id
+
 
 # --- Endpoints ---
 
@@ -20,7 +76,7 @@ router = APIRouter()
 def create_appointment_slot(
     appointment_in: schemas.AppointmentCreate,
     db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["doctor", "asha_worker"]))
+    current_user: Principal = Depends(role_checker(allowed_roles=["doctor", "asha_worker"]))
 ):
     """
     Creates a new, available appointment slot.
@@ -35,24 +91,18 @@ def create_appointment_slot(
         appointment_in.appointment_time
     )
 
-    if current_user.role == "doctor":
-        doctor_profile = current_user.doctor_profile
-    else:
-        # ASHA worker must specify which doctor the slot is for
-        if not appointment_in.doctor_profile_id:
-            raise HTTPException(status_code=400, detail="doctor_profile_id is required for ASHA worker")
-        doctor_profile = db.query(profile_models.Doctor).filter(
-            profile_models.Doctor.doctor_id == appointment_in.doctor_profile_id
-        ).first()
-        if not doctor_profile:
-            raise HTTPException(status_code=404, detail="Doctor not found")
+    doctor_profile_id = _acting_doctor_id(db, current_user, appointment_in.doctor_profile_id)
 
     new_appointment = appointment_models.Appointment(
         appointment_datetime=appointment_datetime,
-        doctor=doctor_profile
+        doctor_profile_id=doctor_profile_id
     )
     db.add(new_appointment)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="The doctor already has a slot at this time")
     db.refresh(new_appointment)
 
     # Re-fetch the object with all relationships eagerly loaded to ensure a complete response
@@ -63,91 +113,301 @@ def create_appointment_slot(
     return created_appointment
 
 
+@router.post("/templates", status_code=status.HTTP_201_CREATED, response_model=schemas.ScheduleTemplate)
+def create_schedule_template(
+    template_in: schemas.ScheduleTemplateCreate,
+    db: Session = Depends(db.get_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["doctor", "asha_worker"]))
+):
+    """
+    Creates a recurring weekly availability template and generates its slots for the rolling horizon.
+
+    - **Security**: Doctors manage their own templates; ASHA workers must provide `doctor_profile_id`.
+    - `weekdays` uses 0 for Monday through 6 for Sunday; slots of `slot_minutes` fill `start_time`-`end_time`.
+    - No slots are generated on `exceptions` dates or outside `valid_from`-`valid_until`.
+    """
+    doctor_profile_id = _acting_doctor_id(db, current_user, template_in.doctor_profile_id)
+    return schedule.create_template(db, doctor_profile_id, current_user.id, template_in)
+
+
+@router.get("/templates", response_model=List[schemas.ScheduleTemplate])
+def list_schedule_templates(
+    doctor_profile_id: int | None = None,
+    db: Session = Depends(db.get_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["doctor", "asha_worker"]))
+):
+    """
+    Lists a doctor's schedule templates.
+
+    - **Security**: Doctors see their own; ASHA workers must provide `doctor_profile_id`.
+    """
+    doctor_profile_id = _acting_doctor_id(db, current_user, doctor_profile_id)
+    return db.query(appointment_models.ScheduleTemplate).filter(
+        appointment_models.ScheduleTemplate.doctor_profile_id == doctor_profile_id
+    ).order_by(appointment_models.ScheduleTemplate.id).all()
+
+
+@router.patch("/templates/{template_id}", response_model=schemas.ScheduleTemplate)
+def update_schedule_template(
+    template_id: int,
+    changes: schemas.ScheduleTemplateUpdate,
+    db: Session = Depends(db.get_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["doctor", "asha_worker"]))
+):
+    """
+    Changes a template's end date, exception dates or active flag.
+
+    - Future open slots of the template that no longer fit are removed; booked slots are kept.
+    - Dates the template covers again are regenerated for the rolling horizon.
+    """
+    template = db.query(appointment_models.ScheduleTemplate).filter(
+        appointment_models.ScheduleTemplate.id == template_id
+    ).first()
+    if not template:
+        raise HTTPException(status_code=404, detail="Schedule template not found")
+    if current_user.role == "doctor" and template.doctor_profile_id != current_user.doctor_id:
+        raise HTTPException(status_code=403, detail="Not your schedule template")
+    return schedule.update_template(db, template, changes)
+
+
+@router.post("/bulk/cancel", response_model=schemas.BulkSlotResult)
+def bulk_cancel_slots(
+    selection: schemas.BulkSlotSelection,
+    db: Session = Depends(db.get_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["doctor", "asha_worker"]))
+):
+    """
+    Cancels a doctor's slots between `date_from` and `date_to` (inclusive) in one statement.
+
+    - Only open slots are cancelled unless `include_booked` is set.
+    - `template_id` limits the operation to the slots generated from one template.
+    """
+    doctor_profile_id = _acting_doctor_id(db, current_user, selection.doctor_profile_id)
+    return {"affected": schedule.cancel_slots(db, doctor_profile_id, selection)}
+
+
+@router.post("/bulk/shift", response_model=schemas.BulkSlotResult)
+def bulk_shift_slots(
+    selection: schemas.BulkShift,
+    db: Session = Depends(db.get_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["doctor", "asha_worker"]))
+):
+    """
+    Moves a doctor's slots between `date_from` and `date_to` (inclusive) by `minutes`.
+
+    - Only open slots move unless `include_booked` is set.
+    - Fails with 409, changing nothing, if a slot would land on another of the doctor's slots.
+    """
+    doctor_profile_id = _acting_doctor_id(db, current_user, selection.doctor_profile_id)
+    return {"affected": schedule.shift_slots(db, doctor_profile_id, selection)}
+
+
 @router.get("/available", response_model=List[schemas.Appointment])
-def get_all_available_slots(db: Session = Depends(db.get_db)):
+async def get_all_available_slots(
+    request: Request,
+    date_from: datetime.date | None = None,
+    date_to: datetime.date | None = None,
+    doctor_id: int | None = None,
+    specialization: str | None = None,
+    village: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    fields: str | None = _FIELDS,
+    db: AsyncSession = Depends(replicas.get_async_read_db)
+):
     """
-    Fetches a list of all appointment slots that are currently 'available'.
+    Fetches a page of appointment slots that are currently 'available', ordered by time.
 
     - This is a public endpoint accessible by any user.
+    - Optional filters: `date_from`/`date_to` (inclusive), `doctor_id`, `specialization`, `village`.
+    - Results are keyset-paginated on `(appointment_datetime, id)`. When more slots exist, the
+      `X-Next-Cursor` response header carries the value to pass as `cursor` for the next page.
+    - Pages are served from the pre-compressed hot cache (`X-Cache: HIT`) until a slot changes.
+    - Slots from schedule templates are generated on demand for the rolling horizon (and up to
+      `date_to` when it reaches further).
+    - `fields` (e.g. `id,appointment_datetime,doctor_name` or `lite`) returns flat rows with only those fields.
     """
-    appointments = db.query(appointment_models.Appointment).options(
-        joinedload(appointment_models.Appointment.doctor).joinedload(profile_models.Doctor.user),
-        joinedload(appointment_models.Appointment.patient).joinedload(profile_models.Patient.user)
-    ).filter(
-        appointment_models.Appointment.status == "available"
-    ).all()
-    return appointments
+    names = APPOINTMENT_FIELDS.parse(fields)
+    horizon = schedule.horizon_end(date_to)
+    if schedule.needs_materialization(horizon):
+        await run_in_threadpool(schedule.materialize_due, horizon)
+
+    cached = hot_responses.get(request, "appointments")
+    if cached:
+        return cached
+
+    Appointment = appointment_models.Appointment
+    Doctor = profile_models.Doctor
+
+    conditions = [Appointment.status == "available"]
+    if date_from:
+        conditions.append(Appointment.appointment_datetime >= datetime.datetime.combine(date_from, datetime.time.min))
+    if date_to:
+        conditions.append(Appointment.appointment_datetime < datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min))
+    if doctor_id:
+        conditions.append(Appointment.doctor_profile_id == doctor_id)
+    if specialization:
+        conditions.append(func.lower(Doctor.specialization) == specialization.lower())
+    if village:
+        conditions.append(func.lower(Doctor.village) == village.lower())
+    if cursor:
+        try:
+            after_datetime, after_id = utils.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        conditions.append(
+            tuple_(Appointment.appointment_datetime, Appointment.id) > tuple_(after_datetime, after_id)
+        )
+    order = (Appointment.appointment_datetime, Appointment.id)
+
+    headers = {}
+    if names is not None:
+        # The keyset columns ride along at the end when not requested; rendering drops them
+        columns = names + [name for name in ("appointment_datetime", "id") if name not in names]
+        query = APPOINTMENT_FIELDS.select(columns, joins=("doctor",) if specialization or village else ())
+        # Fetch one extra row to learn whether another page exists
+        rows = (await db.execute(query.where(*conditions).order_by(*order).limit(limit + 1))).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            headers["X-Next-Cursor"] = utils.encode_cursor(
+                last[columns.index("appointment_datetime")], last[columns.index("id")]
+            )
+        return hot_responses.put(request, "appointments", render_rows(names, rows), headers)
+
+    query = select(Appointment).join(Appointment.doctor).join(Doctor.user).options(
+        contains_eager(Appointment.doctor).contains_eager(Doctor.user)
+    ).where(*conditions)
+
+    # Fetch one extra row to learn whether another page exists
+    result = await db.execute(query.order_by(*order).limit(limit + 1))
+    appointments = result.scalars().all()
+    if len(appointments) > limit:
+        appointments = appointments[:limit]
+        last = appointments[-1]
+        headers["X-Next-Cursor"] = utils.encode_cursor(last.appointment_datetime, last.id)
+    return hot_responses.put(request, "appointments", serialize(List[schemas.Appointment], appointments), headers)
 
 
 @router.get("/doctor/me", response_model=List[schemas.Appointment])
-def get_my_doctor_appointments(
-    db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["doctor"]))
+async def get_my_doctor_appointments(
+    fields: str | None = _FIELDS,
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["doctor"]))
 ):
     """
     Fetches all appointments (available, booked, etc.) for the currently logged-in doctor.
     
     - **Security**: Protected endpoint for 'doctor' roles only.
+    - `fields` (e.g. `id,appointment_datetime,status,patient_name` or `lite`) returns flat rows with only those fields.
     """
-    appointments = db.query(appointment_models.Appointment).options(
+    names = APPOINTMENT_FIELDS.parse(fields)
+    if names is not None:
+        rows = await db.execute(APPOINTMENT_FIELDS.select(names).where(
+            appointment_models.Appointment.doctor_profile_id == current_user.doctor_id
+        ))
+        return Response(content=render_rows(names, rows), media_type="application/json")
+    result = await db.execute(select(appointment_models.Appointment).options(
         joinedload(appointment_models.Appointment.doctor).joinedload(profile_models.Doctor.user),
         joinedload(appointment_models.Appointment.patient).joinedload(profile_models.Patient.user)
-    ).filter(
-        appointment_models.Appointment.doctor_profile_id == current_user.doctor_profile.doctor_id
-    ).all()
-    return appointments
+    ).where(
+        appointment_models.Appointment.doctor_profile_id == current_user.doctor_id
+    ))
+    return result.scalars().all()
+
+
+def _patient_appointment_options():
+    return (
+        joinedload(appointment_models.Appointment.doctor).joinedload(profile_models.Doctor.user),
+        joinedload(appointment_models.Appointment.patient).joinedload(profile_models.Patient.user),
+    )
 
 
 @router.get("/patient/me", response_model=List[schemas.Appointment])
-def get_my_patient_appointments(
-    db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["patient", "asha_worker"]))
+async def get_my_patient_appointments(
+    request: Request,
+    response: Response,
+    fields: str | None = _FIELDS,
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient", "asha_worker"]))
 ):
     """
     Fetches all appointments for the currently logged-in patient.
 
     - **Security**: Protected endpoint for 'patient' and 'asha_worker' roles.
+    - Send the last `ETag` back as `If-None-Match` to get a bodiless 304 when nothing changed.
+    - `fields` (e.g. `id,appointment_datetime,status,doctor_name` or `lite`) returns flat rows with only those fields.
     """
-    appointments = db.query(appointment_models.Appointment).options(
-        joinedload(appointment_models.Appointment.doctor).joinedload(profile_models.Doctor.user),
-        joinedload(appointment_models.Appointment.patient).joinedload(profile_models.Patient.user)
-    ).filter(
-        appointment_models.Appointment.patient_profile_id == current_user.patient_profile.patient_id
-    ).all()
-    return appointments
+    names = APPOINTMENT_FIELDS.parse(fields)
+    etag = await sync.collection_etag(db, appointment_models.Appointment, current_user.patient_id)
+    cached = sync.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if names is not None:
+        rows = await db.execute(APPOINTMENT_FIELDS.select(names).where(
+            appointment_models.Appointment.patient_profile_id == current_user.patient_id
+        ))
+        return Response(content=render_rows(names, rows), media_type="application/json", headers={
+            "ETag": etag, "Cache-Control": "private, no-cache",
+        })
+    result = await db.execute(select(appointment_models.Appointment).options(
+        *_patient_appointment_options()
+    ).where(
+        appointment_models.Appointment.patient_profile_id == current_user.patient_id
+    ))
+    return result.scalars().all()
+
+
+@router.get("/patient/me/sync", response_model=schemas.AppointmentSync)
+async def sync_my_patient_appointments(
+    since: str | None = None,
+    limit: int = Query(200, ge=1, le=1000),
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient", "asha_worker"]))
+):
+    """
+    Appointments changed since the `cursor` returned by the previous sync.
+
+    - Omit `since` for the first sync. Repeat with the new cursor while `has_more` is true.
+    - `deleted` lists ids that no longer belong to the patient.
+    """
+    try:
+        return await sync.fetch_changes(
+            db, appointment_models.Appointment, current_user.patient_id, since, limit,
+            options=_patient_appointment_options(),
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.post("/{appointment_id}/book", response_model=schemas.Appointment)
-def book_appointment_slot(
+async def book_appointment_slot(
     appointment_id: int,
-    db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["patient", "asha_worker"]))
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient"]))
 ):
     """
     Books an available appointment slot for the currently logged-in patient.
 
-    - **Security**: Protected endpoint for 'patient' and 'asha_worker' roles.
+    - **Security**: Protected endpoint for the 'patient' role; ASHA workers book through
+      `/asha_worker/book-for-patient`.
     - The `patient_id` is automatically assigned based on the logged-in user's token.
+    - Booking is a single conditional update: when several users race for a slot, one wins
+      and the others get 409.
     """
+    if current_user.patient_id is None:
+        raise HTTPException(status_code=403, detail="No patient profile for this user")
+    await booking.book_slot(db, appointment_id, current_user.patient_id)
+
     # Eagerly load the relationships for the response
-    appointment_to_book = db.query(appointment_models.Appointment).options(
-        joinedload(appointment_models.Appointment.doctor).joinedload(profile_models.Doctor.user)
-    ).filter(
+    result = await db.execute(select(appointment_models.Appointment).options(
+        *_patient_appointment_options()
+    ).where(
         appointment_models.Appointment.id == appointment_id
-    ).first()
-    
-    if not appointment_to_book:
-        raise HTTPException(status_code=404, detail="Appointment slot not found")
-        
-    if appointment_to_book.status != "available":
-        raise HTTPException(status_code=400, detail="Appointment slot is already booked")
-        
-    appointment_to_book.patient_profile_id = current_user.patient_profile.patient_id
-    appointment_to_book.status = "booked"
-    db.commit()
-    db.refresh(appointment_to_book)
-    
-    return appointment_to_book
+    ))
+    return result.scalars().first()
 
 
 @router.patch("/{appointment_id}", response_model=schemas.Appointment)
@@ -155,7 +415,7 @@ def update_appointment_status(
     appointment_id: int,
     update_in: schemas.AppointmentUpdate,
     db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["doctor"]))
+    current_user: Principal = Depends(role_checker(allowed_roles=["doctor"]))
 ):
     """
     Doctor updates appointment status (e.g., 'completed', 'cancelled').
@@ -163,10 +423,15 @@ def update_appointment_status(
     appt = db.query(appointment_models.Appointment).filter(appointment_models.Appointment.id == appointment_id).first()
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
-    if appt.doctor_profile_id != current_user.doctor_profile.doctor_id:
+    if appt.doctor_profile_id != current_user.doctor_id:
         raise HTTPException(status_code=403, detail="Not your appointment")
     appt.status = update_in.status
-    db.commit(); db.refresh(appt)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="The doctor already has another slot at this time")
+    db.refresh(appt)
     return appt
 
 
@@ -174,7 +439,7 @@ def update_appointment_status(
 def start_call(
     appointment_id: int,
     db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["doctor"]))
+    current_user: Principal = Depends(role_checker(allowed_roles=["doctor"]))
 ):
     """
     Creates/returns a channel name for video consultation for this appointment.
@@ -183,7 +448,7 @@ def start_call(
     appt = db.query(appointment_models.Appointment).filter(appointment_models.Appointment.id == appointment_id).first()
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
-    if appt.doctor_profile_id != current_user.doctor_profile.doctor_id:
+    if appt.doctor_profile_id != current_user.doctor_id:
         raise HTTPException(status_code=403, detail="Not your appointment")
     channel = f"appointment-{appointment_id}"
     return {"channel": channel}
\ No newline at end of file
@@ -0,0 +1,336 @@
+"""
+Recurring schedule templates and bulk slot operations.
+
+A template describes a doctor's weekly availability. Its slots are not stored
+until they are needed: `materialize` generates every slot between a template's
+`generated_until` watermark and the requested date and writes them with
+multi-row INSERTs, so a quarter of slots for a hundred doctors costs a few
+hundred statements instead of hundreds of thousands.
+
+Materialization is lazy and keeps a rolling horizon of SCHEDULE_HORIZON_DAYS
+ahead of today: creating or changing a template fills it right away, and the
+slot search calls `ensure_horizon` to extend it as the days pass or when a
+client asks for dates beyond it (up to SCHEDULE_MAX_HORIZON_DAYS). Slots that
+already exist for the doctor at the same time are skipped, so regeneration is
+idempotent and overlapping templates do not double-book a doctor; days on
+which a template's slots were cancelled or shifted in bulk stay as they are.
+The partial unique index `uq_appointments_doctor_datetime` backs this up for
+concurrent generators: inserts that conflict with it are dropped.
+
+Slots are written with Core statements, which neither the hot response cache
+nor the calendar counters' mapper events see; every write here invalidates the
+"appointments" namespace and applies its counter deltas itself.
+"""
+import datetime
+import threading
+from collections import Counter
+
+from fastapi import HTTPException
+from sqlalchemy import and_, bindparam, delete, or_, select, update
+
+from . import calendar
+from . import models as appointment_models
+from .. import db as database
+from ..config import settings
+from ..responses import hot_responses
+
+Appointment = appointment_models.Appointment
+ScheduleTemplate = appointment_models.ScheduleTemplate
+
+_DAY = datetime.timedelta(days=1)
+
+# Latest horizon this process has materialized all templates up to
+_horizon_lock = threading.Lock()
+_materialized_until: datetime.date | None = None
+
+
+def horizon_end(requested: datetime.date | None = None) -> datetime.date:
+    """The rolling horizon, stretched to `requested` up to the maximum horizon."""
+    today = datetime.date.today()
+    end = today + datetime.timedelta(days=settings.SCHEDULE_HORIZON_DAYS)
+    if requested is not None and requested > end:
+        end = min(requested, today + datetime.timedelta(days=settings.SCHEDULE_MAX_HORIZON_DAYS))
+    return end
+
+
+def slot_times(template, start: datetime.date, end: datetime.date) -> list[datetime.datetime]:
+    """Every slot start of `template` between two dates (inclusive), ignoring its validity range."""
+    step = datetime.timedelta(minutes=template.slot_minutes)
+    first = datetime.datetime.combine(datetime.date.min, template.start_time) - datetime.datetime.min
+    last = datetime.datetime.combine(datetime.date.min, template.end_time) - datetime.datetime.min
+    offsets = [first + step * i for i in range((last - first) // step)]
+    exceptions = set(template.exceptions)
+    mask = template.weekday_mask
+
+    slots = []
+    day = start
+    while day <= end:
+        if mask >> day.weekday() & 1 and day not in exceptions:
+            midnight = datetime.datetime.combine(day, datetime.time.min)
+            slots.extend(midnight + offset for offset in offsets)
+        day += _DAY
+    return slots
+
+
+def materialize(db, templates, until: datetime.date) -> int:
+    """
+    Inserts the missing slots of `templates` up to `until` and advances their
+    watermarks. Does not commit; returns the number of slots inserted.
+    """
+    today = datetime.date.today()
+    now = database.utcnow()
+    rows = []
+    planned = set()
+    for template in templates:
+        start = max(template.valid_from, today)
+        if template.generated_until is not None:
+            start = max(start, template.generated_until + _DAY)
+        end = until if template.valid_until is None else min(until, template.valid_until)
+        if template.active and start <= end:
+            for when in slot_times(template, start, end):
+                key = (template.doctor_profile_id, when)
+                if key not in planned:
+                    planned.add(key)
+                    rows.append({
+                        "doctor_profile_id": template.doctor_profile_id,
+                        "appointment_datetime": when,
+                        "status": "available",
+                        "template_id": template.id,
+                        "updated_at": now,
+                    })
+        if template.generated_until is None or template.generated_until < until:
+            template.generated_until = until
+    if not rows:
+        return 0
+
+    # One range scan per batch of doctors finds the times they are already
+    # taken, and the days each template already has slots on: a day whose
+    # slots were cancelled or shifted in bulk is not generated again.
+    doctor_ids = sorted({row["doctor_profile_id"] for row in rows})
+    first = min(row["appointment_datetime"] for row in rows)
+    last = max(row["appointment_datetime"] for row in rows)
+    taken, template_days = set(), set()
+    batch_size = settings.SCHEDULE_INSERT_BATCH_SIZE
+    for i in range(0, len(doctor_ids), batch_size):
+        existing = db.execute(select(
+            Appointment.doctor_profile_id, Appointment.appointment_datetime, Appointment.template_id, Appointment.status
+        ).where(
+            Appointment.doctor_profile_id.in_(doctor_ids[i:i + batch_size]),
+            Appointment.appointment_datetime.between(first, last),
+        ))
+        for doctor_id, when, template_id, slot_status in existing:
+            if slot_status != "cancelled":
+                taken.add((doctor_id, when))
+            if template_id is not None:
+                template_days.add((template_id, when.date()))
+    if taken or template_days:
+        rows = [
+            row for row in rows
+            if (row["doctor_profile_id"], row["appointment_datetime"]) not in taken
+            and (row["template_id"], row["appointment_datetime"].date()) not in template_days
+        ]
+
+    # executemany on a cached statement: the driver sends multi-row batches
+    # without compiling a new VALUES clause for each one. A slot another
+    # transaction stored since the scan above hits uq_appointments_doctor_datetime
+    # and is skipped; only the rows actually inserted are counted.
+    table = Appointment.__table__
+    statement = database.dialect_insert(db, table).on_conflict_do_nothing().returning(
+        table.c.doctor_profile_id, table.c.appointment_datetime
+    )
+    inserted = []
+    for i in range(0, len(rows), batch_size):
+        inserted.extend(db.execute(statement, rows[i:i + batch_size]).all())
+    calendar.apply(db, calendar.deltas((doctor_id, when, "available") for doctor_id, when in inserted))
+    return len(inserted)
+
+
+def materialize_due(until: datetime.date) -> int:
+    """Brings every active template up to `until` in one transaction."""
+    global _materialized_until
+    with database.SessionLocal() as db:
+        # Workers racing on the same templates skip the ones already being filled
+        templates = db.execute(select(ScheduleTemplate).where(
+            ScheduleTemplate.active.is_(True),
+            or_(ScheduleTemplate.generated_until.is_(None), ScheduleTemplate.generated_until < until),
+        ).with_for_update(skip_locked=True)).scalars().all()
+        inserted = materialize(db, templates, until) if templates else 0
+        db.commit()
+    if inserted:
+        hot_responses.invalidate("appointments")
+    with _horizon_lock:
+        if _materialized_until is None or until > _materialized_until:
+            _materialized_until = until
+    return inserted
+
+
+def needs_materialization(until: datetime.date) -> bool:
+    with _horizon_lock:
+        return _materialized_until is None or until > _materialized_until
+
+
+# --- Template changes ---
+
+def create_template(db, doctor_profile_id: int, created_by: int, template_in) -> ScheduleTemplate:
+    template = ScheduleTemplate(
+        doctor_profile_id=doctor_profile_id,
+        created_by=created_by,
+        start_time=template_in.start_time,
+        end_time=template_in.end_time,
+        slot_minutes=template_in.slot_minutes,
+        valid_from=template_in.valid_from or datetime.date.today(),
+        valid_until=template_in.valid_until,
+    )
+    template.weekdays = template_in.weekdays
+    template.exceptions = template_in.exceptions
+    db.add(template)
+    db.flush()
+    inserted = materialize(db, [template], horizon_end())
+    db.commit()
+    if inserted:
+        hot_responses.invalidate("appointments")
+    db.refresh(template)
+    return template
+
+
+def update_template(db, template: ScheduleTemplate, changes) -> ScheduleTemplate:
+    """
+    Applies `changes`, removes the template's future open slots that no longer
+    fit and regenerates the horizon for dates it now covers again. Open slots
+    were never seen by a patient, so they are deleted rather than cancelled and
+    leave no tombstones.
+    """
+    fields = changes.model_fields_set
+    if "valid_until" in fields:
+        template.valid_until = changes.valid_until
+    if "exceptions" in fields and changes.exceptions is not None:
+        template.exceptions = changes.exceptions
+    if "active" in fields and changes.active is not None:
+        template.active = changes.active
+
+    now = database.utcnow()
+    stale = []
+    if not template.active:
+        stale.append(Appointment.appointment_datetime >= now)
+    else:
+        if template.valid_until is not None:
+            stale.append(Appointment.appointment_datetime >= datetime.datetime.combine(template.valid_until + _DAY, datetime.time.min))
+        for day in template.exceptions:
+            midnight = datetime.datetime.combine(day, datetime.time.min)
+            stale.append(and_(Appointment.appointment_datetime >= midnight, Appointment.appointment_datetime < midnight + _DAY))
+    removed = 0
+    if stale:
+        deleted = db.execute(delete(Appointment).where(
+            Appointment.template_id == template.id,
+            Appointment.status == "available",
+            Appointment.patient_profile_id.is_(None),
+            Appointment.appointment_datetime >= now,
+            or_(*stale),
+        ).returning(Appointment.doctor_profile_id, Appointment.appointment_datetime, Appointment.status)
+        .execution_options(synchronize_session=False)).all()
+        calendar.apply(db, calendar.deltas(deleted, -1))
+        removed = len(deleted)
+
+    inserted = 0
+    if template.active:
+        # Re-walk the horizon: days the template has no slots on (any more) are filled
+        until = horizon_end()
+        yesterday = datetime.date.today() - _DAY
+        if template.generated_until is not None and template.generated_until > yesterday:
+            until = max(until, template.generated_until)
+            template.generated_until = yesterday
+        inserted = materialize(db, [template], until)
+    db.commit()
+    if removed or inserted:
+        hot_responses.invalidate("appointments")
+    db.refresh(template)
+    return template
+
+
+# --- Bulk slot operations ---
+
+def _statuses(selection) -> list[str]:
+    return ["available", "booked"] if selection.include_booked else ["available"]
+
+
+def _selected(doctor_profile_id: int, selection, statuses=None):
+    conditions = [
+        Appointment.doctor_profile_id == doctor_profile_id,
+        Appointment.appointment_datetime >= datetime.datetime.combine(selection.date_from, datetime.time.min),
+        Appointment.appointment_datetime < datetime.datetime.combine(selection.date_to + _DAY, datetime.time.min),
+        Appointment.status.in_(statuses or _statuses(selection)),
+    ]
+    if selection.template_id is not None:
+        conditions.append(Appointment.template_id == selection.template_id)
+    return conditions
+
+
+def cancel_slots(db, doctor_profile_id: int, selection) -> int:
+    """
+    Cancels the selected slots with one UPDATE per current status (so the
+    calendar counters know what each slot was); booked patients see the change
+    on their next sync.
+    """
+    cancelled = 0
+    changes = Counter()
+    for slot_status in _statuses(selection):
+        times = db.execute(
+            update(Appointment).where(*_selected(doctor_profile_id, selection, [slot_status]))
+            .values(status="cancelled").returning(Appointment.appointment_datetime)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        changes.update(calendar.deltas(((doctor_profile_id, when, slot_status) for when in times), -1))
+        changes.update(calendar.deltas((doctor_profile_id, when, "cancelled") for when in times))
+        cancelled += len(times)
+    calendar.apply(db, changes)
+    db.commit()
+    if cancelled:
+        hot_responses.invalidate("appointments")
+    return cancelled
+
+
+def shift_slots(db, doctor_profile_id: int, selection) -> int:
+    """
+    Moves the selected slots by `selection.minutes` in one transaction. Raises
+    409 if a slot would land on another open or booked slot of the doctor.
+    """
+    delta = datetime.timedelta(minutes=selection.minutes)
+    # Locked so a booking cannot change a slot's status under the counter deltas
+    slots = db.execute(
+        select(Appointment.id, Appointment.appointment_datetime, Appointment.status)
+        .where(*_selected(doctor_profile_id, selection)).with_for_update()
+    ).all()
+    if not slots or not delta:
+        db.rollback()
+        return 0
+
+    moving = {slot_id for slot_id, _, _ in slots}
+    targets = {when + delta for _, when, _ in slots}
+    occupied = db.execute(select(Appointment.id, Appointment.appointment_datetime).where(
+        Appointment.doctor_profile_id == doctor_profile_id,
+        Appointment.appointment_datetime.between(min(targets), max(targets)),
+        Appointment.status.in_(["available", "booked"]),
+    )).all()
+    if any(when in targets and slot_id not in moving for slot_id, when in occupied):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Shifted slots would overlap existing slots")
+    changes = calendar.deltas(((doctor_profile_id, when, slot_status) for _, when, slot_status in slots), -1)
+    changes.update(calendar.deltas((doctor_profile_id, when + delta, slot_status) for _, when, slot_status in slots))
+
+    # Core executemany so `updated_at`/`version` onupdate defaults apply to every row.
+    # Rows move leading edge first, so none lands on a slot that has not moved yet
+    # (the unique index is checked row by row).
+    table = Appointment.__table__
+    ordered = sorted(slots, key=lambda slot: slot[1], reverse=delta > datetime.timedelta(0))
+    try:
+        db.execute(
+            table.update().where(table.c.id == bindparam("slot_id")).values(appointment_datetime=bindparam("new_datetime")),
+            [{"slot_id": slot_id, "new_datetime": when + delta} for slot_id, when, _ in ordered],
+        )
+        calendar.apply(db, changes)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    hot_responses.invalidate("appointments")
+    return len(slots)
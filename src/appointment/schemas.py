@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 import datetime
 from ..profiles.schemas import Doctor, Patient # Import full profile schemas for richer responses
 
@@ -28,7 +28,112 @@ class Appointment(AppointmentBase):
     appointment_id: int = Field(alias="id") # Renamed 'id' to 'appointment_id'
     appointment_datetime: datetime.datetime
     status: str
+    template_id: int | None = None
+    triage_report: str | None = None
+    updated_at: datetime.datetime | None = None
+    version: int = 1
     
     # Nest the full profile information in the response for convenience
     doctor: Doctor | None = None
-    patient: Patient | None = None
\ No newline at end of file
+    patient: Patient | None = None
+
+
+class AppointmentSync(AppointmentBase):
+    """Rows changed since the client's cursor; apply `deleted` before `changes`."""
+    changes: list[Appointment]
+    deleted: list[int]
+    cursor: str | None
+    has_more: bool
+
+
+# --- Schedule Templates ---
+
+class ScheduleTemplateCreate(AppointmentBase):
+    """Weekly availability. Doctor ID is taken from the token unless provided by ASHA."""
+    doctor_profile_id: int | None = None
+    weekdays: list[int] = Field(..., min_length=1, description="0 = Monday ... 6 = Sunday")
+    start_time: datetime.time
+    end_time: datetime.time
+    slot_minutes: int = Field(15, ge=5, le=480)
+    valid_from: datetime.date | None = None
+    valid_until: datetime.date | None = None
+    exceptions: list[datetime.date] = []
+
+    @field_validator("weekdays")
+    @classmethod
+    def _check_weekdays(cls, weekdays):
+        if any(day < 0 or day > 6 for day in weekdays):
+            raise ValueError("weekdays must be between 0 (Monday) and 6 (Sunday)")
+        return sorted(set(weekdays))
+
+    @model_validator(mode="after")
+    def _check_window(self):
+        if self.end_time <= self.start_time:
+            raise ValueError("end_time must be after start_time")
+        if self.valid_from and self.valid_until and self.valid_until < self.valid_from:
+            raise ValueError("valid_until must not be before valid_from")
+        return self
+
+
+class ScheduleTemplateUpdate(AppointmentBase):
+    """Changes that affect already generated slots; omitted fields are left as they are."""
+    valid_until: datetime.date | None = None
+    exceptions: list[datetime.date] | None = None
+    active: bool | None = None
+
+
+class ScheduleTemplate(AppointmentBase):
+    template_id: int = Field(alias="id")
+    doctor_profile_id: int
+    weekdays: list[int]
+    start_time: datetime.time
+    end_time: datetime.time
+    slot_minutes: int
+    valid_from: datetime.date
+    valid_until: datetime.date | None = None
+    exceptions: list[datetime.date]
+    active: bool
+    generated_until: datetime.date | None = None
+
+
+class BulkSlotSelection(AppointmentBase):
+    """Slots of one doctor between two dates (inclusive), optionally limited to one template."""
+    doctor_profile_id: int | None = None
+    date_from: datetime.date
+    date_to: datetime.date
+    template_id: int | None = None
+    include_booked: bool = False
+
+    @model_validator(mode="after")
+    def _check_range(self):
+        if self.date_to < self.date_from:
+            raise ValueError("date_to must not be before date_from")
+        return self
+
+
+class BulkShift(BulkSlotSelection):
+    minutes: int = Field(..., ge=-1440, le=1440)
+
+
+class BulkSlotResult(AppointmentBase):
+    affected: int
+
+
+# --- Calendar ---
+
+class CalendarDay(AppointmentBase):
+    date: datetime.date
+    counts: dict[str, int] = Field(..., description="Number of slots per status, e.g. {'available': 12, 'booked': 4}")
+
+
+class DoctorCalendar(AppointmentBase):
+    doctor_profile_id: int
+    month: str
+    days: list[CalendarDay]
+
+
+class DistrictCalendar(AppointmentBase):
+    village: str | None = None
+    specialization: str | None = None
+    month: str
+    days: list[CalendarDay]
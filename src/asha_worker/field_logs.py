@@ -0,0 +1,184 @@
+"""
+Write-behind store for ASHA field logs.
+
+Uploads only append to a bounded in-process buffer. A background task in
+each worker writes the buffer out in batched INSERTs once it holds
+FIELD_LOG_FLUSH_ROWS logs or FIELD_LOG_FLUSH_SECONDS after the last flush,
+whichever comes first, and the app's shutdown flushes whatever is left. A
+burst of reconnecting devices therefore costs a few multi-row statements
+rather than a transaction per log.
+
+Logs are acknowledged (202) before they reach the database. What can be lost
+is bounded by the flush interval if the process dies without a clean
+shutdown; clients that need more keep a log queued until they see it in a
+read, and tag it with a `client_id` so re-sending it is harmless. When the
+database is unavailable the buffer keeps its rows and retries. Once it holds
+FIELD_LOG_BUFFER_MAX_ROWS, uploads fail fast with FieldLogBufferFull (503).
+
+Reads flush this worker's buffer first, so a worker sees its own uploads.
+"""
+import asyncio
+import datetime
+import logging
+import threading
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from . import models as asha_models
+from .. import db as database
+from ..config import settings
+from ..profiles import models as profile_models
+
+logger = logging.getLogger(__name__)
+
+FieldLog = asha_models.FieldLog
+
+
+class FieldLogBufferFull(Exception):
+    """Raised when the buffer cannot take more logs; surfaced to clients as 503."""
+
+
+def _fill_villages(db, rows: list[dict]):
+    worker_ids = {row["asha_worker_id"] for row in rows if row["village"] is None}
+    if not worker_ids:
+        return
+    villages = dict(db.execute(
+        select(profile_models.ASHAWorker.asha_worker_id, profile_models.ASHAWorker.village_assigned)
+        .where(profile_models.ASHAWorker.asha_worker_id.in_(worker_ids))
+    ).all())
+    for row in rows:
+        if row["village"] is None:
+            row["village"] = villages.get(row["asha_worker_id"])
+
+
+def write_logs(rows: list[dict]) -> int:
+    """Inserts buffered logs in one transaction, skipping ones already stored under the same client id."""
+    with database.SessionLocal() as db:
+        _fill_villages(db, rows)
+        table = FieldLog.__table__
+        statement = database.dialect_insert(db, table).on_conflict_do_nothing(
+            index_elements=[table.c.asha_worker_id, table.c.client_id]
+        )
+        try:
+            db.execute(statement, rows)
+            db.commit()
+            return len(rows)
+        except IntegrityError:
+            # A bad reference (e.g. an unknown patient id) must not wedge the
+            # whole buffer: retry row by row and drop only the offending rows
+            db.rollback()
+        written = 0
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(statement, [row])
+                written += 1
+            except IntegrityError as exc:
+                logger.warning("Dropping field log of ASHA worker %s: %s", row["asha_worker_id"], exc.orig)
+        db.commit()
+        return written
+
+
+class FieldLogBuffer:
+    def __init__(self, max_rows: int, flush_rows: int, flush_seconds: float, writer=write_logs):
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._writer = writer
+        self._rows: list[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time keeps rows in order
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    async def submit(self, rows: list[dict]):
+        """Queues logs for the next flush (event loop only). Raises FieldLogBufferFull when over capacity."""
+        with self._lock:
+            if len(self._rows) + len(rows) > self.max_rows:
+                raise FieldLogBufferFull()
+            self._rows.extend(rows)
+            due = len(self._rows) >= self.flush_rows
+        if self._task is None:
+            # Not started (e.g. no lifespan): write through
+            await run_in_threadpool(self.flush)
+        elif due:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Writes out everything buffered so far (blocking). Failed rows are put back for the next attempt."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            try:
+                return self._writer(rows)
+            except Exception:
+                with self._lock:
+                    self._rows[:0] = rows
+                raise
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self.pending():
+                try:
+                    await run_in_threadpool(self.flush)
+                except Exception:
+                    logger.exception("Field log flush failed; %d logs kept for retry", self.pending())
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        """Stops the background flusher and writes out what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_in_threadpool(self.flush)
+
+
+field_log_buffer = FieldLogBuffer(
+    max_rows=settings.FIELD_LOG_BUFFER_MAX_ROWS,
+    flush_rows=settings.FIELD_LOG_FLUSH_ROWS,
+    flush_seconds=settings.FIELD_LOG_FLUSH_SECONDS,
+)
+
+
+def log_row(asha_worker_id: int, log, received_at) -> dict:
+    """Buffer row for an uploaded log; device timestamps are stored as naive UTC like every other column."""
+    recorded_at = log.recorded_at or received_at
+    if recorded_at.tzinfo is not None:
+        recorded_at = recorded_at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return {
+        "asha_worker_id": asha_worker_id,
+        "patient_profile_id": log.patient_profile_id,
+        "village": log.village,
+        "client_id": log.client_id,
+        "note": log.note,
+        "recorded_at": recorded_at,
+        "received_at": received_at,
+    }
+
+
+def page_query(conditions, cursor: tuple | None, limit: int):
+    """Newest-first keyset page over `(recorded_at, id)`; fetches one extra row to detect a next page."""
+    query = select(FieldLog).where(*conditions)
+    if cursor is not None:
+        query = query.where(tuple_(FieldLog.recorded_at, FieldLog.id) < tuple_(*cursor))
+    return query.order_by(FieldLog.recorded_at.desc(), FieldLog.id.desc()).limit(limit + 1)
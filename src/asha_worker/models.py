@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint
+
+from ..db import Base, utcnow
+
+
+class FieldLog(Base):
+    """An ASHA worker's visit note. Append-only: rows are never updated."""
+    __tablename__ = "field_logs"
+    __table_args__ = (
+        # Offline clients tag each log so a re-sent queue is not stored twice
+        UniqueConstraint("asha_worker_id", "client_id", name="uq_field_logs_worker_client"),
+        # Serve the newest-first keyset reads per worker and per village
+        Index("ix_field_logs_worker_recorded", "asha_worker_id", "recorded_at", "id"),
+        Index("ix_field_logs_village_recorded", "village", "recorded_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    asha_worker_id = Column(Integer, ForeignKey("asha_workers.asha_worker_id"), nullable=False)
+    patient_profile_id = Column(Integer, ForeignKey("patients.patient_id"), nullable=True)
+    village = Column(String, nullable=True)
+    client_id = Column(String(64), nullable=True)
+    note = Column(Text, nullable=False)
+
+    recorded_at = Column(DateTime, nullable=False)  # when the visit was logged on the device
+    received_at = Column(DateTime, nullable=False, default=utcnow)
@@ -0,0 +1,199 @@
+"""
+Bulk patient onboarding for ASHA village camps.
+
+An upload is a JSON array of patients or a CSV with a
+`username,password,first_name,last_name,birthdate,gender` header. Each row is
+validated on its own and reported back individually. The whole batch costs
+one lookup of the usernames and one INSERT each for users and patient
+profiles, all in a single transaction. The passwords of new patients are
+hashed across the bcrypt process pool before that transaction starts, so no
+pooled connection waits on bcrypt.
+
+Uploads are idempotent. A username that already belongs to a patient managed
+by the same ASHA worker is reported as "existing" with its patient id and is
+not hashed again, so a camp that re-sends a batch after a dropped connection
+gets the same ids back. A username taken by anyone else is an error for that
+row. Users are inserted with ON CONFLICT DO NOTHING, so two concurrent retries
+cannot create a username twice.
+"""
+import csv
+import io
+import json
+import time
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from . import schemas
+from .. import db as database
+from .. import utils
+from ..auth import models as auth_models
+from ..config import settings
+from ..profiles import models as profile_models
+
+CSV_CONTENT_TYPES = ("text/csv", "application/csv", "text/plain")
+
+
+class _Row:
+    __slots__ = ("line", "username", "status", "patient_id", "error", "patient")
+
+    def __init__(self, line, username=None, status="error", error=None, patient=None):
+        self.line = line
+        self.username = username
+        self.status = status
+        self.patient_id = None
+        self.error = error
+        self.patient = patient
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in ("line", "username", "status", "patient_id", "error")}
+
+
+def _validate(line_number, record) -> _Row:
+    if not isinstance(record, dict):
+        return _Row(line_number, error="expected an object")
+    username = record.get("username")
+    username = username.strip() if isinstance(username, str) else None
+    try:
+        patient = schemas.OnboardPatient.model_validate({**record, "username": username})
+    except ValidationError as exc:
+        error = exc.errors()[0]
+        field = ".".join(str(part) for part in error["loc"])
+        return _Row(line_number, username=username, error=f"{field}: {error['msg']}")
+    if not patient.username:
+        return _Row(line_number, error="username: Field required")
+    return _Row(line_number, username=patient.username, status="pending", patient=patient)
+
+
+def parse_patients(body: bytes, content_type: str | None) -> list[_Row]:
+    """Parses a JSON array or CSV upload into validated rows."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    text = body.decode("utf-8-sig", errors="replace")
+    if media_type in CSV_CONTENT_TYPES or (not media_type and not text.lstrip().startswith("[")):
+        reader = csv.DictReader(io.StringIO(text))
+        if reader.fieldnames is None or "username" not in [name.strip().lower() for name in reader.fieldnames]:
+            raise HTTPException(status_code=400, detail="CSV header must contain a 'username' column")
+        # Line numbers count the header as line 1
+        records = [
+            (reader.line_num, {key.strip().lower(): value for key, value in record.items() if key})
+            for record in reader
+        ]
+    else:
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of patients")
+        records = list(enumerate(payload, start=1))
+
+    if len(records) > settings.ONBOARDING_MAX_PATIENTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.ONBOARDING_MAX_PATIENTS} patients can be onboarded at once",
+        )
+    return [_validate(line_number, record) for line_number, record in records]
+
+
+def _lookup(db, usernames) -> dict[str, tuple[int | None, int | None, str]]:
+    """username -> (patient id, managing ASHA id, role) for the names that are taken."""
+    if not usernames:
+        return {}
+    User, Patient = auth_models.User, profile_models.Patient
+    rows = db.execute(
+        select(User.username, Patient.patient_id, Patient.managed_by_asha_id, User.role)
+        .outerjoin(Patient, Patient.user_id == User.id)
+        .where(User.username.in_(usernames))
+    ).all()
+    return {username: (patient_id, asha_id, role) for username, patient_id, asha_id, role in rows}
+
+
+def _resolve_taken(row: _Row, taken, asha_worker_id: int):
+    patient_id, managing_asha_id, role = taken
+    if role == "patient" and patient_id is not None and managing_asha_id == asha_worker_id:
+        row.status = "existing"
+        row.patient_id = patient_id
+    else:
+        row.status = "error"
+        row.error = "username already exists"
+
+
+def onboard_patients(db, asha_worker_id: int, rows: list[_Row]) -> list[_Row]:
+    """Creates the new patients of a parsed upload in one transaction and fills in per-row results."""
+    latest: dict[str, _Row] = {}
+    for row in rows:
+        if row.status != "pending":
+            continue
+        if row.username in latest:
+            row.status = "duplicate"
+            row.error = f"username repeats line {latest[row.username].line}"
+            continue
+        latest[row.username] = row
+
+    taken = _lookup(db, list(latest))
+    db.rollback()  # release the connection while bcrypt runs
+    for username, info in taken.items():
+        _resolve_taken(latest.pop(username), info, asha_worker_id)
+    if not latest:
+        return rows
+
+    pending = list(latest.values())
+    hashes = utils.password_hasher.hash_many([row.patient.password for row in pending])
+
+    users = auth_models.User.__table__
+    patients = profile_models.Patient.__table__
+    try:
+        statement = database.dialect_insert(db, users).values([
+            {
+                "username": row.username,
+                "hashed_password": hashed_password,
+                "role": "patient",
+                "first_name": row.patient.first_name,
+                "last_name": row.patient.last_name,
+                "birthdate": row.patient.birthdate,
+                "gender": row.patient.gender,
+            }
+            for row, hashed_password in zip(pending, hashes)
+        ])
+        statement = statement.on_conflict_do_nothing(index_elements=[users.c.username])
+        user_ids = dict(db.execute(statement.returning(users.c.username, users.c.id)).all())
+        patient_ids = {}
+        if user_ids:
+            patient_ids = dict(db.execute(patients.insert().values([
+                {"user_id": user_id, "managed_by_asha_id": asha_worker_id} for user_id in user_ids.values()
+            ]).returning(patients.c.user_id, patients.c.patient_id)).all())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    raced = []
+    for row in pending:
+        user_id = user_ids.get(row.username)
+        if user_id is None:
+            raced.append(row)  # created by a concurrent upload since the lookup
+        else:
+            row.status = "created"
+            row.patient_id = patient_ids[user_id]
+    if raced:
+        taken = _lookup(db, [row.username for row in raced])
+        db.rollback()
+        for row in raced:
+            _resolve_taken(row, taken.get(row.username, (None, None, None)), asha_worker_id)
+    return rows
+
+
+def summarize(rows: list[_Row], started: float) -> dict:
+    counts = {"created": 0, "existing": 0}
+    for row in rows:
+        if row.status in counts:
+            counts[row.status] += 1
+    return {
+        "received": len(rows),
+        "created": counts["created"],
+        "existing": counts["existing"],
+        "failed": len(rows) - counts["created"] - counts["existing"],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "rows": [row.as_dict() for row in rows],
+    }
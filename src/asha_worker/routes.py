@@ -1,5 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 from typing import List
 
 from .. import db, utils
@@ -7,8 +11,11 @@ from ..auth import schemas as auth_schemas
 from ..auth import models as auth_models
 from ..profiles import models as profile_models
 from ..profiles import schemas as profile_schemas
-from ..appointment import models as appointment_models
+from . import field_logs, onboarding, schemas
+from ..appointment import booking
 from ..auth.dependencies import role_checker
+from ..auth.principal import Principal
+from ..config import settings
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -17,19 +24,23 @@ router = APIRouter()
 @router.get("/me/patients", response_model=List[profile_schemas.Patient])
 def get_my_managed_patients(
     db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["asha_worker"]))
+    current_user: Principal = Depends(role_checker(allowed_roles=["asha_worker"]))
 ):
     """
     Fetches a list of all patients managed by the currently logged-in ASHA worker.
     - **Security**: Protected endpoint for 'asha_worker' roles only.
     """
-    return current_user.asha_worker_profile.patients
+    return db.query(profile_models.Patient).options(
+        joinedload(profile_models.Patient.user)
+    ).filter(
+        profile_models.Patient.managed_by_asha_id == current_user.asha_worker_id
+    ).all()
 
 @router.post("/onboard-patient", status_code=status.HTTP_201_CREATED, response_model=profile_schemas.Patient)
 def onboard_new_patient(
     patient_details: auth_schemas.UserCreate,
     db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["asha_worker"]))
+    current_user: Principal = Depends(role_checker(allowed_roles=["asha_worker"]))
 ):
     """
     Creates a new user and patient profile on behalf of a patient (Assisted Onboarding).
@@ -40,6 +51,7 @@ def onboard_new_patient(
     db_user = db.query(auth_models.User).filter(auth_models.User.username == patient_details.username).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Username already exists")
+    db.rollback()  # release the connection while bcrypt runs
 
     hashed_password = utils.hash_password(patient_details.password)
     
@@ -58,7 +70,7 @@ def onboard_new_patient(
 
     new_patient_profile = profile_models.Patient(
         user_id=new_user.id,
-        managed_by_asha_id=current_user.asha_worker_profile.asha_worker_id
+        managed_by_asha_id=current_user.asha_worker_id
     )
     db.add(new_patient_profile)
     db.commit()
@@ -67,33 +79,127 @@ def onboard_new_patient(
     return new_patient_profile
 
 
+@router.post("/onboard-patients", response_model=schemas.OnboardResult)
+async def onboard_patients_in_bulk(
+    request: Request,
+    db: Session = Depends(db.get_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["asha_worker"]))
+):
+    """
+    Registers a camp's worth of patients at once (Assisted Onboarding in bulk).
+    - **Security**: Protected endpoint for 'asha_worker' roles only.
+    - Body: a JSON array of `{username, password, first_name, last_name, birthdate, gender}`,
+      or CSV with those columns as its header.
+    - All new patients are created in one transaction and assigned to the logged-in ASHA worker.
+    - Safe to retry: patients this ASHA worker already onboarded come back as `existing`.
+    """
+    started = time.perf_counter()
+    # Hand back any connection the auth lookup checked out before waiting on the upload
+    await run_in_threadpool(db.rollback)
+    rows = onboarding.parse_patients(await request.body(), request.headers.get("content-type"))
+    rows = await run_in_threadpool(onboarding.onboard_patients, db, current_user.asha_worker_id, rows)
+    return onboarding.summarize(rows, started)
+
+
 class BookForPatient(BaseModel):
     appointment_id: int
     patient_profile_id: int
 
 @router.post("/book-for-patient", status_code=status.HTTP_200_OK)
-def book_for_patient(
+async def book_for_patient(
     payload: BookForPatient,
-    db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["asha_worker"]))
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["asha_worker"]))
 ):
-    appt = db.query(appointment_models.Appointment).filter(appointment_models.Appointment.id == payload.appointment_id).first()
-    if not appt:
-        raise HTTPException(status_code=404, detail="Appointment slot not found")
-    if appt.status != "available":
-        raise HTTPException(status_code=400, detail="Appointment slot is already booked")
-    appt.patient_profile_id = payload.patient_profile_id
-    appt.status = "booked"
-    db.commit(); db.refresh(appt)
-    return {"status": "booked", "appointment_id": appt.id, "patient_profile_id": payload.patient_profile_id}
-
-class FieldLog(BaseModel):
-    note: str
-
-@router.post("/field-data-logs", status_code=status.HTTP_201_CREATED)
-def create_field_log(
-    log: FieldLog,
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["asha_worker"]))
+    """
+    Books a slot on behalf of a patient; 409 if someone else booked it first.
+    """
+    appointment_id = await booking.book_slot(db, payload.appointment_id, payload.patient_profile_id)
+    return {"status": "booked", "appointment_id": appointment_id, "patient_profile_id": payload.patient_profile_id}
+
+@router.post("/field-data-logs", status_code=status.HTTP_202_ACCEPTED, response_model=schemas.FieldLogAccepted)
+async def create_field_log(
+    log: schemas.FieldLogCreate,
+    current_user: Principal = Depends(role_checker(allowed_roles=["asha_worker"]))
+):
+    """
+    Queues a visit log for storage.
+    - **Security**: Protected endpoint for 'asha_worker' roles only.
+    - Logs are written in batches shortly after they are accepted; see `/me/field-logs` to read them back.
+    """
+    row = field_logs.log_row(current_user.asha_worker_id, log, db.utcnow())
+    await field_logs.field_log_buffer.submit([row])
+    return {"asha_worker_id": current_user.asha_worker_id, "accepted": 1}
+
+
+@router.post("/field-data-logs/batch", status_code=status.HTTP_202_ACCEPTED, response_model=schemas.FieldLogAccepted)
+async def create_field_logs_batch(
+    logs: List[schemas.FieldLogCreate],
+    current_user: Principal = Depends(role_checker(allowed_roles=["asha_worker"]))
 ):
-    # Placeholder: In real app, persist to a table. For now, just echo.
-    return {"asha_worker_id": current_user.asha_worker_profile.asha_worker_id, "note": log.note}
\ No newline at end of file
+    """
+    Queues the visit logs a device collected while offline.
+    - **Security**: Protected endpoint for 'asha_worker' roles only.
+    - Give each log a `client_id` and its device-side `recorded_at`; re-sending a log is a no-op.
+    """
+    if len(logs) > settings.FIELD_LOG_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.FIELD_LOG_BATCH_MAX} logs can be uploaded at once",
+        )
+    received_at = db.utcnow()
+    await field_logs.field_log_buffer.submit(
+        [field_logs.log_row(current_user.asha_worker_id, log, received_at) for log in logs]
+    )
+    return {"asha_worker_id": current_user.asha_worker_id, "accepted": len(logs)}
+
+
+async def _field_log_page(db: AsyncSession, conditions, response: Response, cursor: str | None, limit: int):
+    if field_logs.field_log_buffer.pending():
+        await run_in_threadpool(field_logs.field_log_buffer.flush)
+    position = None
+    if cursor:
+        try:
+            position = utils.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    result = await db.execute(field_logs.page_query(conditions, position, limit))
+    logs = result.scalars().all()
+    if len(logs) > limit:
+        logs = logs[:limit]
+        response.headers["X-Next-Cursor"] = utils.encode_cursor(logs[-1].recorded_at, logs[-1].id)
+    return logs
+
+
+@router.get("/me/field-logs", response_model=List[schemas.FieldLog])
+async def get_my_field_logs(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["asha_worker"]))
+):
+    """
+    The logged-in ASHA worker's field logs, newest first.
+    - Keyset-paginated: pass the `X-Next-Cursor` response header back as `cursor`.
+    """
+    return await _field_log_page(
+        db, [field_logs.FieldLog.asha_worker_id == current_user.asha_worker_id], response, cursor, limit
+    )
+
+
+@router.get("/villages/{village}/field-logs", response_model=List[schemas.FieldLog])
+async def get_village_field_logs(
+    village: str,
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["asha_worker", "doctor", "admin"]))
+):
+    """
+    Field logs recorded in a village by any ASHA worker, newest first.
+    - **Security**: ASHA workers, doctors and admins.
+    - Keyset-paginated: pass the `X-Next-Cursor` response header back as `cursor`.
+    """
+    return await _field_log_page(db, [field_logs.FieldLog.village == village], response, cursor, limit)
@@ -0,0 +1,57 @@
+import datetime
+
+from pydantic import BaseModel, Field
+
+from ..auth.schemas import UserBase
+
+
+class OnboardPatient(UserBase):
+    """One villager in a bulk onboarding upload; the role is always 'patient'."""
+    password: str = Field(..., min_length=1)
+
+
+class OnboardRowResult(BaseModel):
+    line: int
+    username: str | None = None
+    status: str  # created | existing | duplicate | error
+    patient_id: int | None = None
+    error: str | None = None
+
+
+class OnboardResult(BaseModel):
+    received: int
+    created: int
+    existing: int
+    failed: int
+    elapsed_ms: float
+    rows: list[OnboardRowResult]
+
+
+class FieldLogCreate(BaseModel):
+    note: str = Field(..., min_length=1)
+    patient_profile_id: int | None = None
+    # Defaults to the ASHA worker's assigned village
+    village: str | None = None
+    # Device-side id; re-sending a log with the same id is a no-op
+    client_id: str | None = Field(None, max_length=64)
+    # When the log was written on the device; defaults to the time it is received
+    recorded_at: datetime.datetime | None = None
+
+
+class FieldLogAccepted(BaseModel):
+    asha_worker_id: int
+    accepted: int
+
+
+class FieldLog(BaseModel):
+    log_id: int = Field(alias="id")
+    asha_worker_id: int
+    patient_profile_id: int | None = None
+    village: str | None = None
+    client_id: str | None = None
+    note: str
+    recorded_at: datetime.datetime
+    received_at: datetime.datetime
+
+    class Config:
+        from_attributes = True
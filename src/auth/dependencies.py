@@ -1,40 +1,64 @@
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 
-from .. import db, utils
-from . import schemas, models
+from .. import db
+from .principal import Principal, principal_cache, load_principal
 from ..config import settings
+from ..metrics import add_phase
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(db.get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str) -> dict:
+    """Verifies the JWT and returns its claims."""
+    started = time.perf_counter()
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(username=username)
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
-    if user is None:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    finally:
+        add_phase("jwt", time.perf_counter() - started)
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+def resolve_principal(claims: dict, db: Session) -> Principal:
+    """Returns the cached principal for the token subject, loading it on a miss."""
+    principal = principal_cache.get(claims["sub"])
+    if principal is None:
+        principal = load_principal(db, claims["sub"])
+        if principal is None:
+            raise _credentials_exception()
+        principal_cache.put(principal)
+    return principal
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(db.get_db)) -> Principal:
+    return resolve_principal(decode_token(token), db)
 
 def role_checker(allowed_roles: list[str]):
-    def check_roles(current_user: schemas.User = Depends(get_current_user)):
+    def check_roles(token: str = Depends(oauth2_scheme), db: Session = Depends(db.get_db)) -> Principal:
+        claims = decode_token(token)
+        # The role claim is signed, so a mismatch can be rejected without a lookup
+        if claims.get("role") is not None and claims["role"] not in allowed_roles:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You do not have permission to perform this action"
+            )
+        current_user = resolve_principal(claims, db)
         if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You do not have permission to perform this action"
             )
         return current_user
-    return check_roles
\ No newline at end of file
+    return check_roles
@@ -0,0 +1,153 @@
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import event
+
+from . import models
+from ..profiles import models as profile_models
+from ..config import settings
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    The authenticated user as seen by route handlers.
+
+    Holds the user row (minus the password hash), the role and the id of every
+    profile the user owns, so handlers never need to lazy-load a profile
+    relationship just to read its primary key.
+    """
+    id: int
+    username: str
+    role: str
+    first_name: str | None = None
+    last_name: str | None = None
+    birthdate: datetime.date | None = None
+    gender: str | None = None
+    patient_id: int | None = None
+    doctor_id: int | None = None
+    pharmacist_id: int | None = None
+    asha_worker_id: int | None = None
+
+    @property
+    def profile_id(self) -> int | None:
+        return {
+            "patient": self.patient_id,
+            "doctor": self.doctor_id,
+            "pharmacist": self.pharmacist_id,
+            "asha_worker": self.asha_worker_id,
+        }.get(self.role, self.patient_id)
+
+    def token_claims(self) -> dict:
+        """Claims embedded in the access token so authorization needs no lookup."""
+        return {"sub": self.username, "uid": self.id, "role": self.role, "pid": self.profile_id}
+
+
+class PrincipalCache:
+    """Thread-safe LRU cache of principals keyed by token subject, with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, Principal]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, subject: str) -> Principal | None:
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at < time.monotonic():
+                del self._entries[subject]
+                return None
+            self._entries.move_to_end(subject)
+            return principal
+
+    def put(self, principal: Principal) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[principal.username] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(principal.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            stale = [subject for subject, (_, principal) in self._entries.items() if principal.id == user_id]
+            for subject in stale:
+                del self._entries[subject]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+def load_principal(db, username: str) -> Principal | None:
+    """Loads a user and all of their profile ids in a single query."""
+    row = db.query(
+        models.User,
+        profile_models.Patient.patient_id,
+        profile_models.Doctor.doctor_id,
+        profile_models.Pharmacist.pharmacist_id,
+        profile_models.ASHAWorker.asha_worker_id,
+    ).outerjoin(
+        profile_models.Patient, profile_models.Patient.user_id == models.User.id
+    ).outerjoin(
+        profile_models.Doctor, profile_models.Doctor.user_id == models.User.id
+    ).outerjoin(
+        profile_models.Pharmacist, profile_models.Pharmacist.user_id == models.User.id
+    ).outerjoin(
+        profile_models.ASHAWorker, profile_models.ASHAWorker.user_id == models.User.id
+    ).filter(models.User.username == username).first()
+    if row is None:
+        return None
+    user, patient_id, doctor_id, pharmacist_id, asha_worker_id = row
+    return Principal(
+        id=user.id,
+        username=user.username,
+        role=user.role,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        birthdate=user.birthdate,
+        gender=user.gender,
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        pharmacist_id=pharmacist_id,
+        asha_worker_id=asha_worker_id,
+    )
+
+
+# --- Invalidation ---
+# Any write to a user or one of its profiles evicts the cached principal in this
+# process; other workers converge within PRINCIPAL_CACHE_TTL_SECONDS.
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    principal_cache.invalidate_user(target.id)
+
+
+def _invalidate_profile_owner(mapper, connection, target):
+    if target.user_id is not None:
+        principal_cache.invalidate_user(target.user_id)
+
+
+for _profile_model in (
+    profile_models.Patient,
+    profile_models.Doctor,
+    profile_models.Pharmacist,
+    profile_models.ASHAWorker,
+):
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_profile_model, _event_name, _invalidate_profile_owner)
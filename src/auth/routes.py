@@ -9,17 +9,24 @@ from ..config import settings
 from datetime import datetime, timedelta
 import hmac, hashlib, base64
 from .dependencies import get_current_user
+from .principal import Principal, principal_cache, load_principal
 
 router = APIRouter()
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED, response_model=schemas.User)
 def signup(user: schemas.UserCreate, db: Session = Depends(db.get_db)):
+    if user.role == "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin accounts cannot be created through signup"
+        )
     db_user = db.query(models.User).filter(models.User.username == user.username).first()
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already exists"
         )
+    db.rollback()  # release the connection while bcrypt runs
 
     hashed_password = utils.hash_password(user.password)
     
@@ -54,58 +61,37 @@ def signup(user: schemas.UserCreate, db: Session = Depends(db.get_db)):
 @router.post("/login", response_model=schemas.Token)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(db.get_db)):
     user = db.query(models.User).filter(models.User.username == form_data.username).first()
+    hashed_password = user.hashed_password if user else None
+    # End the read transaction so no pooled connection is held while bcrypt runs
+    db.rollback()
     
-    if not user or not utils.verify_password(form_data.password, user.hashed_password):
+    verified, new_hash = utils.verify_and_update_password(form_data.password, hashed_password) if user else (False, None)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Transparently upgrade hashes made with a different BCRYPT_ROUNDS
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
         
-    access_token = utils.create_access_token(
-        data={"sub": user.username, "role": user.role}
-    )
+    # Resolve profile ids once here; this also warms the principal cache
+    principal = load_principal(db, form_data.username)
+    principal_cache.put(principal)
+    access_token = utils.create_access_token(data=principal.token_claims())
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=schemas.User)
-def me(current_user: models.User = Depends(get_current_user)):
+def me(current_user: Principal = Depends(get_current_user)):
     """Return the current authenticated user (includes role)."""
     return current_user
 
 
-@router.get("/debug/all-data")
-def get_all_data(db: Session = Depends(db.get_db)):
-    """Returns all rows from major tables. Protect in production."""
-    users = db.query(models.User).all()
-    doctors = db.query(profile_models.Doctor).all()
-    patients = db.query(profile_models.Patient).all()
-    pharmacists = db.query(profile_models.Pharmacist).all()
-    ashas = db.query(profile_models.ASHAWorker).all()
-    # defer appointment/pharmacy import to avoid circulars
-    from ..appointment.models import Appointment
-    from ..pharmacy.models import Pharmacy, Medicine
-    appointments = db.query(Appointment).all()
-    pharmacies = db.query(Pharmacy).all()
-    medicines = db.query(Medicine).all()
-    # naive serialization
-    def serialize(obj):
-        d = obj.__dict__.copy()
-        d.pop("_sa_instance_state", None)
-        return d
-    return {
-        "users": [serialize(u) for u in users],
-        "doctors": [serialize(x) for x in doctors],
-        "patients": [serialize(x) for x in patients],
-        "pharmacists": [serialize(x) for x in pharmacists],
-        "asha_workers": [serialize(x) for x in ashas],
-        "appointments": [serialize(x) for x in appointments],
-        "pharmacies": [serialize(x) for x in pharmacies],
-        "medicines": [serialize(x) for x in medicines],
-    }
-
-
 @router.post("/video/token")
 def create_agora_token(channel: str, uid: str, role: str = "publisher", expire_minutes: int = 60):
     """
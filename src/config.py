@@ -8,6 +8,97 @@ class Settings(BaseSettings):
     AGORA_APP_ID: str | None = None
     AGORA_APP_CERTIFICATE: str | None = None
 
+    # Connection pool (applies to both the sync and the async engine, per worker)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000  # 0 disables; Postgres only
+
+    # Read replicas for the public read endpoints (see src/replicas.py)
+    DATABASE_REPLICA_URLS: str = ""  # comma-separated; empty sends every read to the primary
+    REPLICA_HEALTH_CHECK_SECONDS: float = 5
+    REPLICA_CONNECT_TIMEOUT_SECONDS: float = 2
+    REPLICA_MAX_LAG_SECONDS: float = 10  # a replica further behind is skipped; 0 disables; Postgres only
+    REPLICA_STICKY_SECONDS: float = 5  # reads go to the primary this long after a client writes; raised to REPLICA_MAX_LAG_SECONDS
+    REPLICA_STICKY_MAX_CLIENTS: int = 10000
+
+    # Password hashing (see src/utils.py)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2  # 0 hashes inline on the request thread
+    PASSWORD_HASH_MAX_PENDING: int = 32
+
+    # Bulk patient onboarding (see src/asha_worker/onboarding.py)
+    ONBOARDING_MAX_PATIENTS: int = 500
+
+    # Field log write-behind buffer (see src/asha_worker/field_logs.py)
+    FIELD_LOG_BUFFER_MAX_ROWS: int = 20000
+    FIELD_LOG_FLUSH_ROWS: int = 500
+    FIELD_LOG_FLUSH_SECONDS: float = 1.0
+    FIELD_LOG_BATCH_MAX: int = 1000
+
+    # Symptom checker (see src/symptom_checker/engine.py)
+    SYMPTOM_RULES_PATH: str | None = None  # defaults to the bundled rules/default.json
+    SYMPTOM_MEMO_SIZE: int = 4096
+    SYMPTOM_BATCH_MAX: int = 1000
+
+    # Per-request SQL statistics (see src/query_stats.py)
+    QUERY_STATS_ENABLED: bool = True
+    QUERY_STATS_HEADERS: bool = True
+    QUERY_N_PLUS_ONE_THRESHOLD: int = 10  # one statement shape this often in a request logs a warning; 0 disables
+
+    # Prometheus metrics at /metrics (see src/metrics.py)
+    METRICS_ENABLED: bool = True
+
+    # Schema migrations (see src/migrations/runner.py)
+    MIGRATION_BATCH_SIZE: int = 1000  # rows per transaction when a migration backfills a column
+
+    # Free-text to line-item migration (see src/prescriptions/items.py)
+    PRESCRIPTION_BACKFILL_BATCH_SIZE: int = 500
+
+    # Cross-pharmacy medicine search (see src/pharmacy/search.py)
+    SEARCH_INDEX_REFRESH_SECONDS: int = 300  # background pickup of other workers' writes; 0 disables
+
+    # Bulk inventory upsert
+    BULK_INVENTORY_MAX_ROWS: int = 20000
+    BULK_INVENTORY_BATCH_SIZE: int = 500
+
+    # Inventory change feed (see src/pharmacy/events.py)
+    INVENTORY_FEED_QUEUE_SIZE: int = 100
+    INVENTORY_FEED_HEARTBEAT_SECONDS: int = 15
+
+    # Offline record bundles (see src/profiles/bundle.py)
+    BUNDLE_CACHE_MAX_PATIENTS: int = 2000
+    BUNDLE_CACHE_HISTORY: int = 4
+
+    # Response encoding (see src/compression.py and src/responses.py)
+    JSON_ENCODER: str = "auto"  # auto | orjson | pydantic | stdlib
+    COMPRESSION_MIN_SIZE: int = 500
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    HOT_CACHE_TTL_SECONDS: int = 30
+    HOT_CACHE_MAX_ENTRIES: int = 256
+
+    # Recurring schedule templates (see src/appointment/schedule.py)
+    SCHEDULE_HORIZON_DAYS: int = 28
+    SCHEDULE_MAX_HORIZON_DAYS: int = 180
+    SCHEDULE_INSERT_BATCH_SIZE: int = 1000
+
+    # Delta sync and incremental export (see src/sync.py and src/export)
+    # `updated_at` is stamped when a statement runs, not when it commits: changes
+    # stamped this far behind a sync or export are read again in case they
+    # committed late or on a worker whose clock is behind
+    SYNC_OVERLAP_SECONDS: float = 120
+
+    # Table export (see src/export)
+    EXPORT_YIELD_PER: int = 1000
+    EXPORT_CHUNK_BYTES: int = 65536
+
+    # Authenticated-principal cache (see src/auth/principal.py)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 300
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+
     class Config:
         env_file = ".env"
 
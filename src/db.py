@@ -1,17 +1,142 @@
+import bisect
+import datetime
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from .config import settings
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# Async drivers for the sync URL's backend; the same DATABASE_URL serves both engines
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def to_async_url(url: str):
+    """Rewrites a sync database URL to use the matching asyncio driver."""
+    sync_url = make_url(url)
+    backend = sync_url.drivername.split("+")[0]
+    async_url = sync_url.set(drivername=ASYNC_DRIVERS.get(backend, sync_url.drivername))
+    if backend in ("postgresql", "postgres") and "sslmode" in async_url.query:
+        # asyncpg spells libpq's sslmode as ssl
+        async_url = async_url.difference_update_query(["sslmode"]).update_query_dict(
+            {"ssl": sync_url.query["sslmode"]}
+        )
+    return async_url
+
+
+class PoolStats:
+    """Checkout counters and a wait-time histogram for one connection pool."""
+
+    # Upper bounds in seconds; the last bucket catches everything slower
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bucket_counts = [0] * (len(self.BUCKETS) + 1)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def observe(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            cumulative, histogram = 0, {}
+            for bound, count in zip(self.BUCKETS + (float("inf"),), self.bucket_counts):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+            return {
+                "pool_size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "checkout_latency_histogram": histogram,
+            }
+
+
+class InstrumentedPoolMixin:
+    """Times every checkout, including the wait for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.observe(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.observe(time.perf_counter() - start)
+        return connection
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url, is_async: bool = False) -> dict:
+    """Pool sizing and per-statement timeout taken from Settings."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite is bound to a single connection; leave its pool alone
+        return {}
+    options = {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if url.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(to_async_url(DATABASE_URL), **engine_options(DATABASE_URL, is_async=True))
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # This is the missing function that needs to be in this file
@@ -20,4 +145,37 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def utcnow() -> datetime.datetime:
+    """Naive UTC timestamp, matching the naive DateTime columns used throughout."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def dialect_insert(db, table):
+    """INSERT construct for the session's (or connection's) dialect, which adds ON CONFLICT support."""
+    bind = db if hasattr(db, "dialect") else db.get_bind()
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return insert(table)
+
+async def get_async_db():
+    """Async counterpart of `get_db` for `async def` endpoints."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def pool_status() -> dict:
+    """Live pool statistics for both engines of this worker."""
+    status = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        if isinstance(pool, InstrumentedPoolMixin):
+            status[name] = pool.stats.snapshot(pool)
+    # Each worker may open up to this many connections; size workers so that
+    # workers * max_connections_per_worker stays below Postgres max_connections
+    status["max_connections_per_worker"] = 2 * (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+    return status
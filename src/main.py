@@ -1,13 +1,42 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from .appointment.routes import router as appointment_router
 from .auth.routes import router
 from .pharmacy.routes import router as pharmacy_router
 from .asha_worker.routes import router as asha_worker_router
 from .prescriptions.routes import router as prescriptions_router
+from .profiles.routes import doctor_router, patient_router
+from .export.routes import router as export_router
+from .symptom_checker.routes import router as symptom_checker_router
+from .pharmacy.events import inventory_broker
+from .pharmacy.search import medicine_index
+from .asha_worker.field_logs import FieldLogBufferFull, field_log_buffer
+from .compression import CompressionMiddleware
+from .query_stats import QueryStatsMiddleware
+from .replicas import ReadYourWritesMiddleware, replica_router
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, instrument_response_models, metrics
+from .config import settings
+from .responses import FastJSONResponse
+from . import db, utils
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    inventory_broker.start()
+    field_log_buffer.start()
+    replica_router.start()
+    medicine_index.start()
+    yield
+    await medicine_index.close()
+    await replica_router.close()
+    await field_log_buffer.close()
+    inventory_broker.close()
+    utils.password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # CORS for local frontend testing
 app.add_middleware(
@@ -16,10 +45,69 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Export-Watermark", "X-DB-Statements", "X-DB-Time-Ms", "X-DB-Max-Repeats"],
+)
+if settings.QUERY_STATS_ENABLED:
+    app.add_middleware(
+        QueryStatsMiddleware,
+        headers=settings.QUERY_STATS_HEADERS,
+        n_plus_one_threshold=settings.QUERY_N_PLUS_ONE_THRESHOLD,
+    )
+if replica_router.enabled:
+    app.add_middleware(ReadYourWritesMiddleware, router=replica_router)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
 )
+if settings.METRICS_ENABLED:
+    # Outermost, so request latency includes compression and the other middleware
+    app.add_middleware(MetricsMiddleware)
+    instrument_response_models()
+
+@app.exception_handler(utils.PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: utils.PasswordHashingBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is busy, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(FieldLogBufferFull)
+async def field_log_buffer_full_handler(request: Request, exc: FieldLogBufferFull):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Field logs are backing up, please retry shortly"},
+        headers={"Retry-After": "5"},
+    )
 
 app.include_router(router, prefix="/auth", tags=["Authentication"])
 app.include_router(appointment_router, prefix="/appointments", tags=["Appointments"])
 app.include_router(pharmacy_router, prefix="/pharmacies", tags=["Pharmacies"])
 app.include_router(asha_worker_router, prefix="/asha_worker", tags=["ASHA Worker"])
 app.include_router(prescriptions_router, prefix="/prescriptions", tags=["Prescriptions"])
+app.include_router(patient_router, prefix="/patients", tags=["Patients"])
+app.include_router(doctor_router, prefix="/doctors", tags=["Doctors"])
+app.include_router(export_router, prefix="/admin", tags=["Admin"])
+app.include_router(symptom_checker_router, prefix="/symptom-checker", tags=["Symptom Checker"])
+
+
+@app.get("/health/db-pool", tags=["Health"])
+def database_pool_status():
+    """Connection pool usage and checkout latency for this worker."""
+    return db.pool_status()
+
+
+@app.get("/health/replicas", tags=["Health"])
+def replica_status():
+    """Health, replication lag and pool usage of each read replica, as last probed by this worker."""
+    return replica_router.status()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Request latency, in-flight requests and hot-phase timings of this worker, in Prometheus text format."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
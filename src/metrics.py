@@ -0,0 +1,173 @@
+"""
+Prometheus metrics for this worker, served at /metrics.
+
+`MetricsMiddleware` records, for every HTTP request:
+
+- `http_request_duration_seconds{method, route, status}`: a latency histogram
+  keyed by the route template ("/pharmacies/{pharmacy_id}"), not the raw path;
+- `http_requests_in_flight`: requests currently being served;
+- `http_request_phase_seconds{route, phase}`: time spent in the known hot
+  phases, "jwt" (token decode in get_current_user), "db" (statement execution,
+  from query_stats), "bcrypt" (password hashing in utils, including waiting for
+  a pool worker) and "serialization" (response model validation and JSON
+  rendering).
+
+Code in a phase reports its time with `add_phase`, which adds to the current
+request's totals through a context variable (sync endpoints share it from the
+threadpool). The totals are folded into the histograms when the request ends,
+so every histogram write happens on the event loop thread and no lock is
+taken on the request path. Each worker process keeps its own metrics;
+Prometheus sums them across the scrape targets.
+"""
+import bisect
+import time
+from contextvars import ContextVar
+
+import fastapi.routing
+
+from . import db, query_stats
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds, fine enough at the low end for the sub-millisecond phases
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_phases: ContextVar[dict | None] = ContextVar("request_phases", default=None)
+
+
+def add_phase(phase: str, seconds: float):
+    """Adds time spent in `phase` to the request being served; a no-op outside requests."""
+    phases = _phases.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple, buckets: tuple = BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # label values -> per-bucket counts (the last one is +Inf) followed by the sum
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, seconds: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+
+    def render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        for labels, series in list(self._series.items()):
+            prefix = _labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{prefix}}} {series[-1]!r}")
+            lines.append(f"{self.name}_count{{{prefix}}} {cumulative}")
+
+
+class Metrics:
+    def __init__(self):
+        self.requests = Histogram(
+            "http_request_duration_seconds", "Time from request start to the end of the response body.",
+            ("method", "route", "status"),
+        )
+        self.phases = Histogram(
+            "http_request_phase_seconds", "Time per request spent in a hot phase.", ("route", "phase"),
+        )
+        self.in_flight = 0
+
+    def render(self) -> str:
+        lines = []
+        self.requests.render(lines)
+        lines.append("# HELP http_requests_in_flight Requests currently being served.")
+        lines.append("# TYPE http_requests_in_flight gauge")
+        lines.append(f"http_requests_in_flight {self.in_flight}")
+        self.phases.render(lines)
+        pools = db.pool_status()
+        lines.append("# HELP db_pool_checked_out Connections currently checked out of the pool.")
+        lines.append("# TYPE db_pool_checked_out gauge")
+        for name, pool in pools.items():
+            if isinstance(pool, dict):
+                lines.append(f'db_pool_checked_out{{engine="{name}"}} {pool["checked_out"]}')
+        lines.append("# HELP db_pool_timeouts_total Checkouts that timed out waiting for a connection.")
+        lines.append("# TYPE db_pool_timeouts_total counter")
+        for name, pool in pools.items():
+            if isinstance(pool, dict):
+                lines.append(f'db_pool_timeouts_total{{engine="{name}"}} {pool["timeouts"]}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        registry = self.registry
+        registry.in_flight += 1
+        started = time.perf_counter()
+        stats, stats_token = query_stats.begin_request()
+        phases = {}
+        phases_token = _phases.set(phases)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            registry.in_flight -= 1
+            _phases.reset(phases_token)
+            query_stats.end_request(stats_token)
+            route = scope.get("route")
+            template = route.path if route is not None else "unmatched"
+            registry.requests.observe((scope["method"], template, status), elapsed)
+            if stats.seconds:
+                phases["db"] = stats.seconds
+            for phase, seconds in phases.items():
+                registry.phases.observe((template, phase), seconds)
+
+
+_serialize_response = fastapi.routing.serialize_response
+
+
+async def _timed_serialize_response(*args, **kwargs):
+    started = time.perf_counter()
+    try:
+        return await _serialize_response(*args, **kwargs)
+    finally:
+        add_phase("serialization", time.perf_counter() - started)
+
+
+def instrument_response_models():
+    """
+    Times FastAPI's response_model validation. FastAPI has no hook around it,
+    so the module-level function its request handlers call is wrapped.
+    """
+    fastapi.routing.serialize_response = _timed_serialize_response
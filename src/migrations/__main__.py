@@ -0,0 +1,54 @@
+"""
+Command-line migrations, e.g.
+
+    python -m src.migrations upgrade          # apply pending migrations
+    python -m src.migrations status           # applied and pending versions
+    python -m src.migrations indexes          # missing, unused and hot-spot indexes
+"""
+import argparse
+import logging
+
+from .. import db
+from . import runner
+
+
+def _print_rows(title, rows, columns):
+    print(f"{title} ({len(rows)})")
+    for row in rows:
+        print("  " + "  ".join(f"{column}={row[column]}" for column in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.migrations", description="Versioned online schema migrations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    upgrade = commands.add_parser("upgrade", help="apply pending migrations")
+    upgrade.add_argument("--target", type=int, help="stop after this version")
+    commands.add_parser("status", help="list applied and pending migrations")
+    indexes = commands.add_parser("indexes", help="report missing and unused indexes")
+    indexes.add_argument("--all", action="store_true", help="also list the scan count of every index (Postgres)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.command == "upgrade":
+        runner.upgrade(target=args.target, log=print)
+    elif args.command == "status":
+        for row in runner.status():
+            state = f"applied {row['applied_at']:%Y-%m-%d %H:%M}" if row["applied_at"] else "pending"
+            print(f"{row['version']:04d} {row['name']:<32} {state:<24} {row['description']}")
+    else:
+        report = runner.index_report()
+        _print_rows("Foreign keys without an index", report["missing_foreign_key_indexes"], ("table", "columns", "references"))
+        _print_rows("Indexes declared in the models but missing", report["declared_but_missing"], ("table", "index", "columns"))
+        _print_rows("Indexes covered by a wider index or the primary key", report["redundant_indexes"], ("table", "index", "columns"))
+        if db.engine.dialect.name != "postgresql":
+            print("Index usage statistics need Postgres")
+            return
+        _print_rows("Unused indexes (no scans since the statistics reset)", report["unused_indexes"], ("table", "index", "bytes"))
+        _print_rows("Tables read mostly by sequential scans", report["sequential_scan_hotspots"],
+                    ("table", "rows", "seq_scans", "rows_read", "index_scans"))
+        if args.all:
+            _print_rows("Index usage", report["usage"], ("table", "index", "scans", "bytes"))
+
+
+if __name__ == "__main__":
+    main()
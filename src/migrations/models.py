@@ -0,0 +1,12 @@
+from sqlalchemy import Column, DateTime, Integer, String
+
+from ..db import Base, utcnow
+
+
+class SchemaMigration(Base):
+    """A migration from src/migrations/versions that has been applied to this database."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, nullable=False, default=utcnow)
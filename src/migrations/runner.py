@@ -0,0 +1,351 @@
+"""
+Versioned, online schema migrations.
+
+Each module in `versions/` named `NNNN_description.py` is one migration: its
+docstring says what it does and `upgrade(op)` does it through `Operations`.
+Applied versions are recorded in `schema_migrations`, so `upgrade` only runs
+what is pending, in version order, committing after each migration. Every
+operation is idempotent, so a migration interrupted half way can simply be
+run again.
+
+An empty database gets the current schema from the models and is stamped at
+the latest version without running anything. A database created before
+migrations existed (no `schema_migrations` table) runs them all.
+
+`Operations` keeps the tables online:
+
+- `create_index` uses CREATE INDEX CONCURRENTLY on Postgres, which builds
+  without blocking writes (and drops an invalid leftover of an earlier
+  interrupted build first);
+- `add_column` only adds nullable columns, which needs no table rewrite;
+- `backfill` fills a column in keyset-ordered batches with a commit per batch,
+  so no long transaction holds row locks.
+
+`index_report` finds foreign keys with no index leading with their columns,
+indexes declared in the models but missing from the database, indexes made
+redundant by a wider one and, on Postgres, indexes never scanned since the
+statistics were last reset.
+"""
+import importlib
+import logging
+import pkgutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlalchemy import Column, bindparam, inspect, select, text, update
+from sqlalchemy.schema import CreateColumn
+
+from .. import db
+from ..config import settings
+from .models import SchemaMigration
+
+logger = logging.getLogger(__name__)
+
+# Held during `upgrade` on Postgres so two deploys cannot migrate at once
+_ADVISORY_LOCK_ID = 7_416_023
+
+
+def load_models():
+    """Imports every model module so `Base.metadata` describes the whole schema."""
+    from ..appointment import models as appointment_models  # noqa: F401
+    from ..asha_worker import models as asha_worker_models  # noqa: F401
+    from ..auth import models as auth_models  # noqa: F401
+    from ..pharmacy import models as pharmacy_models  # noqa: F401
+    from ..prescriptions import models as prescription_models  # noqa: F401
+    from ..profiles import models as profile_models  # noqa: F401
+    from .. import sync  # noqa: F401  tombstones
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    description: str
+    upgrade: object
+
+
+def discover() -> list[Migration]:
+    migrations = []
+    for module_info in pkgutil.iter_modules([str(Path(__file__).parent / "versions")]):
+        number, _, name = module_info.name.partition("_")
+        if not number.isdigit():
+            continue
+        module = importlib.import_module(f"{__package__}.versions.{module_info.name}")
+        description = (module.__doc__ or name).strip().splitlines()[0]
+        migrations.append(Migration(int(number), name, description, module.upgrade))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Duplicate migration versions in {versions}")
+    return migrations
+
+
+class Operations:
+    """Online schema changes for migrations; every operation may be repeated safely."""
+
+    def __init__(self, engine, batch_size: int | None = None):
+        self.engine = engine
+        self.batch_size = batch_size or settings.MIGRATION_BATCH_SIZE
+
+    @property
+    def is_postgres(self) -> bool:
+        return self.engine.dialect.name == "postgresql"
+
+    def execute(self, statement, parameters=None):
+        """Runs one statement in its own transaction."""
+        with self.engine.begin() as connection:
+            return connection.execute(text(statement) if isinstance(statement, str) else statement, parameters or {})
+
+    def create_tables(self):
+        """Creates the tables (and their indexes) of models that have no table yet."""
+        load_models()
+        db.Base.metadata.create_all(bind=self.engine)
+
+    def has_column(self, table: str, column: str) -> bool:
+        return any(existing["name"] == column for existing in inspect(self.engine).get_columns(table))
+
+    def add_column(self, table: str, column: Column):
+        """Adds a nullable column; backfill it and add constraints in later steps."""
+        if not column.nullable:
+            raise ValueError(f"{table}.{column.name}: add columns as nullable, then backfill them")
+        if self.has_column(table, column.name):
+            return
+        ddl = CreateColumn(column).compile(dialect=self.engine.dialect)
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {ddl}")
+
+    def create_index(self, name: str, table: str, columns: list[str], unique: bool = False, where: str | None = None):
+        """Builds an index (partial when `where` is given); on Postgres without blocking writes to the table."""
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        predicate = f" WHERE {where}" if where else ""
+        if not self.is_postgres:
+            self.execute(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({', '.join(columns)}){predicate}")
+            return
+        # CONCURRENTLY cannot run inside a transaction block
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            valid = connection.execute(text(
+                "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+            ), {"name": name}).scalar()
+            if valid is False:
+                # An interrupted concurrent build leaves an invalid index that IF NOT EXISTS would keep
+                logger.warning("Dropping invalid index %s left by an interrupted build", name)
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            connection.execute(text(
+                f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({', '.join(columns)}){predicate}"
+            ))
+
+    def drop_index(self, name: str):
+        if self.is_postgres:
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        else:
+            self.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def backfill(self, table, column: str, compute, source: list[str], where=None, batch_size: int | None = None) -> int:
+        """
+        Sets `column` to `compute(*source values)` on rows where it is NULL (and
+        `where` holds), walking the integer primary key in batches with a
+        commit per batch. Returns the number of rows updated.
+        """
+        batch_size = batch_size or self.batch_size
+        key = table.primary_key.columns.values()[0]
+        target = table.c[column]
+        conditions = [target.is_(None)] + ([where] if where is not None else [])
+        statement = update(table).where(key == bindparam("_key")).values({column: bindparam("_value")})
+        updated, after = 0, None
+        while True:
+            query = select(key, *(table.c[name] for name in source)).where(*conditions)
+            if after is not None:
+                query = query.where(key > after)
+            with self.engine.begin() as connection:
+                rows = connection.execute(query.order_by(key).limit(batch_size)).all()
+                if not rows:
+                    return updated
+                connection.execute(statement, [{"_key": row[0], "_value": compute(*row[1:])} for row in rows])
+            updated += len(rows)
+            after = rows[-1][0]
+            logger.info("Backfilled %d rows of %s.%s", updated, table.name, column)
+
+
+def applied_versions(engine) -> dict[int, SchemaMigration]:
+    with db.SessionLocal(bind=engine) as session:
+        return {row.version: row for row in session.scalars(select(SchemaMigration))}
+
+
+def _has_application_tables(engine) -> bool:
+    return bool(set(inspect(engine).get_table_names()) - {SchemaMigration.__tablename__})
+
+
+def _record(engine, migration: Migration):
+    with db.SessionLocal(bind=engine) as session:
+        session.add(SchemaMigration(version=migration.version, name=migration.name))
+        session.commit()
+
+
+def upgrade(engine=None, target: int | None = None, log=logger.info) -> list[Migration]:
+    """Applies pending migrations up to `target` (default: all) and returns the ones applied."""
+    engine = engine or db.engine
+    load_models()
+    migrations = [migration for migration in discover() if target is None or migration.version <= target]
+    lock = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        if engine.dialect.name == "postgresql":
+            lock.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _ADVISORY_LOCK_ID})
+        fresh = not _has_application_tables(engine)
+        SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+        if fresh:
+            db.Base.metadata.create_all(bind=engine)
+            for migration in migrations:
+                _record(engine, migration)
+            log(f"Created the schema at version {migrations[-1].version if migrations else 0}")
+            return []
+
+        applied = applied_versions(engine)
+        operations = Operations(engine)
+        done = []
+        for migration in migrations:
+            if migration.version in applied:
+                continue
+            log(f"Applying {migration.version:04d} {migration.name}: {migration.description}")
+            started = time.perf_counter()
+            migration.upgrade(operations)
+            _record(engine, migration)
+            done.append(migration)
+            log(f"Applied {migration.version:04d} in {time.perf_counter() - started:.1f}s")
+        if not done:
+            log("Schema is up to date")
+        return done
+    finally:
+        if engine.dialect.name == "postgresql":
+            lock.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _ADVISORY_LOCK_ID})
+        lock.close()
+
+
+def status(engine=None) -> list[dict]:
+    engine = engine or db.engine
+    applied = applied_versions(engine) if inspect(engine).has_table(SchemaMigration.__tablename__) else {}
+    return [
+        {
+            "version": migration.version,
+            "name": migration.name,
+            "description": migration.description,
+            "applied_at": applied[migration.version].applied_at if migration.version in applied else None,
+        }
+        for migration in discover()
+    ]
+
+
+# --- Index report ---
+
+def _leading_columns(inspector, table: str) -> list[list[str]]:
+    """Column lists of every index, unique constraint and primary key on `table`."""
+    covered = [index["column_names"] for index in inspector.get_indexes(table)]
+    covered += [constraint["column_names"] for constraint in inspector.get_unique_constraints(table)]
+    primary_key = inspector.get_pk_constraint(table)["constrained_columns"]
+    if primary_key:
+        covered.append(primary_key)
+    return covered
+
+
+def missing_foreign_key_indexes(engine) -> list[dict]:
+    """Foreign keys whose columns do not lead any index, so joins and filters on them scan the table."""
+    inspector = inspect(engine)
+    missing = []
+    for table in inspector.get_table_names():
+        covered = _leading_columns(inspector, table)
+        for foreign_key in inspector.get_foreign_keys(table):
+            columns = foreign_key["constrained_columns"]
+            if not any(existing[:len(columns)] == columns for existing in covered):
+                missing.append({"table": table, "columns": columns, "references": foreign_key["referred_table"]})
+    return missing
+
+
+def redundant_indexes(engine) -> list[dict]:
+    """Non-unique indexes whose columns lead a wider index, a unique constraint or the primary key."""
+    inspector = inspect(engine)
+    redundant = []
+    for table in inspector.get_table_names():
+        indexes = inspector.get_indexes(table)
+        # (name, columns, unique) of everything that can serve a lookup on its leading columns;
+        # partial indexes only cover some rows
+        candidates = [
+            (index["name"], index["column_names"], index["unique"]) for index in indexes
+            if not any(option.endswith("_where") for option in index.get("dialect_options", {}))
+        ]
+        candidates += [(c["name"], c["column_names"], True) for c in inspector.get_unique_constraints(table)]
+        primary_key = inspector.get_pk_constraint(table)
+        if primary_key["constrained_columns"]:
+            candidates.append((primary_key["name"], primary_key["constrained_columns"], True))
+        for index in indexes:
+            columns = index["column_names"]
+            if index["unique"] or None in columns:
+                continue
+            if any(
+                name != index["name"] and other[:len(columns)] == columns and (unique or len(other) > len(columns))
+                for name, other, unique in candidates
+            ):
+                redundant.append({"table": table, "index": index["name"], "columns": columns})
+    return redundant
+
+
+def undeclared_indexes(engine) -> list[dict]:
+    """Indexes declared in the models that the database does not have (pending migrations or drift)."""
+    load_models()
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {index["name"] for index in inspector.get_indexes(table.name)}
+        present |= {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+        for index in table.indexes:
+            if index.name not in present:
+                missing.append({"table": table.name, "index": index.name, "columns": [c.name for c in index.columns]})
+    return missing
+
+
+def index_usage(engine) -> list[dict]:
+    """Postgres scan counts and sizes for every index, least used first; empty elsewhere."""
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.connect() as connection:
+        rows = connection.execute(text(
+            "SELECT s.relname, s.indexrelname, s.idx_scan, pg_relation_size(s.indexrelid), "
+            "i.indisunique OR i.indisprimary "
+            "FROM pg_stat_user_indexes s JOIN pg_index i ON i.indexrelid = s.indexrelid "
+            "ORDER BY s.idx_scan, pg_relation_size(s.indexrelid) DESC"
+        )).all()
+    return [
+        {"table": table, "index": index, "scans": scans, "bytes": size, "enforces_constraint": constraint}
+        for table, index, scans, size, constraint in rows
+    ]
+
+
+def sequential_scan_hotspots(engine, min_rows: int = 10_000) -> list[dict]:
+    """Postgres tables of at least `min_rows` read by sequential scans more often than by index."""
+    if engine.dialect.name != "postgresql":
+        return []
+    with engine.connect() as connection:
+        rows = connection.execute(text(
+            "SELECT relname, seq_scan, seq_tup_read, coalesce(idx_scan, 0), n_live_tup FROM pg_stat_user_tables "
+            "WHERE n_live_tup >= :min_rows AND seq_scan > coalesce(idx_scan, 0) ORDER BY seq_tup_read DESC"
+        ), {"min_rows": min_rows}).all()
+    return [
+        {"table": table, "seq_scans": seq_scans, "rows_read": rows_read, "index_scans": index_scans, "rows": live}
+        for table, seq_scans, rows_read, index_scans, live in rows
+    ]
+
+
+def index_report(engine=None) -> dict:
+    engine = engine or db.engine
+    usage = index_usage(engine)
+    return {
+        "missing_foreign_key_indexes": missing_foreign_key_indexes(engine),
+        "declared_but_missing": undeclared_indexes(engine),
+        "redundant_indexes": redundant_indexes(engine),
+        "unused_indexes": [row for row in usage if row["scans"] == 0 and not row["enforces_constraint"]],
+        "sequential_scan_hotspots": sequential_scan_hotspots(engine),
+        "usage": usage,
+    }
@@ -0,0 +1,5 @@
+"""Create tables for models that have none yet (never alters or drops existing tables)."""
+
+
+def upgrade(op):
+    op.create_tables()
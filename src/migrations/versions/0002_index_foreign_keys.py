@@ -0,0 +1,22 @@
+"""Index the foreign keys that profile lookups and ownership checks filter on.
+
+`load_principal` joins every profile table on `user_id` for each login and
+principal cache miss, ASHA workers list their patients by
+`managed_by_asha_id` and pharmacists their pharmacies by `pharmacist_id`.
+The appointment, medicine and prescription foreign keys lead the composite
+indexes that 0004 builds.
+"""
+
+INDEXES = (
+    ("ix_patients_user_id", "patients", ["user_id"]),
+    ("ix_patients_managed_by_asha_id", "patients", ["managed_by_asha_id"]),
+    ("ix_doctors_user_id", "doctors", ["user_id"]),
+    ("ix_pharmacists_user_id", "pharmacists", ["user_id"]),
+    ("ix_asha_workers_user_id", "asha_workers", ["user_id"]),
+    ("ix_pharmacies_pharmacist_id", "pharmacies", ["pharmacist_id"]),
+)
+
+
+def upgrade(op):
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
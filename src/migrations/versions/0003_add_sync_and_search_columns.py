@@ -0,0 +1,41 @@
+"""Add the sync, search and scheduling columns to tables that predate them.
+
+`create_all` in 0001 only creates missing tables, so a database built before
+this series lacks every column added to an existing table since: the
+`updated_at`/`version` pair of synced and versioned rows, the schedule
+template and triage report of appointments, the doctor's village and the
+normalized medicine name. They are added nullable; `version` takes its
+server default on existing rows and the others are backfilled in batches.
+New rows get them from the model defaults.
+"""
+from sqlalchemy import Column, DateTime, Integer, String, Text
+
+from ...db import utcnow
+from ...pharmacy.models import Medicine
+from ...pharmacy.search import normalize_medicine_name
+from ...appointment.models import Appointment
+from ...prescriptions.models import Prescription
+
+COLUMNS = (
+    ("appointments", Column("template_id", Integer, nullable=True)),
+    ("appointments", Column("triage_report", Text, nullable=True)),
+    ("appointments", Column("updated_at", DateTime, nullable=True)),
+    ("appointments", Column("version", Integer, nullable=True, server_default="1")),
+    ("doctors", Column("village", String, nullable=True)),
+    ("medicines", Column("normalized_name", String, nullable=True)),
+    ("medicines", Column("version", Integer, nullable=True, server_default="1")),
+    ("medicines", Column("updated_at", DateTime, nullable=True)),
+    ("prescriptions", Column("updated_at", DateTime, nullable=True)),
+    ("prescriptions", Column("version", Integer, nullable=True, server_default="1")),
+)
+
+
+def upgrade(op):
+    for table, column in COLUMNS:
+        op.add_column(table, column)
+
+    now = utcnow()
+    op.backfill(Appointment.__table__, "updated_at", lambda: now, [])
+    op.backfill(Medicine.__table__, "updated_at", lambda: now, [])
+    op.backfill(Prescription.__table__, "updated_at", lambda created_at: created_at or now, ["created_at"])
+    op.backfill(Medicine.__table__, "normalized_name", lambda name: normalize_medicine_name(name or ""), ["name"])
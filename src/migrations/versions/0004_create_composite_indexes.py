@@ -0,0 +1,47 @@
+"""Build the composite indexes and the medicine upsert key on existing tables.
+
+These lead with the appointment, medicine and prescription foreign keys, so
+they also index those for joins and ownership checks. Bulk inventory upserts
+conflict on `uq_medicines_pharmacy_name`; rows that already repeat a
+pharmacy's medicine name are merged into the oldest one, summing their stock,
+before it is built.
+"""
+from sqlalchemy import text
+
+INDEXES = (
+    ("ix_appointments_status_datetime", "appointments", ["status", "appointment_datetime"]),
+    ("ix_appointments_patient_updated", "appointments", ["patient_profile_id", "updated_at", "id"]),
+    ("ix_appointments_doctor_datetime", "appointments", ["doctor_profile_id", "appointment_datetime"]),
+    ("ix_appointments_template_id", "appointments", ["template_id"]),
+    ("ix_doctors_village", "doctors", ["village"]),
+    ("ix_medicines_normalized_name", "medicines", ["normalized_name", "quantity", "pharmacy_id"]),
+    ("ix_prescriptions_patient_updated", "prescriptions", ["patient_id", "updated_at", "id"]),
+)
+
+
+def merge_duplicate_medicines(op) -> int:
+    """Folds medicines repeating a (pharmacy, name) pair into the lowest id; returns the rows removed."""
+    with op.engine.begin() as connection:
+        duplicates = connection.execute(text(
+            "SELECT pharmacy_id, name, min(id), sum(coalesce(quantity, 0)) FROM medicines "
+            "WHERE pharmacy_id IS NOT NULL AND name IS NOT NULL "
+            "GROUP BY pharmacy_id, name HAVING count(*) > 1"
+        )).all()
+        removed = 0
+        for pharmacy_id, name, keep, quantity in duplicates:
+            connection.execute(
+                text("UPDATE medicines SET quantity = :quantity, version = version + 1 WHERE id = :keep"),
+                {"quantity": quantity, "keep": keep},
+            )
+            removed += connection.execute(
+                text("DELETE FROM medicines WHERE pharmacy_id = :pharmacy_id AND name = :name AND id <> :keep"),
+                {"pharmacy_id": pharmacy_id, "name": name, "keep": keep},
+            ).rowcount
+    return removed
+
+
+def upgrade(op):
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+    merge_duplicate_medicines(op)
+    op.create_index("uq_medicines_pharmacy_name", "medicines", ["pharmacy_id", "name"], unique=True)
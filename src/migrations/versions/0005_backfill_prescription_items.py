@@ -0,0 +1,9 @@
+"""Split free-text prescriptions into line items."""
+from ...config import settings
+from ...db import SessionLocal
+from ...prescriptions import items
+
+
+def upgrade(op):
+    with SessionLocal(bind=op.engine) as session:
+        items.backfill_prescriptions(session, settings.PRESCRIPTION_BACKFILL_BATCH_SIZE)
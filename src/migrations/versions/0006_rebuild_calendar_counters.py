@@ -0,0 +1,13 @@
+"""Count existing appointments into the per-day calendar counters.
+
+Bookings and status changes only apply deltas, so counters that start empty
+on a database with appointments would go negative.
+"""
+from ...appointment import calendar
+from ...db import SessionLocal
+
+
+def upgrade(op):
+    with SessionLocal(bind=op.engine) as session:
+        calendar.rebuild(session)
+        session.commit()
@@ -0,0 +1,62 @@
+"""Allow a doctor one open, booked or completed slot per time.
+
+Slot generation inserts with ON CONFLICT DO NOTHING against this index, so
+concurrent materializations and template edits cannot store a slot twice.
+Open duplicates left by earlier races are deleted first (they were never
+booked, so they leave no tombstones) and the affected doctors' calendar
+counters are recounted. Duplicates that are all booked or completed need a
+person to decide which to keep, and stop the migration.
+"""
+from sqlalchemy import bindparam, text
+
+from ...appointment import calendar
+from ...db import SessionLocal
+
+ACTIVE = "status <> 'cancelled'"
+
+
+def remove_duplicate_open_slots(op) -> set[int]:
+    """Deletes open slots that repeat another active slot of the doctor; returns the affected doctors."""
+    with op.engine.begin() as connection:
+        groups = connection.execute(text(
+            "SELECT doctor_profile_id, appointment_datetime FROM appointments "
+            f"WHERE doctor_profile_id IS NOT NULL AND {ACTIVE} "
+            "GROUP BY doctor_profile_id, appointment_datetime HAVING count(*) > 1"
+        )).all()
+        doctors = set()
+        for doctor_id, when in groups:
+            slots = connection.execute(text(
+                "SELECT id, status, patient_profile_id FROM appointments "
+                f"WHERE doctor_profile_id = :doctor_id AND appointment_datetime = :when AND {ACTIVE} ORDER BY id"
+            ), {"doctor_id": doctor_id, "when": when}).all()
+            # Keep a booked or completed slot if there is one, else the oldest open one
+            keep = next((slot for slot in slots if slot.status != "available"), slots[0])
+            removable = [
+                slot.id for slot in slots
+                if slot is not keep and slot.status == "available" and slot.patient_profile_id is None
+                and connection.execute(text("SELECT 1 FROM prescriptions WHERE appointment_id = :id LIMIT 1"),
+                                       {"id": slot.id}).first() is None
+            ]
+            if len(removable) < len(slots) - 1:
+                raise RuntimeError(
+                    f"Doctor {doctor_id} has several booked or completed appointments at {when}; "
+                    "cancel all but one before migrating"
+                )
+            connection.execute(
+                text("DELETE FROM appointments WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": removable},
+            )
+            doctors.add(doctor_id)
+    return doctors
+
+
+def upgrade(op):
+    doctors = remove_duplicate_open_slots(op)
+    if doctors:
+        with SessionLocal(bind=op.engine) as session:
+            calendar.rebuild(session, doctors)
+            session.commit()
+    op.create_index(
+        "uq_appointments_doctor_datetime", "appointments", ["doctor_profile_id", "appointment_datetime"],
+        unique=True, where=ACTIVE,
+    )
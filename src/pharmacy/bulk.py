@@ -0,0 +1,196 @@
+"""
+Bulk inventory reconciliation for a single pharmacy.
+
+The request body is parsed as it streams in, either as CSV with a
+`name,quantity` header or as newline-delimited JSON objects carrying the same
+keys. Valid rows are upserted by `(pharmacy_id, name)` using multi-row
+`INSERT ... ON CONFLICT DO UPDATE` statements in one transaction, so a feed of
+a few thousand SKUs costs a handful of round trips instead of one per row.
+Rows are collected before the transaction is opened, so a slow upload never
+holds a pooled connection.
+"""
+import codecs
+import csv
+import json
+import time
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+
+from .. import db as database
+from . import models as pharmacy_models
+from .events import inventory_broker
+from .search import medicine_index
+from ..responses import hot_responses
+from ..config import settings
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json")
+
+
+class _Row:
+    __slots__ = ("line", "name", "quantity", "status", "medicine_id", "error")
+
+    def __init__(self, line, name=None, quantity=None, status="error", error=None):
+        self.line = line
+        self.name = name
+        self.quantity = quantity
+        self.status = status
+        self.medicine_id = None
+        self.error = error
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+async def _iter_lines(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def _validate(line_number, name, quantity) -> _Row:
+    name = name.strip() if isinstance(name, str) else None
+    if not name:
+        return _Row(line_number, error="name is required")
+    try:
+        if isinstance(quantity, bool) or (isinstance(quantity, float) and not quantity.is_integer()):
+            raise ValueError
+        quantity = int(quantity.strip() if isinstance(quantity, str) else quantity)
+    except (TypeError, ValueError):
+        return _Row(line_number, name=name, error="quantity must be an integer")
+    if quantity < 0:
+        return _Row(line_number, name=name, quantity=quantity, error="quantity must not be negative")
+    return _Row(line_number, name=name, quantity=quantity, status="pending")
+
+
+async def parse_inventory_stream(chunks, content_type: str | None) -> list[_Row]:
+    """
+    Parses a CSV or NDJSON inventory body into rows, validating each one.
+    Quoted CSV fields may not span lines.
+    """
+    is_ndjson = None
+    if content_type:
+        is_ndjson = content_type.split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES
+    header = None
+    rows = []
+    line_number = 0
+    async for line in _iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        if is_ndjson is None:
+            is_ndjson = line.lstrip().startswith("{")
+        if len(rows) >= settings.BULK_INVENTORY_MAX_ROWS:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"At most {settings.BULK_INVENTORY_MAX_ROWS} rows can be uploaded at once",
+            )
+
+        if is_ndjson:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                rows.append(_Row(line_number, error="invalid JSON"))
+                continue
+            if not isinstance(record, dict):
+                rows.append(_Row(line_number, error="expected a JSON object"))
+                continue
+            rows.append(_validate(line_number, record.get("name"), record.get("quantity")))
+            continue
+
+        fields = next(csv.reader([line]))
+        if header is None:
+            header = [field.strip().lower() for field in fields]
+            if "name" not in header or "quantity" not in header:
+                raise HTTPException(status_code=400, detail="CSV header must contain 'name' and 'quantity' columns")
+            continue
+        record = dict(zip(header, fields))
+        rows.append(_validate(line_number, record.get("name"), record.get("quantity")))
+    return rows
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def apply_inventory_upsert(db, pharmacy_id: int, pharmacist_id: int | None, rows: list[_Row], started: float) -> dict:
+    """
+    Upserts the valid rows in one transaction and returns the per-row summary.
+    Throughput is measured from `started` (a perf_counter reading taken before parsing).
+    """
+    pharmacy = db.query(pharmacy_models.Pharmacy).filter(pharmacy_models.Pharmacy.id == pharmacy_id).first()
+    if not pharmacy:
+        raise HTTPException(status_code=404, detail="Pharmacy not found")
+
+    if pharmacy.pharmacist_id != pharmacist_id:
+        raise HTTPException(status_code=403, detail="Not authorized to update this pharmacy inventory")
+
+    # A statement cannot update the same conflicting row twice, so the last
+    # occurrence of a name wins and earlier ones are reported as duplicates.
+    latest: dict[str, _Row] = {}
+    for row in rows:
+        if row.status != "pending":
+            continue
+        if row.name in latest:
+            latest[row.name].status = "duplicate"
+        latest[row.name] = row
+
+    table = pharmacy_models.Medicine.__table__
+    batch_size = settings.BULK_INVENTORY_BATCH_SIZE
+    try:
+        names = list(latest)
+        existing = set()
+        for batch in _batches(names, batch_size):
+            existing.update(db.execute(
+                select(table.c.name).where(table.c.pharmacy_id == pharmacy_id, table.c.name.in_(batch))
+            ).scalars())
+
+        upserted = []
+        for batch in _batches(list(latest.values()), batch_size):
+            stmt = database.dialect_insert(db, table).values([
+                {"pharmacy_id": pharmacy_id, "name": row.name, "quantity": row.quantity} for row in batch
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.pharmacy_id, table.c.name],
+                # ON CONFLICT DO UPDATE does not apply column onupdate defaults
+                set_={"quantity": stmt.excluded.quantity, "version": table.c.version + 1, "updated_at": database.utcnow()},
+            ).returning(table.c.id, table.c.name, table.c.quantity, table.c.version)
+            upserted.extend(db.execute(stmt).all())
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for medicine_id, name, quantity, _ in upserted:
+        row = latest[name]
+        row.medicine_id = medicine_id
+        row.status = "updated" if name in existing else "inserted"
+        medicine_index.upsert_medicine(medicine_id, pharmacy_id, name, quantity)
+    hot_responses.invalidate("pharmacies")
+    inventory_broker.publish_stock(
+        (medicine_id, pharmacy_id, name, quantity, version) for medicine_id, name, quantity, version in upserted
+    )
+
+    elapsed = time.perf_counter() - started
+    counts = {"inserted": 0, "updated": 0, "error": 0}
+    for row in rows:
+        if row.status in counts:
+            counts[row.status] += 1
+    return {
+        "pharmacy_id": pharmacy_id,
+        "received": len(rows),
+        "inserted": counts["inserted"],
+        "updated": counts["updated"],
+        "failed": counts["error"],
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_second": round(len(rows) / elapsed, 1) if elapsed > 0 else 0.0,
+        "rows": [row.as_dict() for row in rows],
+    }
@@ -0,0 +1,163 @@
+"""
+In-process pub/sub for inventory changes.
+
+Every stock mutation publishes a small delta (medicine id, quantity, version)
+through a backend, and the backend hands it to `InventoryBroker.deliver` in
+each worker, which fans it out to the subscribers of that pharmacy or
+medicine. Subscribers are indexed by topic, so a publish only touches the
+queues that asked for it; an idle subscriber costs one small bounded queue and
+its streaming coroutine.
+
+`LocalBackend` only reaches subscribers in the publishing process. A
+cross-worker backend (Redis pub/sub, Postgres LISTEN/NOTIFY, ...) implements
+the same `start`/`publish`/`stop` methods: `publish` forwards the events to the
+shared channel and every message read back from it, including the worker's
+own, is passed to the `deliver` callback given to `start`.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from ..config import settings
+
+# Sent instead of the dropped events when a subscriber falls behind; the
+# client should refetch the inventory it is watching.
+RESYNC = {"type": "resync"}
+
+MAX_TOPICS_PER_SUBSCRIPTION = 200
+
+
+class LocalBackend:
+    def __init__(self):
+        self._deliver = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, events: list[dict]):
+        if self._deliver is not None:
+            self._deliver(events)
+
+    def stop(self):
+        self._deliver = None
+
+
+class Subscription:
+    def __init__(self, broker: "InventoryBroker", queue_size: int):
+        self._broker = broker
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.pharmacy_ids: frozenset[int] = frozenset()
+        self.medicine_ids: frozenset[int] = frozenset()
+
+    async def get(self) -> dict:
+        return await self._queue.get()
+
+    def update(self, pharmacy_ids, medicine_ids):
+        self._broker._index(self, frozenset(pharmacy_ids), frozenset(medicine_ids))
+
+    def close(self):
+        self._broker._index(self, frozenset(), frozenset())
+
+    def _offer(self, event: dict):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(RESYNC)
+
+
+class InventoryBroker:
+    def __init__(self, backend, queue_size: int):
+        self.queue_size = queue_size
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+        self._by_pharmacy: dict[int, set[Subscription]] = defaultdict(set)
+        self._by_medicine: dict[int, set[Subscription]] = defaultdict(set)
+        self._backend = backend
+
+    def use_backend(self, backend):
+        """Swaps the backend; call before `start`."""
+        self._backend = backend
+
+    def start(self):
+        self._backend.start(self.deliver)
+
+    def close(self):
+        self._backend.stop()
+
+    # --- Subscribers (event loop only) ---
+
+    def subscribe(self, pharmacy_ids=(), medicine_ids=()) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self, self.queue_size)
+        subscription.update(pharmacy_ids, medicine_ids)
+        return subscription
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            subscribers = set()
+            for topics in (self._by_pharmacy, self._by_medicine):
+                for subscriptions in topics.values():
+                    subscribers |= subscriptions
+            return len(subscribers)
+
+    def _index(self, subscription: Subscription, pharmacy_ids: frozenset, medicine_ids: frozenset):
+        with self._lock:
+            for topics, old, new in (
+                (self._by_pharmacy, subscription.pharmacy_ids, pharmacy_ids),
+                (self._by_medicine, subscription.medicine_ids, medicine_ids),
+            ):
+                for topic in old - new:
+                    topics[topic].discard(subscription)
+                    if not topics[topic]:
+                        del topics[topic]
+                for topic in new - old:
+                    topics[topic].add(subscription)
+            subscription.pharmacy_ids = pharmacy_ids
+            subscription.medicine_ids = medicine_ids
+
+    # --- Publishing (any thread) ---
+
+    def publish_stock(self, rows):
+        """Publishes `(medicine_id, pharmacy_id, name, quantity, version)` rows."""
+        events = [
+            {
+                "type": "stock",
+                "pharmacy_id": pharmacy_id,
+                "medicine_id": medicine_id,
+                "name": name,
+                "quantity": quantity,
+                "version": version,
+            }
+            for medicine_id, pharmacy_id, name, quantity, version in rows
+        ]
+        if events:
+            self._backend.publish(events)
+
+    def deliver(self, events: list[dict]):
+        """Backend callback: fans events out to this worker's subscribers."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._fan_out(events)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, events)
+
+    def _fan_out(self, events: list[dict]):
+        with self._lock:
+            targets = [
+                (event, self._by_pharmacy.get(event["pharmacy_id"], set()) | self._by_medicine.get(event["medicine_id"], set()))
+                for event in events
+            ]
+        for event, subscriptions in targets:
+            for subscription in subscriptions:
+                subscription._offer(event)
+
+
+inventory_broker = InventoryBroker(LocalBackend(), queue_size=settings.INVENTORY_FEED_QUEUE_SIZE)
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, DateTime, Index, Integer, String, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
-from ..db import Base
+from ..db import Base, utcnow
 
 class Pharmacy(Base):
     __tablename__ = "pharmacies"
@@ -8,18 +8,34 @@ class Pharmacy(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     location = Column(String)
-    pharmacist_id = Column(Integer, ForeignKey("pharmacists.pharmacist_id"))
+    pharmacist_id = Column(Integer, ForeignKey("pharmacists.pharmacist_id"), index=True)
 
     # Add back_populates and lazy="joined"
     pharmacist = relationship("Pharmacist", back_populates="pharmacy", lazy="joined")
     medicines = relationship("Medicine", back_populates="pharmacy")
 
+def _normalized_name(context):
+    from .search import normalize_medicine_name  # search imports this module
+    return normalize_medicine_name(context.get_current_parameters().get("name") or "")
+
+
 class Medicine(Base):
     __tablename__ = "medicines"
+    __table_args__ = (
+        # Upsert key for bulk inventory reconciliation
+        UniqueConstraint("pharmacy_id", "name", name="uq_medicines_pharmacy_name"),
+        # Serves prescription fulfillment: name equality, stock check and pharmacy from the index
+        Index("ix_medicines_normalized_name", "normalized_name", "quantity", "pharmacy_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
+    # Set on insert, including Core and bulk inserts; names are never renamed in place
+    normalized_name = Column(String, nullable=True, default=_normalized_name)
     quantity = Column(Integer)
+    # Bumped on every stock change so feed subscribers can discard stale deltas
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
     pharmacy_id = Column(Integer, ForeignKey("pharmacies.id"))
 
     # Add back_populates
@@ -1,20 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import asyncio
+import json
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from typing import List
 
-from .. import db
+from .. import db, replicas
 from . import schemas
 from . import models as pharmacy_models
-from ..auth import models as auth_models
+from .bulk import apply_inventory_upsert, parse_inventory_stream
+from .events import MAX_TOPICS_PER_SUBSCRIPTION, inventory_broker
+from .search import medicine_index
 from ..auth.dependencies import role_checker
+from ..auth.principal import Principal
+from ..config import settings
+from ..projection import FieldSet, render_rows
+from ..responses import hot_responses, serialize
 
 router = APIRouter()
 
+_Pharmacy = pharmacy_models.Pharmacy
+_Medicine = pharmacy_models.Medicine
+
+# Fields for `?fields=` on the pharmacy and inventory lists (see projection.py)
+PHARMACY_FIELDS = FieldSet(
+    _Pharmacy,
+    fields={
+        "id": _Pharmacy.id,
+        "name": _Pharmacy.name,
+        "location": _Pharmacy.location,
+        "pharmacist_id": _Pharmacy.pharmacist_id,
+        "medicine_count": select(func.count()).where(_Medicine.pharmacy_id == _Pharmacy.id).scalar_subquery(),
+        "in_stock_count": select(func.count()).where(
+            _Medicine.pharmacy_id == _Pharmacy.id, _Medicine.quantity > 0
+        ).scalar_subquery(),
+    },
+    profiles={"lite": ["id", "name", "location"]},
+)
+
+MEDICINE_FIELDS = FieldSet(
+    _Medicine,
+    fields={
+        "id": _Medicine.id,
+        "name": _Medicine.name,
+        "normalized_name": _Medicine.normalized_name,
+        "quantity": _Medicine.quantity,
+        "version": _Medicine.version,
+        "updated_at": _Medicine.updated_at,
+        "pharmacy_id": _Medicine.pharmacy_id,
+    },
+    profiles={"lite": ["id", "name", "quantity"]},
+)
+
+_FIELDS = Query(None, description="Comma-separated fields, or a profile such as `lite`, for a flat projection")
+
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.Pharmacy)
 def create_pharmacy(
     pharmacy: schemas.PharmacyCreate,
     db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["pharmacist"]))
+    current_user: Principal = Depends(role_checker(allowed_roles=["pharmacist"]))
 ):
     """
     Creates a new pharmacy.
@@ -23,11 +73,12 @@ def create_pharmacy(
     """
     new_pharmacy = pharmacy_models.Pharmacy(
         **pharmacy.dict(), 
-        pharmacist_id=current_user.pharmacist_profile.pharmacist_id
+        pharmacist_id=current_user.pharmacist_id
     )
     db.add(new_pharmacy)
     db.commit()
     db.refresh(new_pharmacy)
+    medicine_index.upsert_pharmacy(new_pharmacy.id, new_pharmacy.name, new_pharmacy.location)
     return new_pharmacy
 
 @router.post("/{pharmacy_id}/medicines", status_code=status.HTTP_201_CREATED, response_model=schemas.Medicine)
@@ -35,7 +86,7 @@ def add_medicine_to_inventory(
     pharmacy_id: int, 
     medicine: schemas.MedicineCreate,
     db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["pharmacist"]))
+    current_user: Principal = Depends(role_checker(allowed_roles=["pharmacist"]))
 ):
     """
     Adds a new medicine to a specific pharmacy's inventory.
@@ -46,45 +97,212 @@ def add_medicine_to_inventory(
     if not pharmacy:
         raise HTTPException(status_code=404, detail="Pharmacy not found")
     
-    if pharmacy.pharmacist_id != current_user.pharmacist_profile.pharmacist_id:
+    if pharmacy.pharmacist_id != current_user.pharmacist_id:
         raise HTTPException(status_code=403, detail="Not authorized to add medicine to this pharmacy")
 
     new_medicine = pharmacy_models.Medicine(**medicine.dict(), pharmacy_id=pharmacy_id)
     db.add(new_medicine)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Medicine already exists in this pharmacy; update its quantity instead")
     db.refresh(new_medicine)
+    medicine_index.upsert_medicine(new_medicine.id, pharmacy_id, new_medicine.name, new_medicine.quantity)
+    inventory_broker.publish_stock([
+        (new_medicine.id, pharmacy_id, new_medicine.name, new_medicine.quantity, new_medicine.version)
+    ])
     return new_medicine
 
+@router.post("/{pharmacy_id}/medicines/bulk", response_model=schemas.BulkInventoryResult)
+async def bulk_upsert_inventory(
+    pharmacy_id: int,
+    request: Request,
+    db: Session = Depends(db.get_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["pharmacist"]))
+):
+    """
+    Reconciles a pharmacy's inventory from a streamed CSV or NDJSON body.
+    - **Security**: Only pharmacists can update.
+    - **Ownership Check**: Pharmacist must own the pharmacy.
+    - CSV needs a `name,quantity` header; NDJSON is one `{"name": ..., "quantity": ...}` per line.
+    - Each medicine is inserted or has its quantity set by `(pharmacy, name)`, all in one transaction.
+    - Invalid rows are reported individually and do not block the rest of the upload.
+    """
+    started = time.perf_counter()
+    # Hand back any connection the auth lookup checked out before waiting on the upload
+    await run_in_threadpool(db.rollback)
+    rows = await parse_inventory_stream(request.stream(), request.headers.get("content-type"))
+    return await run_in_threadpool(
+        apply_inventory_upsert, db, pharmacy_id, current_user.pharmacist_id, rows, started
+    )
+
+@router.get("/search", response_model=List[schemas.PharmacySearchResult])
+async def search_medicine(
+    medicine: str = Query(..., min_length=1),
+    location: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(db.get_async_db)
+):
+    """
+    Finds pharmacies that have a medicine in stock, best match first.
+    - This is a public endpoint for patients to use.
+    - Matches exact names, prefixes, typos and Hindi/Punjabi spellings (e.g. `पैरासिटामोल`).
+    - `location` optionally restricts results to pharmacies whose location contains it.
+    """
+    await medicine_index.ensure_fresh(db)
+    return medicine_index.search(medicine, location=location, limit=limit)
+
+def _check_topics(pharmacy_ids: list[int], medicine_ids: list[int]):
+    if len(pharmacy_ids) + len(medicine_ids) > MAX_TOPICS_PER_SUBSCRIPTION:
+        raise ValueError(f"At most {MAX_TOPICS_PER_SUBSCRIPTION} pharmacies and medicines can be watched at once")
+
+def _parse_topics(message) -> tuple[list[int], list[int]]:
+    if not isinstance(message, dict):
+        raise ValueError('Expected {"pharmacy_ids": [...], "medicine_ids": [...]}')
+    try:
+        pharmacy_ids = [int(i) for i in message.get("pharmacy_ids") or []]
+        medicine_ids = [int(i) for i in message.get("medicine_ids") or []]
+    except (TypeError, ValueError):
+        raise ValueError("pharmacy_ids and medicine_ids must be lists of integers")
+    _check_topics(pharmacy_ids, medicine_ids)
+    return pharmacy_ids, medicine_ids
+
+@router.get("/inventory/changes")
+async def stream_inventory_changes(
+    pharmacy_id: List[int] = Query([]),
+    medicine_id: List[int] = Query([]),
+):
+    """
+    Server-sent events with stock deltas for the given pharmacies and/or medicines.
+    - This is a public endpoint for patients to use.
+    - Each `stock` event carries `medicine_id`, `quantity` and `version`; ignore versions older than the one you hold.
+    - A `resync` event means deltas were dropped and the inventory should be refetched.
+    """
+    if not pharmacy_id and not medicine_id:
+        raise HTTPException(status_code=400, detail="Pass at least one pharmacy_id or medicine_id")
+    try:
+        _check_topics(pharmacy_id, medicine_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    async def events():
+        subscription = inventory_broker.subscribe(pharmacy_id, medicine_id)
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), settings.INVENTORY_FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/inventory/ws")
+async def inventory_changes_websocket(
+    websocket: WebSocket,
+    pharmacy_id: List[int] = Query([]),
+    medicine_id: List[int] = Query([]),
+):
+    """
+    WebSocket variant of `/inventory/changes`.
+    Send `{"pharmacy_ids": [...], "medicine_ids": [...]}` at any time to replace the watched set.
+    """
+    await websocket.accept()
+    subscription = inventory_broker.subscribe()
+
+    async def forward():
+        while True:
+            await websocket.send_json(await subscription.get())
+
+    sender = asyncio.create_task(forward())
+    try:
+        message = {"pharmacy_ids": pharmacy_id, "medicine_ids": medicine_id}
+        while True:
+            try:
+                subscription.update(*_parse_topics(message))
+            except ValueError as exc:
+                await websocket.send_json({"type": "error", "detail": str(exc)})
+            try:
+                message = await websocket.receive_json()
+            except ValueError:
+                message = None
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        subscription.close()
+
 @router.get("/{pharmacy_id}/medicines", response_model=List[schemas.Medicine])
-def get_pharmacy_inventory(pharmacy_id: int, db: Session = Depends(db.get_db)):
+async def get_pharmacy_inventory(
+    pharmacy_id: int,
+    fields: str | None = _FIELDS,
+    db: AsyncSession = Depends(replicas.get_async_read_db)
+):
     """
     Gets the medicine stock for a specific pharmacy.
     - This is a public endpoint for patients to use.
+    - `fields` (e.g. `id,name,quantity` or `lite`) returns flat rows with only those fields.
     """
-    medicines = db.query(pharmacy_models.Medicine).filter(pharmacy_models.Medicine.pharmacy_id == pharmacy_id).all()
-    return medicines
+    names = MEDICINE_FIELDS.parse(fields)
+    if names is not None:
+        rows = await db.execute(MEDICINE_FIELDS.select(names).where(_Medicine.pharmacy_id == pharmacy_id))
+        return Response(content=render_rows(names, rows), media_type="application/json")
+    result = await db.execute(
+        select(pharmacy_models.Medicine).where(pharmacy_models.Medicine.pharmacy_id == pharmacy_id)
+    )
+    return result.scalars().all()
 
 @router.get("/pharmacist/me", response_model=List[schemas.Pharmacy])
-def get_my_pharmacies(
-    db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["pharmacist"]))
+async def get_my_pharmacies(
+    fields: str | None = _FIELDS,
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["pharmacist"]))
 ):
     """
     Gets a list of pharmacies owned by the currently logged-in pharmacist.
     - **Security**: Protected endpoint for 'pharmacist' roles only.
+    - `fields` (e.g. `id,name,in_stock_count` or `lite`) returns flat rows without the medicine lists.
     """
-    pharmacies = db.query(pharmacy_models.Pharmacy).filter(
-        pharmacy_models.Pharmacy.pharmacist_id == current_user.pharmacist_profile.pharmacist_id
-    ).all()
-    return pharmacies
+    names = PHARMACY_FIELDS.parse(fields)
+    if names is not None:
+        rows = await db.execute(PHARMACY_FIELDS.select(names).where(_Pharmacy.pharmacist_id == current_user.pharmacist_id))
+        return Response(content=render_rows(names, rows), media_type="application/json")
+    result = await db.execute(select(pharmacy_models.Pharmacy).options(
+        selectinload(pharmacy_models.Pharmacy.medicines)
+    ).where(
+        pharmacy_models.Pharmacy.pharmacist_id == current_user.pharmacist_id
+    ))
+    return result.scalars().all()
 
 @router.get("/", response_model=List[schemas.Pharmacy])
-def list_all_pharmacies(db: Session = Depends(db.get_db)):
+async def list_all_pharmacies(
+    request: Request,
+    fields: str | None = _FIELDS,
+    db: AsyncSession = Depends(replicas.get_async_read_db)
+):
     """
     Public endpoint: list all pharmacies.
+    Served from the pre-compressed hot cache (`X-Cache: HIT`) while the inventory is unchanged.
+    `fields` (e.g. `id,name,location,in_stock_count` or `lite`) returns flat rows without the medicine lists.
     """
-    pharmacies = db.query(pharmacy_models.Pharmacy).all()
-    return pharmacies
+    names = PHARMACY_FIELDS.parse(fields)
+    cached = hot_responses.get(request, "pharmacies")
+    if cached:
+        return cached
+    if names is not None:
+        rows = await db.execute(PHARMACY_FIELDS.select(names).order_by(_Pharmacy.id))
+        return hot_responses.put(request, "pharmacies", render_rows(names, rows))
+    result = await db.execute(select(pharmacy_models.Pharmacy).options(
+        selectinload(pharmacy_models.Pharmacy.medicines)
+    ))
+    return hot_responses.put(request, "pharmacies", serialize(List[schemas.Pharmacy], result.scalars().all()))
 
 
 @router.put("/{pharmacy_id}/medicines/{medicine_id}", response_model=schemas.Medicine)
@@ -93,7 +311,7 @@ def update_medicine_quantity(
     medicine_id: int,
     payload: schemas.MedicineQuantityUpdate,
     db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["pharmacist"]))
+    current_user: Principal = Depends(role_checker(allowed_roles=["pharmacist"]))
 ):
     """
     Updates the stock quantity of a medicine in a pharmacy.
@@ -104,7 +322,7 @@ def update_medicine_quantity(
     if not pharmacy:
         raise HTTPException(status_code=404, detail="Pharmacy not found")
 
-    if pharmacy.pharmacist_id != current_user.pharmacist_profile.pharmacist_id:
+    if pharmacy.pharmacist_id != current_user.pharmacist_id:
         raise HTTPException(status_code=403, detail="Not authorized to update this pharmacy inventory")
 
     medicine = db.query(pharmacy_models.Medicine).filter(
@@ -115,6 +333,11 @@ def update_medicine_quantity(
         raise HTTPException(status_code=404, detail="Medicine not found in this pharmacy")
 
     medicine.quantity = payload.quantity
+    medicine.version = pharmacy_models.Medicine.version + 1
     db.commit()
     db.refresh(medicine)
+    medicine_index.upsert_medicine(medicine.id, pharmacy_id, medicine.name, medicine.quantity)
+    inventory_broker.publish_stock([
+        (medicine.id, pharmacy_id, medicine.name, medicine.quantity, medicine.version)
+    ])
     return medicine
\ No newline at end of file
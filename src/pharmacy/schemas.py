@@ -11,6 +11,7 @@ class MedicineCreate(MedicineBase):
 class Medicine(MedicineBase):
     medicine_id: int = Field(alias="id")
     pharmacy_id: int
+    version: int = 1
 
     class Config:
         from_attributes = True
@@ -19,6 +20,25 @@ class Medicine(MedicineBase):
 class MedicineQuantityUpdate(BaseModel):
     quantity: int
 
+# --- Bulk Inventory ---
+class BulkRowResult(BaseModel):
+    line: int
+    name: str | None = None
+    quantity: int | None = None
+    status: str  # inserted | updated | duplicate | error
+    medicine_id: int | None = None
+    error: str | None = None
+
+class BulkInventoryResult(BaseModel):
+    pharmacy_id: int
+    received: int
+    inserted: int
+    updated: int
+    failed: int
+    elapsed_ms: float
+    rows_per_second: float
+    rows: list[BulkRowResult]
+
 # --- Pharmacy Schemas (Will include a list of medicines) ---
 class PharmacyBase(BaseModel):
     name: str
@@ -33,4 +53,18 @@ class Pharmacy(PharmacyBase):
     medicines: list[Medicine] = [] # Nest the medicine list in the response
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# --- Search Schemas ---
+class MedicineMatch(BaseModel):
+    medicine_id: int
+    name: str
+    quantity: int
+    score: float
+
+class PharmacySearchResult(BaseModel):
+    pharmacy_id: int
+    name: str
+    location: str | None = None
+    best_score: float
+    matches: list[MedicineMatch]
@@ -0,0 +1,312 @@
+"""
+In-memory medicine search across every pharmacy.
+
+Names are normalized (Devanagari/Gurmukhi transliterated to Latin, phonetic
+spellings folded) and indexed by trigram, so a query matches by exact name,
+prefix, consonant skeleton ("pairasitamol" ~ "paracetamol") or trigram overlap
+for typos. The index is built from the database by the first search (concurrent
+first searches wait for that one build) and updated in place by the inventory
+write paths. Writes made by other workers are picked up by a background task
+started from the app lifespan: every SEARCH_INDEX_REFRESH_SECONDS it reloads
+the pharmacies and only the medicines whose `updated_at` moved since the last
+refresh, so searches never wait on a scan of the whole inventory. Upserts that
+arrive while a refresh is reading are applied again after it, so the rows it
+read cannot overwrite newer stock.
+"""
+import asyncio
+import datetime
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+
+from sqlalchemy import select
+
+from . import models as pharmacy_models
+from .. import db as database
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rows are re-read from this long before the previous refresh started, covering
+# transactions that committed after it and clock skew between workers
+_REFRESH_OVERLAP = datetime.timedelta(seconds=60)
+
+# Independent vowels, vowel signs and consonants of Devanagari (Hindi) and
+# Gurmukhi (Punjabi), mapped to the Latin spelling a pharmacist would type.
+_INDIC_TO_LATIN = {
+    # Devanagari
+    "अ": "a", "आ": "a", "इ": "i", "ई": "i", "उ": "u", "ऊ": "u", "ए": "e", "ऐ": "ai", "ओ": "o", "औ": "au",
+    "ा": "a", "ि": "i", "ी": "i", "ु": "u", "ू": "u", "े": "e", "ै": "ai", "ो": "o", "ौ": "au", "ृ": "ri",
+    "क": "k", "ख": "kh", "ग": "g", "घ": "gh", "ङ": "n", "च": "ch", "छ": "chh", "ज": "j", "झ": "jh", "ञ": "n",
+    "ट": "t", "ठ": "th", "ड": "d", "ढ": "dh", "ण": "n", "त": "t", "थ": "th", "द": "d", "ध": "dh", "न": "n",
+    "प": "p", "फ": "ph", "ब": "b", "भ": "bh", "म": "m", "य": "y", "र": "r", "ल": "l", "व": "v",
+    "श": "sh", "ष": "sh", "स": "s", "ह": "h",
+    "ं": "n", "ँ": "n", "ः": "h", "्": "", "़": "",
+    # Gurmukhi
+    "ਅ": "a", "ਆ": "a", "ਇ": "i", "ਈ": "i", "ਉ": "u", "ਊ": "u", "ਏ": "e", "ਐ": "ai", "ਓ": "o", "ਔ": "au",
+    "ਾ": "a", "ਿ": "i", "ੀ": "i", "ੁ": "u", "ੂ": "u", "ੇ": "e", "ੈ": "ai", "ੋ": "o", "ੌ": "au",
+    "ਕ": "k", "ਖ": "kh", "ਗ": "g", "ਘ": "gh", "ਙ": "n", "ਚ": "ch", "ਛ": "chh", "ਜ": "j", "ਝ": "jh", "ਞ": "n",
+    "ਟ": "t", "ਠ": "th", "ਡ": "d", "ਢ": "dh", "ਣ": "n", "ਤ": "t", "ਥ": "th", "ਦ": "d", "ਧ": "dh", "ਨ": "n",
+    "ਪ": "p", "ਫ": "ph", "ਬ": "b", "ਭ": "bh", "ਮ": "m", "ਯ": "y", "ਰ": "r", "ਲ": "l", "ਵ": "v",
+    "ਸ": "s", "ਹ": "h", "ੜ": "r",
+    "ਂ": "n", "ੰ": "n", "ੱ": "", "੍": "", "਼": "",
+}
+
+# Nukta letters (consonant + U+093C/U+0A3C) borrow sounds from Persian and English
+_NUKTA_TO_LATIN = {
+    unicodedata.normalize("NFD", letter): latin for letter, latin in {
+        "क़": "k", "ख़": "kh", "ग़": "g", "ज़": "z", "ड़": "r", "ढ़": "rh", "फ़": "f",
+        "ਸ਼": "sh", "ਖ਼": "kh", "ਗ਼": "g", "ਜ਼": "z", "ਫ਼": "f",
+    }.items()
+}
+
+# Applied in order after lowercasing; collapses spellings that sound alike
+_PHONETIC_FOLDS = (
+    ("ph", "f"), ("ce", "se"), ("ci", "si"), ("cy", "si"), ("ck", "k"), ("ch", "c"), ("sh", "s"),
+    ("kh", "k"), ("gh", "g"), ("th", "t"), ("dh", "d"), ("bh", "b"), ("q", "k"), ("x", "ks"),
+    ("z", "j"), ("w", "v"), ("y", "i"), ("ee", "i"), ("oo", "u"), ("aa", "a"), ("ai", "e"), ("c", "k"),
+)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_REPEATS = re.compile(r"(.)\1+")
+_VOWELS = re.compile(r"[aeiou]")
+
+
+def transliterate(text: str) -> str:
+    text = unicodedata.normalize("NFD", text)
+    for letter, latin in _NUKTA_TO_LATIN.items():
+        text = text.replace(letter, latin)
+    return "".join(_INDIC_TO_LATIN.get(char, char) for char in text)
+
+
+def normalize_medicine_name(name: str) -> str:
+    """Lowercased, transliterated, punctuation-free form used for exact and prefix matches."""
+    return _NON_ALNUM.sub(" ", transliterate(name).lower()).strip()
+
+
+def phonetic_key(normalized: str) -> str:
+    key = normalized.replace(" ", "")
+    for source, target in _PHONETIC_FOLDS:
+        key = key.replace(source, target)
+    return _REPEATS.sub(r"\1", key)
+
+
+def consonant_skeleton(key: str) -> str:
+    return key[:1] + _VOWELS.sub("", key[1:])
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class _Stock:
+    pharmacy_id: int
+    name: str
+    quantity: int
+
+
+class MedicineSearchIndex:
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._refresh_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._built_at = None
+        self._refreshed_from: datetime.datetime | None = None  # database time the last refresh started reading
+        self._replay: list[tuple] | None = None  # upserts made while a refresh is reading
+        self._pharmacies: dict[int, tuple[str, str | None]] = {}
+        self._stock: dict[int, _Stock] = {}                      # medicine id -> stock row
+        self._medicines_by_name: dict[str, set[int]] = defaultdict(set)  # normalized name -> medicine ids
+        self._names_by_trigram: dict[str, set[str]] = defaultdict(set)
+        self._keys: dict[str, tuple[str, str]] = {}              # normalized name -> (phonetic key, skeleton)
+
+    # --- Maintenance ---
+
+    @property
+    def is_built(self) -> bool:
+        return self._built_at is not None
+
+    async def ensure_fresh(self, db):
+        """Builds the index on first use; later refreshes run in the background."""
+        if self.is_built:
+            return
+        async with self._refresh_lock:
+            if not self.is_built:
+                await self._load(db)
+
+    async def refresh(self, db):
+        """Applies the pharmacies and the medicines changed since the last refresh (all of them before the first)."""
+        async with self._refresh_lock:
+            await self._load(db)
+
+    async def _load(self, db):
+        Medicine = pharmacy_models.Medicine
+        started = database.utcnow()
+        changed_since = self._refreshed_from - _REFRESH_OVERLAP if self._refreshed_from is not None else None
+        with self._lock:
+            self._replay = []
+        try:
+            pharmacies = (await db.execute(select(
+                pharmacy_models.Pharmacy.id, pharmacy_models.Pharmacy.name, pharmacy_models.Pharmacy.location
+            ))).all()
+            query = select(Medicine.id, Medicine.pharmacy_id, Medicine.name, Medicine.quantity)
+            if changed_since is not None:
+                query = query.where(Medicine.updated_at >= changed_since)
+            medicines = (await db.execute(query)).all()
+        except BaseException:
+            with self._lock:
+                self._replay = None
+            raise
+        if changed_since is None:
+            self.rebuild(pharmacies, medicines)
+        else:
+            self.apply(pharmacies, medicines)
+        self._refreshed_from = started
+
+    def rebuild(self, pharmacies, medicines):
+        with self._lock:
+            self._pharmacies = {pharmacy_id: (name, location) for pharmacy_id, name, location in pharmacies}
+            self._stock.clear()
+            self._medicines_by_name.clear()
+            self._names_by_trigram.clear()
+            self._keys.clear()
+            for medicine_id, pharmacy_id, name, quantity in medicines:
+                self._upsert_locked(medicine_id, pharmacy_id, name, quantity)
+            self._replay_locked()
+            self._built_at = time.monotonic()
+
+    def apply(self, pharmacies, medicines):
+        """Upserts rows read from the database into the built index."""
+        with self._lock:
+            self._pharmacies.update((pharmacy_id, (name, location)) for pharmacy_id, name, location in pharmacies)
+            for medicine_id, pharmacy_id, name, quantity in medicines:
+                self._upsert_locked(medicine_id, pharmacy_id, name, quantity)
+            self._replay_locked()
+            self._built_at = time.monotonic()
+
+    def _replay_locked(self):
+        # Made after the refresh read its rows, so newer than them
+        for medicine_id, pharmacy_id, name, quantity in self._replay or ():
+            self._upsert_locked(medicine_id, pharmacy_id, name, quantity)
+        self._replay = None
+
+    def upsert_pharmacy(self, pharmacy_id: int, name: str, location: str | None):
+        with self._lock:
+            self._pharmacies[pharmacy_id] = (name, location)
+
+    def upsert_medicine(self, medicine_id: int, pharmacy_id: int, name: str, quantity: int):
+        with self._lock:
+            self._upsert_locked(medicine_id, pharmacy_id, name, quantity)
+            if self._replay is not None:
+                self._replay.append((medicine_id, pharmacy_id, name, quantity))
+
+    # --- Background refresh ---
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                async with database.AsyncSessionLocal() as db:
+                    await self.refresh(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Medicine search index refresh failed")
+
+    def start(self):
+        if self.refresh_seconds > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _upsert_locked(self, medicine_id, pharmacy_id, name, quantity):
+        previous = self._stock.get(medicine_id)
+        if previous is not None and previous.name != name:
+            self._medicines_by_name[normalize_medicine_name(previous.name)].discard(medicine_id)
+        self._stock[medicine_id] = _Stock(pharmacy_id, name, quantity or 0)
+        normalized = normalize_medicine_name(name or "")
+        if not normalized:
+            return
+        self._medicines_by_name[normalized].add(medicine_id)
+        if normalized not in self._keys:
+            key = phonetic_key(normalized)
+            skeleton = consonant_skeleton(key)
+            self._keys[normalized] = (key, skeleton)
+            for gram in trigrams(key) | trigrams(skeleton):
+                self._names_by_trigram[gram].add(normalized)
+
+    # --- Queries ---
+
+    def _score(self, query: str, query_key: str, query_skeleton: str, query_grams: set[str], name: str) -> float:
+        key, skeleton = self._keys[name]
+        if name == query or key == query_key:
+            return 1.0
+        if name.startswith(query) or key.startswith(query_key):
+            return 0.9
+        if skeleton == query_skeleton:
+            return 0.85
+        if len(query_skeleton) >= 3 and skeleton.startswith(query_skeleton):
+            return 0.75
+        grams = trigrams(key)
+        return 0.7 * len(grams & query_grams) / len(grams | query_grams)
+
+    def search(self, text: str, location: str | None = None, limit: int = 20, min_score: float = 0.25):
+        """Returns in-stock pharmacies ordered by their best-matching medicine."""
+        query = normalize_medicine_name(text)
+        if not query:
+            return []
+        query_key = phonetic_key(query)
+        query_skeleton = consonant_skeleton(query_key)
+        query_grams = trigrams(query_key)
+        location = location.lower() if location else None
+
+        with self._lock:
+            candidates = set()
+            for gram in query_grams | trigrams(query_skeleton):
+                candidates |= self._names_by_trigram.get(gram, set())
+
+            by_pharmacy: dict[int, dict] = {}
+            for name in candidates:
+                score = self._score(query, query_key, query_skeleton, query_grams, name)
+                if score < min_score:
+                    continue
+                for medicine_id in self._medicines_by_name[name]:
+                    stock = self._stock[medicine_id]
+                    if stock.quantity <= 0 or stock.pharmacy_id not in self._pharmacies:
+                        continue
+                    pharmacy_name, pharmacy_location = self._pharmacies[stock.pharmacy_id]
+                    if location and location not in (pharmacy_location or "").lower():
+                        continue
+                    result = by_pharmacy.setdefault(stock.pharmacy_id, {
+                        "pharmacy_id": stock.pharmacy_id,
+                        "name": pharmacy_name,
+                        "location": pharmacy_location,
+                        "best_score": 0.0,
+                        "matches": [],
+                    })
+                    result["matches"].append({
+                        "medicine_id": medicine_id, "name": stock.name,
+                        "quantity": stock.quantity, "score": round(score, 3),
+                    })
+                    result["best_score"] = max(result["best_score"], round(score, 3))
+
+        results = sorted(by_pharmacy.values(), key=lambda r: (-r["best_score"], r["pharmacy_id"]))[:limit]
+        for result in results:
+            result["matches"].sort(key=lambda m: (-m["score"], -m["quantity"]))
+        return results
+
+
+medicine_index = MedicineSearchIndex(refresh_seconds=settings.SEARCH_INDEX_REFRESH_SECONDS)
@@ -0,0 +1,237 @@
+"""
+Structured prescription line items and pharmacy fulfillment.
+
+Prescriptions used to carry their medications as free text only. Each one is
+now also stored as a `PrescriptionItem` with a normalized name (the same
+normalization the medicine search uses, see pharmacy/search.py) that matches
+`Medicine.normalized_name` by equality, so both sides are plain indexed
+columns.
+
+`fulfillment` answers "where can this be filled" with a single query: it
+joins the items to every pharmacy's in-stock medicines, counts the covered
+items per pharmacy and ranks pharmacies by that count, so pharmacies that can
+fill everything come first, followed by the best partial covers.
+
+`backfill` migrates rows written before the line items existed, in batches
+with a commit per batch: it parses `medications` text into items (bumping
+the prescription's `updated_at` so synced clients receive them) and fills
+`Medicine.normalized_name`.
+
+    python -m src.prescriptions.items [--batch-size N]
+"""
+import argparse
+import json
+import re
+
+from sqlalchemy import and_, bindparam, exists, func, insert, select, update
+
+from . import models as prescription_models
+from .. import db as database
+from ..config import settings
+from ..pharmacy import models as pharmacy_models
+from ..pharmacy.search import normalize_medicine_name
+
+Prescription = prescription_models.Prescription
+PrescriptionItem = prescription_models.PrescriptionItem
+Medicine = pharmacy_models.Medicine
+Pharmacy = pharmacy_models.Pharmacy
+
+_SEPARATORS = re.compile(r"[,;\n]+")
+_QUANTITY = re.compile(r"\s*\b(?:x|qty:?)\s*(\d+)\s*$", re.IGNORECASE)
+
+
+# --- Parsing ---
+
+def parse_medications(text: str | None) -> list[dict]:
+    """
+    Splits free-text medications into items. Accepts a JSON list of names or
+    objects, or entries separated by commas, semicolons or newlines such as
+    "Paracetamol 500mg twice daily x10": the words before the first one that
+    starts with a digit are the name, a trailing "x10"/"qty 10" is the quantity
+    and the rest is the dosage.
+    """
+    if not text or not text.strip():
+        return []
+    if text.lstrip().startswith("["):
+        try:
+            entries = json.loads(text)
+        except ValueError:
+            entries = None
+        if isinstance(entries, list):
+            items = []
+            for entry in entries:
+                if isinstance(entry, dict) and entry.get("name"):
+                    quantity = entry.get("quantity")
+                    items.append({
+                        "name": str(entry["name"]).strip(),
+                        "dosage": entry.get("dosage"),
+                        "quantity": quantity if isinstance(quantity, int) and quantity > 0 else None,
+                    })
+                elif isinstance(entry, str) and entry.strip():
+                    items.extend(parse_medications(entry))
+            return items
+
+    items = []
+    for entry in _SEPARATORS.split(text):
+        entry = entry.strip()
+        if not entry:
+            continue
+        quantity = None
+        match = _QUANTITY.search(entry)
+        if match and match.start() > 0:
+            quantity = int(match.group(1)) or None
+            entry = entry[:match.start()]
+        words = entry.split()
+        split = next((i for i, word in enumerate(words) if i and word[0].isdigit()), len(words))
+        items.append({
+            "name": " ".join(words[:split]),
+            "dosage": " ".join(words[split:]) or None,
+            "quantity": quantity,
+        })
+    return items
+
+
+def format_medications(items) -> str:
+    """The free-text form of structured items, kept in `Prescription.medications` for older clients."""
+    parts = []
+    for item in items:
+        part = " ".join(filter(None, (item["name"], item.get("dosage"))))
+        if item.get("quantity"):
+            part += f" x{item['quantity']}"
+        parts.append(part)
+    return ", ".join(parts)
+
+
+def item_rows(items) -> list[dict]:
+    """Column values for `PrescriptionItem`s, numbered in order."""
+    return [
+        {
+            "position": position,
+            "name": item["name"],
+            "normalized_name": normalize_medicine_name(item["name"]),
+            "dosage": item.get("dosage"),
+            "quantity": item.get("quantity"),
+        }
+        for position, item in enumerate(items)
+    ]
+
+
+# --- Fulfillment ---
+
+def fulfillment_query(prescription_id: int, limit: int):
+    """(pharmacy id, name, location, covered item id, covered count) rows of the `limit` best pharmacies."""
+    matches = select(Medicine.pharmacy_id, PrescriptionItem.id.label("item_id")).distinct().select_from(
+        PrescriptionItem
+    ).join(Medicine, and_(
+        Medicine.normalized_name == PrescriptionItem.normalized_name,
+        Medicine.quantity >= func.coalesce(PrescriptionItem.quantity, 1),
+    )).where(PrescriptionItem.prescription_id == prescription_id).subquery()
+    counted = select(
+        matches.c.pharmacy_id,
+        matches.c.item_id,
+        func.count().over(partition_by=matches.c.pharmacy_id).label("covered"),
+    ).subquery()
+    ranked = select(
+        counted,
+        func.dense_rank().over(order_by=(counted.c.covered.desc(), counted.c.pharmacy_id)).label("rank"),
+    ).subquery()
+    return select(
+        ranked.c.pharmacy_id, Pharmacy.name, Pharmacy.location, ranked.c.item_id, ranked.c.covered,
+    ).join(Pharmacy, Pharmacy.id == ranked.c.pharmacy_id).where(
+        ranked.c.rank <= limit
+    ).order_by(ranked.c.rank, ranked.c.item_id)
+
+
+async def fulfillment(db, prescription, limit: int) -> dict:
+    item_ids = [item.id for item in prescription.items]
+    pharmacies = {}
+    if item_ids:
+        for pharmacy_id, name, location, item_id, _ in await db.execute(fulfillment_query(prescription.id, limit)):
+            pharmacy = pharmacies.setdefault(pharmacy_id, {
+                "pharmacy_id": pharmacy_id, "name": name, "location": location, "covered_item_ids": [],
+            })
+            pharmacy["covered_item_ids"].append(item_id)
+    for pharmacy in pharmacies.values():
+        covered = set(pharmacy["covered_item_ids"])
+        pharmacy["missing_item_ids"] = [item_id for item_id in item_ids if item_id not in covered]
+        pharmacy["complete"] = not pharmacy["missing_item_ids"]
+    return {
+        "prescription_id": prescription.id,
+        "items": prescription.items,
+        "complete": any(pharmacy["complete"] for pharmacy in pharmacies.values()),
+        "pharmacies": list(pharmacies.values()),
+    }
+
+
+# --- Backfill ---
+
+def backfill_medicines(db, batch_size: int) -> int:
+    table = Medicine.__table__
+    updated, after = 0, 0
+    while True:
+        rows = db.execute(
+            select(table.c.id, table.c.name).where(table.c.normalized_name.is_(None), table.c.id > after)
+            .order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        db.execute(
+            update(table).where(table.c.id == bindparam("medicine_id")).values(normalized_name=bindparam("normalized")),
+            [{"medicine_id": medicine_id, "normalized": normalize_medicine_name(name or "")} for medicine_id, name in rows],
+        )
+        db.commit()
+        updated += len(rows)
+        after = rows[-1].id
+
+
+def backfill_prescriptions(db, batch_size: int) -> int:
+    table = Prescription.__table__
+    migrated, after = 0, 0
+    while True:
+        rows = db.execute(
+            select(table.c.id, table.c.medications).where(
+                table.c.id > after,
+                table.c.medications.is_not(None),
+                ~exists().where(PrescriptionItem.prescription_id == table.c.id),
+            ).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return migrated
+        items = [
+            {"prescription_id": prescription_id, **row}
+            for prescription_id, medications in rows
+            for row in item_rows(parse_medications(medications))
+        ]
+        if items:
+            db.execute(insert(PrescriptionItem.__table__), items)
+            # updated_at (and version, through its onupdate) so synced clients fetch the items
+            db.execute(
+                update(table).where(table.c.id.in_({item["prescription_id"] for item in items}))
+                .values(updated_at=database.utcnow())
+            )
+        db.commit()
+        migrated += len(rows)
+        after = rows[-1].id
+
+
+def backfill(batch_size: int | None = None) -> dict:
+    batch_size = batch_size or settings.PRESCRIPTION_BACKFILL_BATCH_SIZE
+    with database.SessionLocal() as db:
+        return {
+            "medicines": backfill_medicines(db, batch_size),
+            "prescriptions": backfill_prescriptions(db, batch_size),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m src.prescriptions.items",
+        description="Migrate free-text prescriptions to line items and normalize medicine names.",
+    )
+    parser.add_argument("--batch-size", type=int, help="rows per transaction")
+    args = parser.parse_args(argv)
+    print(backfill(args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
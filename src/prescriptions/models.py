@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index, func, text
 from sqlalchemy.orm import relationship
-from ..db import Base
+from ..db import Base, utcnow
 
 class Prescription(Base):
     __tablename__ = "prescriptions"
+    __table_args__ = (
+        # Serves the patient's delta sync and ETag lookups
+        Index("ix_prescriptions_patient_updated", "patient_id", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=True)
@@ -12,7 +16,29 @@ class Prescription(Base):
     notes = Column(Text, nullable=True)
     medications = Column(Text, nullable=True)  # e.g., JSON string or comma-separated for MVP
     created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, default=utcnow, onupdate=utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=text("version + 1"))
 
     # Relationships
     doctor = relationship("Doctor", foreign_keys=[doctor_id])
-    patient = relationship("Patient", foreign_keys=[patient_id])
\ No newline at end of file
+    patient = relationship("Patient", foreign_keys=[patient_id])
+    # Loaded with the prescription (one extra IN query per batch), also under AsyncSession
+    items = relationship(
+        "PrescriptionItem", back_populates="prescription", order_by="PrescriptionItem.position",
+        cascade="all, delete-orphan", lazy="selectin",
+    )
+
+
+class PrescriptionItem(Base):
+    """One medication of a prescription; `normalized_name` matches `Medicine.normalized_name`."""
+    __tablename__ = "prescription_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    prescription_id = Column(Integer, ForeignKey("prescriptions.id", ondelete="CASCADE"), nullable=False, index=True)
+    position = Column(Integer, nullable=False, default=0)
+    name = Column(String, nullable=False)
+    normalized_name = Column(String, nullable=False, index=True)
+    dosage = Column(String, nullable=True)  # e.g. "500mg twice daily"
+    quantity = Column(Integer, nullable=True)  # units to dispense; unknown when None
+
+    prescription = relationship("Prescription", back_populates="items")
\ No newline at end of file
@@ -1,34 +1,148 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .. import db
+from .. import db, sync
 from ..auth import models as auth_models
 from ..auth.dependencies import role_checker
-from . import models, schemas
+from ..auth.principal import Principal
+from ..profiles import models as profile_models
+from ..projection import FieldSet, render_rows
+from . import items, models, schemas
 
 router = APIRouter()
 
+# Fields for `?fields=` on the prescription list (see projection.py)
+PRESCRIPTION_FIELDS = FieldSet(
+    models.Prescription,
+    fields={
+        "id": models.Prescription.id,
+        "appointment_id": models.Prescription.appointment_id,
+        "doctor_id": models.Prescription.doctor_id,
+        "patient_id": models.Prescription.patient_id,
+        "notes": models.Prescription.notes,
+        "medications": models.Prescription.medications,
+        "item_count": select(func.count()).where(
+            models.PrescriptionItem.prescription_id == models.Prescription.id
+        ).scalar_subquery(),
+        "created_at": models.Prescription.created_at,
+        "updated_at": models.Prescription.updated_at,
+        "version": models.Prescription.version,
+        "doctor_name": (auth_models.User.first_name + " " + auth_models.User.last_name, ("doctor", "doctor_user")),
+    },
+    joins={
+        "doctor": (profile_models.Doctor, profile_models.Doctor.doctor_id == models.Prescription.doctor_id),
+        "doctor_user": (auth_models.User, auth_models.User.id == profile_models.Doctor.user_id),
+    },
+    profiles={"lite": ["id", "created_at", "doctor_name", "medications"]},
+)
+
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.Prescription)
 def create_prescription(
     payload: schemas.PrescriptionCreate,
     db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["doctor"]))
+    current_user: Principal = Depends(role_checker(allowed_roles=["doctor"]))
 ):
+    """
+    Creates a prescription. Medications are stored as line items: pass `items`, or `medications`
+    text that is split into items; the other field is derived when omitted.
+    """
+    if payload.items is not None:
+        entries = [item.model_dump() for item in payload.items]
+        medications = payload.medications if payload.medications is not None else items.format_medications(entries)
+    else:
+        entries = items.parse_medications(payload.medications)
+        medications = payload.medications
     new_p = models.Prescription(
         appointment_id=payload.appointment_id,
-        doctor_id=current_user.doctor_profile.doctor_id,
+        doctor_id=current_user.doctor_id,
         patient_id=payload.patient_id,
         notes=payload.notes,
-        medications=payload.medications,
+        medications=medications,
+        items=[models.PrescriptionItem(**row) for row in items.item_rows(entries)],
     )
     db.add(new_p)
     db.commit(); db.refresh(new_p)
     return new_p
 
 @router.get("/me", response_model=list[schemas.Prescription])
-def my_prescriptions(
-    db: Session = Depends(db.get_db),
-    current_user: auth_models.User = Depends(role_checker(allowed_roles=["patient", "asha_worker"]))
+async def my_prescriptions(
+    request: Request,
+    response: Response,
+    fields: str | None = Query(None, description="Comma-separated fields, or a profile such as `lite`, for a flat projection"),
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient", "asha_worker"]))
+):
+    """
+    Returns every prescription of the logged-in patient.
+    Send the last `ETag` back as `If-None-Match` to get a bodiless 304 when nothing changed.
+    `fields` (e.g. `id,created_at,doctor_name,item_count` or `lite`) returns flat rows without the items.
+    """
+    names = PRESCRIPTION_FIELDS.parse(fields)
+    etag = await sync.collection_etag(db, models.Prescription, current_user.patient_id)
+    cached = sync.not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    if names is not None:
+        rows = await db.execute(PRESCRIPTION_FIELDS.select(names).where(
+            models.Prescription.patient_id == current_user.patient_id
+        ))
+        return Response(content=render_rows(names, rows), media_type="application/json", headers={
+            "ETag": etag, "Cache-Control": "private, no-cache",
+        })
+    result = await db.execute(
+        select(models.Prescription).where(models.Prescription.patient_id == current_user.patient_id)
+    )
+    return result.scalars().all()
+
+@router.get("/me/sync", response_model=schemas.PrescriptionSync)
+async def sync_my_prescriptions(
+    since: str | None = None,
+    limit: int = Query(200, ge=1, le=1000),
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient", "asha_worker"]))
+):
+    """
+    Prescriptions changed since the `cursor` returned by the previous sync.
+    - Omit `since` for the first sync. Repeat with the new cursor while `has_more` is true.
+    - `deleted` lists ids that no longer belong to the patient.
+    """
+    try:
+        return await sync.fetch_changes(db, models.Prescription, current_user.patient_id, since, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/{prescription_id}/fulfillment", response_model=schemas.PrescriptionFulfillment)
+async def get_prescription_fulfillment(
+    prescription_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient", "asha_worker", "doctor"]))
 ):
-    return db.query(models.Prescription).filter(models.Prescription.patient_id == current_user.patient_profile.patient_id).all()
+    """
+    Pharmacies that can fill the prescription, best first.
 
+    - **Security**: the patient, their ASHA worker and the prescribing doctor.
+    - Pharmacies stocking every item (at the prescribed quantity) come first with `complete` set,
+      followed by the best partial covers, up to `limit` pharmacies.
+    """
+    prescription = (await db.execute(
+        select(models.Prescription).where(models.Prescription.id == prescription_id)
+    )).scalars().first()
+    if prescription is None:
+        raise HTTPException(status_code=404, detail="Prescription not found")
+    if current_user.role == "patient":
+        allowed = prescription.patient_id == current_user.patient_id
+    elif current_user.role == "doctor":
+        allowed = prescription.doctor_id == current_user.doctor_id
+    else:
+        allowed = current_user.asha_worker_id is not None and (await db.execute(
+            select(profile_models.Patient.managed_by_asha_id)
+            .where(profile_models.Patient.patient_id == prescription.patient_id)
+        )).scalar() == current_user.asha_worker_id
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Not your prescription")
+    return await items.fulfillment(db, prescription, limit)
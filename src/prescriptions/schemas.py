@@ -1,11 +1,29 @@
 from pydantic import BaseModel, Field
 from typing import Optional
+import datetime
+
+class PrescriptionItemCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    dosage: Optional[str] = Field(None, max_length=200)
+    quantity: Optional[int] = Field(None, ge=1)
 
 class PrescriptionCreate(BaseModel):
+    """Give `items`, or `medications` text (e.g. "Paracetamol 500mg x10, ORS") to be parsed into items."""
     appointment_id: Optional[int] = None
     patient_id: int
     notes: Optional[str] = None
     medications: Optional[str] = None
+    items: Optional[list[PrescriptionItemCreate]] = Field(None, max_length=100)
+
+class PrescriptionItem(BaseModel):
+    item_id: int = Field(alias="id")
+    name: str
+    normalized_name: str
+    dosage: str | None = None
+    quantity: int | None = None
+
+    class Config:
+        from_attributes = True
 
 class Prescription(BaseModel):
     prescription_id: int = Field(alias="id")
@@ -14,6 +32,34 @@ class Prescription(BaseModel):
     patient_id: int
     notes: str | None
     medications: str | None
+    items: list[PrescriptionItem] = []
+    updated_at: datetime.datetime | None = None
+    version: int = 1
+
+    class Config:
+        from_attributes = True
+
+class PrescriptionSync(BaseModel):
+    """Rows changed since the client's cursor; apply `deleted` before `changes`."""
+    changes: list[Prescription]
+    deleted: list[int]
+    cursor: str | None
+    has_more: bool
+
+class PharmacyCover(BaseModel):
+    pharmacy_id: int
+    name: str | None
+    location: str | None
+    complete: bool
+    covered_item_ids: list[int]
+    missing_item_ids: list[int]
+
+class PrescriptionFulfillment(BaseModel):
+    """Pharmacies ranked by how many items they have in stock; `complete` if any can fill all of them."""
+    prescription_id: int
+    items: list[PrescriptionItem]
+    complete: bool
+    pharmacies: list[PharmacyCover]
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
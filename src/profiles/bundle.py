@@ -0,0 +1,210 @@
+"""
+Offline health-record bundle: a patient's profile, appointments and
+prescriptions as one versioned, gzip-compressed snapshot.
+
+The bundle is newline-delimited JSON, one record per line in a stable order,
+and its version is a hash of the content. Keeping records on their own lines
+lets a client that holds an older version download a line-level delta instead
+of the whole bundle:
+
+    {"base": "<old version>", "version": "<new version>",
+     "ops": [["c", start, count], ["i", ["<line>", ...]], ...]}
+
+where "c" copies `count` lines of the base bundle starting at `start` and "i"
+inserts the given lines.
+
+Bundles are cached per patient along with the last few versions, so deltas can
+be served against them. A cached bundle is reused while a one-query stamp of
+the patient's appointments and prescriptions (row counts and latest
+`updated_at`) is unchanged. Profile and doctor edits made in this process evict
+it through mapper events.
+"""
+import difflib
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import models as profile_models
+from . import schemas as profile_schemas
+from ..appointment import models as appointment_models
+from ..appointment import schemas as appointment_schemas
+from ..auth import models as auth_models
+from ..config import settings
+from ..prescriptions import models as prescription_models
+from ..prescriptions import schemas as prescription_schemas
+
+BUNDLE_FORMAT = 1
+BUNDLE_MEDIA_TYPE = "application/x-ndjson"
+DELTA_MEDIA_TYPE = "application/vnd.sih.bundle-delta+json"
+
+
+@dataclass
+class Bundle:
+    version: str
+    lines: list[str]
+    gzipped: bytes
+
+    @property
+    def body(self) -> bytes:
+        return "\n".join(self.lines).encode()
+
+
+@dataclass
+class _Entry:
+    stamp: tuple | None
+    user_ids: set[int]
+    versions: OrderedDict = field(default_factory=OrderedDict)  # version -> Bundle
+
+    @property
+    def current(self) -> Bundle:
+        return next(reversed(self.versions.values()))
+
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, separators=(",", ":"), sort_keys=True, default=str, ensure_ascii=False)
+
+
+def _compress(data: bytes) -> bytes:
+    # mtime=0 keeps the output byte-identical for identical content
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _stamp_query(patient_id: int):
+    Appointment = appointment_models.Appointment
+    Prescription = prescription_models.Prescription
+    appointments = Appointment.patient_profile_id == patient_id
+    prescriptions = Prescription.patient_id == patient_id
+    return select(
+        select(func.count()).where(appointments).scalar_subquery(),
+        select(func.max(Appointment.updated_at)).where(appointments).scalar_subquery(),
+        select(func.count()).where(prescriptions).scalar_subquery(),
+        select(func.max(Prescription.updated_at)).where(prescriptions).scalar_subquery(),
+    )
+
+
+async def build_bundle(db, patient_id: int) -> tuple[Bundle, set[int]] | None:
+    """Loads and serializes a patient's record; returns it with the user ids it depends on."""
+    result = await db.execute(select(profile_models.Patient).options(
+        joinedload(profile_models.Patient.user),
+        selectinload(profile_models.Patient.appointments)
+        .joinedload(appointment_models.Appointment.doctor)
+        .joinedload(profile_models.Doctor.user),
+    ).where(profile_models.Patient.patient_id == patient_id))
+    patient = result.scalars().first()
+    if patient is None:
+        return None
+    prescriptions = (await db.execute(
+        select(prescription_models.Prescription)
+        .where(prescription_models.Prescription.patient_id == patient_id)
+        .order_by(prescription_models.Prescription.id)
+    )).scalars().all()
+
+    lines = [_dumps({"type": "header", "format": BUNDLE_FORMAT, "patient_id": patient_id})]
+    lines.append(_dumps({"type": "profile", **profile_schemas.Patient.model_validate(patient).model_dump(mode="json")}))
+    user_ids = {patient.user_id}
+    for appointment in sorted(patient.appointments, key=lambda a: a.id):
+        record = appointment_schemas.Appointment.model_validate(appointment).model_dump(
+            mode="json", by_alias=True, exclude={"patient"}
+        )
+        lines.append(_dumps({"type": "appointment", **record}))
+        if appointment.doctor is not None:
+            user_ids.add(appointment.doctor.user_id)
+    for prescription in prescriptions:
+        record = prescription_schemas.Prescription.model_validate(prescription).model_dump(mode="json", by_alias=True)
+        lines.append(_dumps({"type": "prescription", **record}))
+
+    body = "\n".join(lines).encode()
+    version = hashlib.sha256(body).hexdigest()[:16]
+    return Bundle(version=version, lines=lines, gzipped=_compress(body)), user_ids
+
+
+def make_delta(base: Bundle, target: Bundle) -> bytes:
+    """Line-level delta that rebuilds `target` from `base`, gzip-compressed."""
+    ops = []
+    matcher = difflib.SequenceMatcher(a=base.lines, b=target.lines, autojunk=False)
+    for tag, base_start, base_end, target_start, target_end in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["c", base_start, base_end - base_start])
+        elif tag in ("replace", "insert"):
+            ops.append(["i", target.lines[target_start:target_end]])
+    delta = {"base": base.version, "version": target.version, "ops": ops}
+    return _compress(json.dumps(delta, separators=(",", ":"), ensure_ascii=False).encode())
+
+
+class BundleCache:
+    """Per-patient LRU of bundles, keeping the last few versions of each for deltas."""
+
+    def __init__(self, max_patients: int, history: int):
+        self.max_patients = max_patients
+        self.history = history
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, db, patient_id: int) -> tuple[Bundle, dict[str, Bundle]] | None:
+        """Returns the current bundle and the cached versions (oldest first) it can be diffed against."""
+        stamp = tuple((await db.execute(_stamp_query(patient_id))).one())
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is not None and entry.stamp == stamp:
+                self._entries.move_to_end(patient_id)
+                return entry.current, dict(entry.versions)
+
+        built = await build_bundle(db, patient_id)
+        if built is None:
+            return None
+        bundle, user_ids = built
+        with self._lock:
+            entry = self._entries.get(patient_id) or _Entry(stamp=None, user_ids=set())
+            entry.stamp = stamp
+            entry.user_ids = user_ids
+            entry.versions.pop(bundle.version, None)
+            entry.versions[bundle.version] = bundle
+            while len(entry.versions) > self.history:
+                entry.versions.popitem(last=False)
+            self._entries[patient_id] = entry
+            self._entries.move_to_end(patient_id)
+            while len(self._entries) > self.max_patients:
+                self._entries.popitem(last=False)
+            return bundle, dict(entry.versions)
+
+    def invalidate(self, patient_id: int | None = None, user_id: int | None = None):
+        """Forces a rebuild on next access; older versions stay available for deltas."""
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key == patient_id or (user_id is not None and user_id in entry.user_ids):
+                    entry.stamp = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+patient_bundles = BundleCache(
+    max_patients=settings.BUNDLE_CACHE_MAX_PATIENTS,
+    history=settings.BUNDLE_CACHE_HISTORY,
+)
+
+
+# --- Invalidation ---
+# Appointment and prescription changes are caught by the stamp; profile data
+# shown in the bundle (names, doctor details) is not, so its edits evict here.
+
+@event.listens_for(auth_models.User, "after_update")
+def _invalidate_user(mapper, connection, target):
+    patient_bundles.invalidate(user_id=target.id)
+
+
+@event.listens_for(profile_models.Patient, "after_update")
+def _invalidate_patient(mapper, connection, target):
+    patient_bundles.invalidate(patient_id=target.patient_id)
+
+
+@event.listens_for(profile_models.Doctor, "after_update")
+def _invalidate_doctor(mapper, connection, target):
+    patient_bundles.invalidate(user_id=target.user_id)
@@ -5,8 +5,8 @@ from ..db import Base
 class Patient(Base):
     __tablename__ = "patients"
     patient_id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    managed_by_asha_id = Column(Integer, ForeignKey("asha_workers.asha_worker_id"), nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    managed_by_asha_id = Column(Integer, ForeignKey("asha_workers.asha_worker_id"), nullable=True, index=True)
     
     user = relationship("User", back_populates="patient_profile", foreign_keys=[user_id])
     
@@ -18,7 +18,8 @@ class Doctor(Base):
     __tablename__ = "doctors"
     doctor_id = Column(Integer, primary_key=True, index=True)
     specialization = Column(String)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    village = Column(String, index=True, nullable=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     
     user = relationship("User", back_populates="doctor_profile", foreign_keys=[user_id])
     
@@ -29,7 +30,7 @@ class Pharmacist(Base):
     __tablename__ = "pharmacists"
     pharmacist_id = Column(Integer, primary_key=True, index=True)
     pharmacy_name = Column(String) # This can be the primary pharmacy name
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     user = relationship("User", back_populates="pharmacist_profile", lazy="joined")
     
@@ -41,7 +42,7 @@ class ASHAWorker(Base):
     __tablename__ = "asha_workers"
     asha_worker_id = Column(Integer, primary_key=True, index=True)
     village_assigned = Column(String)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     user = relationship("User", back_populates="asha_worker_profile", lazy="joined")
     
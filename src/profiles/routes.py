@@ -0,0 +1,111 @@
+import datetime
+import gzip
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import db
+from ..appointment import calendar, schedule
+from ..appointment import schemas as appointment_schemas
+from ..auth.dependencies import role_checker
+from ..auth.principal import Principal
+from . import models as profile_models
+from .bundle import BUNDLE_MEDIA_TYPE, DELTA_MEDIA_TYPE, make_delta, patient_bundles
+
+patient_router = APIRouter()
+doctor_router = APIRouter()
+
+_MONTH = Query(None, pattern=r"^\d{4}-\d{2}$", description="YYYY-MM; defaults to the current month")
+
+
+@patient_router.get("/me/bundle")
+async def get_my_bundle(
+    request: Request,
+    base: str | None = None,
+    db: AsyncSession = Depends(db.get_async_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient"]))
+):
+    """
+    The patient's full record (profile, appointments, prescriptions) as one offline snapshot.
+
+    - **Security**: Protected endpoint for 'patient' roles only.
+    - The body is newline-delimited JSON, gzip-encoded when the client accepts it.
+      `ETag` and `X-Bundle-Version` carry the snapshot version.
+    - Send `If-None-Match` with the stored version to get a 304 when nothing changed.
+    - Pass `base=<stored version>` to receive a line-level delta (`X-Bundle-Base` is set)
+      instead of the full snapshot; the full snapshot is returned if that version is unknown.
+    """
+    cached = await patient_bundles.get(db, current_user.patient_id)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Patient profile not found")
+    bundle, versions = cached
+
+    etag = f'"{bundle.version}"'
+    headers = {"ETag": etag, "X-Bundle-Version": bundle.version, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if base == bundle.version or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type, compressed = BUNDLE_MEDIA_TYPE, bundle.gzipped
+    if base in versions:
+        delta = make_delta(versions[base], bundle)
+        if len(delta) < len(compressed):
+            media_type, compressed = DELTA_MEDIA_TYPE, delta
+            headers["X-Bundle-Base"] = base
+
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=compressed, media_type=media_type, headers=headers)
+    body = bundle.body if media_type == BUNDLE_MEDIA_TYPE else gzip.decompress(compressed)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+async def _calendar_month(month: str | None) -> tuple[str, datetime.date, datetime.date]:
+    month = month or datetime.date.today().strftime("%Y-%m")
+    try:
+        first, following = calendar.month_range(month)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid month")
+    # Template slots of the month must exist before they can be counted
+    horizon = schedule.horizon_end(following - datetime.timedelta(days=1))
+    if schedule.needs_materialization(horizon):
+        await run_in_threadpool(schedule.materialize_due, horizon)
+    return month, first, following
+
+
+@doctor_router.get("/calendar", response_model=appointment_schemas.DistrictCalendar)
+async def get_district_calendar(
+    month: str | None = _MONTH,
+    village: str | None = None,
+    specialization: str | None = None,
+    db: AsyncSession = Depends(db.get_async_db)
+):
+    """
+    Slot counts per day and status across doctors, optionally limited to a `village` and/or `specialization`.
+
+    - This is a public endpoint accessible by any user.
+    - Served from per-day counters kept in step with every slot change, not from the appointments.
+    """
+    month, first, following = await _calendar_month(month)
+    days = await calendar.district_month(db, first, following, village=village, specialization=specialization)
+    return {"village": village, "specialization": specialization, "month": month, "days": days}
+
+
+@doctor_router.get("/{doctor_id}/calendar", response_model=appointment_schemas.DoctorCalendar)
+async def get_doctor_calendar(
+    doctor_id: int,
+    month: str | None = _MONTH,
+    db: AsyncSession = Depends(db.get_async_db)
+):
+    """
+    A doctor's slot counts per day and status (available, booked, completed, ...) for one month.
+
+    - This is a public endpoint accessible by any user.
+    - Days without slots are omitted.
+    """
+    month, first, following = await _calendar_month(month)
+    if (await db.execute(select(profile_models.Doctor.doctor_id).where(profile_models.Doctor.doctor_id == doctor_id))).scalar() is None:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    return {"doctor_profile_id": doctor_id, "month": month, "days": await calendar.doctor_month(db, doctor_id, first, following)}
@@ -25,6 +25,7 @@ class Patient(PatientBase):
 # --- Doctor Schemas ---
 class DoctorBase(BaseModel):
     specialization: str | None = None
+    village: str | None = None
 
 class DoctorCreate(DoctorBase):
     pass
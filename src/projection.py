@@ -0,0 +1,65 @@
+"""
+Sparse fieldsets for list endpoints.
+
+A list endpoint that accepts `fields=` describes what a client may ask for
+with a `FieldSet`: named column expressions, the joins each of them needs and
+named profiles such as "lite". A request like `?fields=id,appointment_datetime`
+(or `?fields=lite`) then becomes a column-only SELECT with just the joins the
+chosen fields need. No ORM objects or identity map are involved, and the row
+tuples are rendered to JSON directly, skipping the nested response models.
+
+Without `fields` an endpoint returns its full response model as before.
+Projected rows are flat: nested objects are replaced by fields such as
+`doctor_name`.
+"""
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from .responses import dump_json
+
+
+class FieldSet:
+    def __init__(self, base, fields: dict, joins: dict | None = None, profiles: dict | None = None):
+        """
+        `fields` maps a name to a column expression, or to `(expression, join names)`.
+        `joins` maps a join name to `(target, onclause)` or `(target, onclause, outer)`.
+        Joins are applied in the order they are declared, so a join may rely on earlier ones.
+        """
+        self.base = base
+        self.fields = {}
+        for name, spec in fields.items():
+            expression, needs = spec if isinstance(spec, tuple) else (spec, ())
+            self.fields[name] = (expression.label(name), tuple(needs))
+        self.joins = joins or {}
+        self.profiles = profiles or {}
+
+    def parse(self, value: str | None) -> list[str] | None:
+        """Field names requested by a `fields` parameter; None for the full response. Raises 400."""
+        if value is None or not value.strip():
+            return None
+        if value.strip() in self.profiles:
+            return list(self.profiles[value.strip()])
+        names = list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(self.fields)} "
+                       f"or a profile ({', '.join(self.profiles) or 'none'})",
+            )
+        return names
+
+    def select(self, names: list[str], joins=()):
+        """SELECT of the named fields from the base table, with the joins they (and `joins`) need."""
+        needed = set(joins) | {join for name in names for join in self.fields[name][1]}
+        query = select(*(self.fields[name][0] for name in names)).select_from(self.base)
+        for join_name, spec in self.joins.items():
+            if join_name in needed:
+                target, onclause, *outer = spec
+                query = query.join(target, onclause, isouter=bool(outer and outer[0]))
+        return query
+
+
+def render_rows(names: list[str], rows) -> bytes:
+    """JSON array of objects straight from result row tuples."""
+    return dump_json([dict(zip(names, row)) for row in rows])
@@ -0,0 +1,181 @@
+"""
+Per-request SQL statistics and N+1 detection.
+
+Listeners on both engines (sync and async) count every statement, time it
+and tally its shape, the SQL text with IN-lists collapsed, into the stats of
+the request being served. `QueryStatsMiddleware` opens those stats per HTTP
+request (through a context variable, which sync endpoints inherit in the
+threadpool) and, when the response starts:
+
+- adds `X-DB-Statements`, `X-DB-Time-Ms` and `X-DB-Max-Repeats` headers when
+  QUERY_STATS_HEADERS is on;
+- logs a warning when one statement shape ran QUERY_N_PLUS_ONE_THRESHOLD times
+  or more, the signature of a per-row lazy load or per-row write.
+
+An executemany counts as one statement. `assert_query_budget` collects the
+same statistics for a block of code, for tests and benchmarks:
+
+    with assert_query_budget(3, max_repeats=1):
+        client.get("/pharmacies/")
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+
+from sqlalchemy import event
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)\s*,)*\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)\s*\)", re.IGNORECASE)
+
+
+class QueryStats:
+    __slots__ = ("statements", "seconds", "shapes")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.statements += 1
+        self.seconds += seconds
+        self.shapes[statement] += 1
+
+    @property
+    def max_repeats(self) -> int:
+        return max(self.shapes.values(), default=0)
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statement shapes run at least `threshold` times, most frequent first."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+# Stats opened by `assert_query_budget`; they see statements from every thread
+_collectors: list[QueryStats] = []
+
+
+def shape(statement: str) -> str:
+    """The statement with IN-lists of any length collapsed, so per-row queries share one shape."""
+    return _IN_LIST.sub("IN (...)", statement)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None or _collectors:
+        conn.info.setdefault("query_stats_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None and not _collectors:
+        return
+    started = conn.info.get("query_stats_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    key = shape(statement)
+    if stats is not None:
+        stats.record(key, elapsed)
+    for collector in _collectors:
+        collector.record(key, elapsed)
+
+
+def instrument(engine):
+    """Counts the statements of `engine` (a sync engine, or an async engine's `sync_engine`) too."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+for _engine in (db.engine, db.async_engine.sync_engine):
+    instrument(_engine)
+
+
+def current() -> QueryStats | None:
+    """Stats of the request being served, if any."""
+    return _current.get()
+
+
+def begin_request() -> tuple[QueryStats, Token | None]:
+    """Stats for a request, shared with any middleware that already opened them; pass the token to `end_request`."""
+    stats = _current.get()
+    if stats is not None:
+        return stats, None
+    stats = QueryStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token: Token | None):
+    if token is not None:
+        _current.reset(token)
+
+
+class QueryStatsMiddleware:
+    def __init__(self, app, headers: bool = True, n_plus_one_threshold: int = 10):
+        self.app = app
+        self.headers = headers
+        self.threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats, token = begin_request()
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                if self.headers:
+                    message["headers"] = [
+                        *message.get("headers", ()),
+                        (b"x-db-statements", str(stats.statements).encode()),
+                        (b"x-db-time-ms", f"{stats.seconds * 1000:.2f}".encode()),
+                        (b"x-db-max-repeats", str(stats.max_repeats).encode()),
+                    ]
+                self._report(scope, stats)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            end_request(token)
+
+    def _report(self, scope, stats: QueryStats):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "%s %s: %d statements, %.2f ms in the database",
+                scope["method"], scope["path"], stats.statements, stats.seconds * 1000,
+            )
+        if self.threshold and stats.max_repeats >= self.threshold:
+            shape_text, count = stats.repeated(self.threshold)[0]
+            logger.warning(
+                "Possible N+1 on %s %s: %d of %d statements are %s",
+                scope["method"], scope["path"], count, stats.statements, shape_text[:300],
+            )
+
+
+@contextmanager
+def assert_query_budget(max_statements: int, max_repeats: int | None = None):
+    """
+    Fails with AssertionError when the block runs more than `max_statements`
+    statements, or any one statement shape more than `max_repeats` times.
+    Counts statements from every thread, including a TestClient's app thread.
+    """
+    stats = QueryStats()
+    _collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors.remove(stats)
+    problems = []
+    if stats.statements > max_statements:
+        problems.append(f"{stats.statements} statements (budget {max_statements})")
+    if max_repeats is not None and stats.max_repeats > max_repeats:
+        problems.append(f"a statement repeated {stats.max_repeats} times (budget {max_repeats})")
+    if problems:
+        top = "\n".join(f"  {count}x {shape_text[:200]}" for shape_text, count in stats.shapes.most_common(5))
+        raise AssertionError(f"Query budget exceeded: {'; '.join(problems)}\n{top}")
@@ -0,0 +1,386 @@
+"""
+Read-replica routing for the public read endpoints.
+
+DATABASE_REPLICA_URLS lists replicas of DATABASE_URL. Endpoints that only read
+depend on `get_read_db` / `get_async_read_db` instead of `get_db` /
+`get_async_db`, and their session is bound to the next healthy replica in
+round-robin order. It is bound to the primary instead when:
+
+- no replica is configured, or none is healthy. A background task started
+  from the app lifespan probes every replica each REPLICA_HEALTH_CHECK_SECONDS
+  with `SELECT 1` and, on Postgres, the replay lag. A replica that fails, times
+  out or lags more than REPLICA_MAX_LAG_SECONDS is skipped until a later probe
+  passes;
+- the client wrote within the last REPLICA_STICKY_SECONDS, or
+  REPLICA_MAX_LAG_SECONDS if that is longer (read-your-writes).
+  `ReadYourWritesMiddleware` notices INSERT/UPDATE/DELETE statements sent to
+  the primary while it serves a request, remembers the client's
+  `Authorization` header in this worker and sets a `db_primary_until` cookie,
+  which carries the deadline to the other workers.
+
+`RoutingSession` picks the replica on the session's first query, so a
+response served from the hot cache costs no connection. A request that cannot
+connect to its replica fails, and the replica is skipped until the next
+probe. Read sessions refuse to flush changes, so a write that slips into a
+read endpoint fails loudly instead of landing on a replica.
+
+Routing can be tried with two local databases and no replication at all:
+create the schema in both and point DATABASE_REPLICA_URLS at the second one.
+Reads then show the second database's rows until the client writes, and
+`/health/replicas` shows the probe results.
+"""
+import asyncio
+import itertools
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.datastructures import Headers
+from starlette.requests import cookie_parser
+
+from . import db, query_stats
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = "db_primary_until"
+
+_WRITE = re.compile(r"\s*(INSERT|UPDATE|DELETE|MERGE|COPY)\b", re.IGNORECASE)
+
+# Seconds the replica is behind; 0 when it has replayed everything it received
+_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class _RoutingState:
+    """Per-request routing facts, shared (not copied) with sync endpoints in the threadpool."""
+
+    __slots__ = ("sticky", "wrote", "replica")
+
+    def __init__(self, sticky: bool):
+        self.sticky = sticky
+        self.wrote = False
+        self.replica: str | None = None
+
+
+_state: ContextVar[_RoutingState | None] = ContextVar("replica_routing", default=None)
+
+
+def served_by_replica() -> bool:
+    """True when the request being served reads from a replica."""
+    state = _state.get()
+    return state is not None and state.replica is not None
+
+
+def _note_write(conn, cursor, statement, parameters, context, executemany):
+    state = _state.get()
+    if state is not None and not state.wrote and _WRITE.match(statement):
+        state.wrote = True
+
+
+def _connect_args(url, is_async: bool) -> dict:
+    """Pool options for a replica, with a connect timeout so a dead host fails fast."""
+    options = db.engine_options(url, is_async=is_async)
+    if make_url(url).get_backend_name() == "postgresql":
+        timeout = settings.REPLICA_CONNECT_TIMEOUT_SECONDS
+        connect_args = dict(options.get("connect_args", {}))
+        if is_async:
+            connect_args["timeout"] = timeout
+        else:
+            connect_args["connect_timeout"] = max(1, math.ceil(timeout))
+        options["connect_args"] = connect_args
+    return options
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = make_url(url)
+        self.engine = create_engine(url, **_connect_args(url, is_async=False))
+        self.async_engine = create_async_engine(db.to_async_url(url), **_connect_args(url, is_async=True))
+        self.down_until = 0.0
+        self.lag_seconds: float | None = None
+        self.last_error: str | None = None
+        self.checked_at: float | None = None
+        for engine in (self.engine, self.async_engine.sync_engine):
+            query_stats.instrument(engine)
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self, reason: str, seconds: float):
+        if self.available():
+            logger.warning("Replica %s taken out of rotation: %s", self.name, reason)
+        self.down_until = time.monotonic() + seconds
+        self.last_error = reason
+
+    def mark_up(self):
+        if not self.available():
+            logger.info("Replica %s back in rotation", self.name)
+        self.down_until = 0.0
+        self.last_error = None
+
+    def status(self) -> dict:
+        pools = {}
+        for kind, pool in (("sync", self.engine.pool), ("async", self.async_engine.sync_engine.pool)):
+            if isinstance(pool, db.InstrumentedPoolMixin):
+                pools[kind] = pool.stats.snapshot(pool)
+        return {
+            "url": self.url.render_as_string(hide_password=True),
+            "healthy": self.available(),
+            "lag_seconds": self.lag_seconds,
+            "last_error": self.last_error,
+            "seconds_since_check": None if self.checked_at is None else round(time.monotonic() - self.checked_at, 3),
+            "pools": pools,
+        }
+
+
+class ReplicaRouter:
+    def __init__(
+        self, urls: list[str], check_seconds: float, connect_timeout_seconds: float,
+        max_lag_seconds: float, sticky_seconds: float, sticky_max_clients: int,
+    ):
+        self.replicas = [Replica(f"replica{n}", url) for n, url in enumerate(urls)]
+        self.check_seconds = check_seconds
+        self.connect_timeout_seconds = connect_timeout_seconds
+        self.max_lag_seconds = max_lag_seconds
+        # A healthy replica may be up to max_lag_seconds behind, so a writer stays
+        # on the primary at least that long or could miss their own write
+        self.sticky_seconds = max(sticky_seconds, max_lag_seconds)
+        self.sticky_max_clients = sticky_max_clients
+        self._turn = itertools.count()
+        self._writers: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def pick(self) -> Replica | None:
+        """The next healthy replica for this request, or None to read from the primary."""
+        state = _state.get()
+        if not self.replicas or (state is not None and state.sticky):
+            return None
+        healthy = [replica for replica in self.replicas if replica.available()]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def routed(self, replica: Replica):
+        state = _state.get()
+        if state is not None:
+            state.replica = replica.name
+
+    def connect_failed(self, replica: Replica, error: BaseException):
+        # Retried by the next probe, or after one interval when probes are not running
+        replica.mark_down(f"connect failed: {error!r}"[:300], self.check_seconds)
+
+    # --- Read-your-writes ---
+
+    def is_sticky(self, client: str | None, cookie: str | None) -> bool:
+        if cookie:
+            try:
+                until = float(cookie_parser(cookie).get(STICKY_COOKIE, 0))
+            except ValueError:
+                until = 0
+            # A forged far-future deadline only pins that client to the primary for one window
+            if time.time() < until <= time.time() + self.sticky_seconds:
+                return True
+        if client:
+            with self._lock:
+                until = self._writers.get(client)
+            return until is not None and time.monotonic() < until
+        return False
+
+    def wrote(self, client: str | None) -> float:
+        """Pins the client to the primary for the sticky window; returns the deadline for the cookie."""
+        if client:
+            with self._lock:
+                self._writers[client] = time.monotonic() + self.sticky_seconds
+                self._writers.move_to_end(client)
+                while len(self._writers) > self.sticky_max_clients:
+                    self._writers.popitem(last=False)
+        return time.time() + self.sticky_seconds
+
+    # --- Health checks ---
+
+    async def _probe(self, replica: Replica) -> float:
+        async with replica.async_engine.connect() as connection:
+            if connection.dialect.name == "postgresql":
+                return float(await connection.scalar(_LAG_QUERY))
+            await connection.execute(text("SELECT 1"))
+            return 0.0
+
+    async def check(self, replica: Replica):
+        try:
+            lag = await asyncio.wait_for(self._probe(replica), timeout=self.connect_timeout_seconds)
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            replica.lag_seconds = None
+            replica.mark_down(f"health check failed: {error!r}"[:300], self.check_seconds)
+        else:
+            replica.lag_seconds = lag
+            if self.max_lag_seconds and lag > self.max_lag_seconds:
+                replica.mark_down(f"replication lag {lag:.1f}s", self.check_seconds)
+            else:
+                replica.mark_up()
+        replica.checked_at = time.monotonic()
+
+    async def _run(self):
+        while True:
+            await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+            await asyncio.sleep(self.check_seconds)
+
+    def start(self):
+        if self.replicas:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        """Stops the health checks and closes the replica pools."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.async_engine.dispose()
+            replica.engine.dispose()
+
+    def status(self) -> dict:
+        return {
+            "sticky_seconds": self.sticky_seconds,
+            "replicas": {replica.name: replica.status() for replica in self.replicas},
+        }
+
+
+replica_router = ReplicaRouter(
+    urls=[url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()],
+    check_seconds=settings.REPLICA_HEALTH_CHECK_SECONDS,
+    connect_timeout_seconds=settings.REPLICA_CONNECT_TIMEOUT_SECONDS,
+    max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+    sticky_seconds=settings.REPLICA_STICKY_SECONDS,
+    sticky_max_clients=settings.REPLICA_STICKY_MAX_CLIENTS,
+)
+
+if replica_router.enabled:
+    for _engine in (db.engine, db.async_engine.sync_engine):
+        event.listen(_engine, "before_cursor_execute", _note_write)
+
+class RoutingSession(Session):
+    """Binds to the replica picked on the first query, or to the primary; never writes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.routed = False
+        self.replica: Replica | None = None
+        self.connected = False
+
+    def _engine(self, replica: Replica | None):
+        return db.engine if replica is None else replica.engine
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not self.routed:
+            # Picked lazily, so a request served from the hot cache never checks out a connection
+            self.replica = replica_router.pick()
+            self.routed = True
+            if self.replica is not None:
+                replica_router.routed(self.replica)
+        return self._engine(self.replica)
+
+
+class AsyncRoutingSession(RoutingSession):
+    def _engine(self, replica: Replica | None):
+        return (db.async_engine if replica is None else replica.async_engine).sync_engine
+
+
+@event.listens_for(RoutingSession, "after_begin")
+def _mark_connected(session, transaction, connection):
+    session.connected = True
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _refuse_writes(session, flush_context, instances):
+    if session.new or session.dirty or session.deleted:
+        raise exc.InvalidRequestError("Read sessions cannot write; use get_db / get_async_db")
+
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+AsyncReadSessionLocal = async_sessionmaker(
+    class_=AsyncSession, sync_session_class=AsyncRoutingSession, autoflush=False, expire_on_commit=False,
+)
+
+
+def _connect_failed(session: RoutingSession, error: BaseException):
+    """Takes the session's replica out of rotation when it could not even connect."""
+    if session.replica is not None and not session.connected and isinstance(
+        error, (exc.DBAPIError, OSError, asyncio.TimeoutError)
+    ):
+        replica_router.connect_failed(session.replica, error)
+
+
+def get_read_db():
+    """`get_db` for endpoints that only read: a healthy replica when one is configured, else the primary."""
+    db_session = ReadSessionLocal()
+    try:
+        yield db_session
+    except Exception as error:
+        _connect_failed(db_session, error)
+        raise
+    finally:
+        db_session.close()
+
+
+async def get_async_read_db():
+    """Async counterpart of `get_read_db`."""
+    async with AsyncReadSessionLocal() as db_session:
+        try:
+            yield db_session
+        except Exception as error:
+            _connect_failed(db_session.sync_session, error)
+            raise
+
+
+class ReadYourWritesMiddleware:
+    """Routes a client's reads to the primary for the sticky window after it writes."""
+
+    def __init__(self, app, router: ReplicaRouter):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        client = headers.get("authorization")
+        state = _RoutingState(sticky=self.router.is_sticky(client, headers.get("cookie")))
+        token = _state.set(state)
+
+        async def send_marking_writes(message):
+            if message["type"] == "http.response.start" and state.wrote:
+                until = self.router.wrote(client)
+                cookie = (
+                    f"{STICKY_COOKIE}={until:.3f}; Max-Age={math.ceil(self.router.sticky_seconds)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = [*message.get("headers", ()), (b"set-cookie", cookie.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_marking_writes)
+        finally:
+            _state.reset(token)
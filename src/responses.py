@@ -0,0 +1,237 @@
+"""
+JSON rendering and the pre-compressed cache for hot public payloads.
+
+`FastJSONResponse` is the app's default response class. It renders through the
+encoder chosen by the JSON_ENCODER setting: "orjson" when installed ("auto"
+prefers it), "pydantic" (pydantic-core's Rust encoder, always available) or
+"stdlib".
+
+`hot_responses` keeps serialized bodies of public, read-mostly endpoints along
+with their gzip/brotli variants, so a repeated request skips the query,
+serialization and compression. Entries live for HOT_CACHE_TTL_SECONDS, which
+bounds staleness from writes made by other workers. ORM writes in this process
+drop the affected namespace when their transaction commits; writes made with
+Core statements must call `hot_responses.invalidate` themselves. A miss
+notes the namespace's generation before the query runs and `put` keeps the
+body only if no invalidation happened since, so a read that overlapped a
+write cannot cache the rows it saw before the commit. A body read
+from a replica within the read-your-writes window of an invalidation (the
+longer of REPLICA_STICKY_SECONDS and REPLICA_MAX_LAG_SECONDS) may predate the
+write, so it is served but not kept.
+"""
+import datetime
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import pydantic_core
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .appointment import models as appointment_models
+from .compression import compress, negotiate_encoding
+from .config import settings
+from .metrics import add_phase
+from .pharmacy import models as pharmacy_models
+from .profiles import models as profile_models
+from .replicas import replica_router, served_by_replica
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to pydantic-core
+    orjson = None
+
+
+def _plain(value):
+    # Responses reach the encoder already made JSON-safe; projected rows (see
+    # projection.py) carry the database's date/time values
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(content) -> bytes:
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_plain).encode("utf-8")
+
+
+JSON_ENCODERS = {
+    "pydantic": pydantic_core.to_json,
+    "stdlib": _stdlib_dumps,
+}
+if orjson is not None:
+    JSON_ENCODERS["orjson"] = orjson.dumps
+
+
+def select_json_encoder(name: str):
+    if name == "auto":
+        name = "orjson" if orjson is not None else "pydantic"
+    if name not in JSON_ENCODERS:
+        raise ValueError(f"Unknown or unavailable JSON encoder {name!r}; choose from {sorted(JSON_ENCODERS)}")
+    return JSON_ENCODERS[name]
+
+
+dump_json = select_json_encoder(settings.JSON_ENCODER)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        body = dump_json(content)
+        add_phase("serialization", time.perf_counter() - started)
+        return body
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_type) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def serialize(response_type, value) -> bytes:
+    """Validates ORM objects against `response_type` and renders them like a response_model would."""
+    started = time.perf_counter()
+    adapter = _adapter(response_type)
+    body = dump_json(adapter.dump_python(adapter.validate_python(value, from_attributes=True), mode="json", by_alias=True))
+    add_phase("serialization", time.perf_counter() - started)
+    return body
+
+
+class _CachedPayload:
+    __slots__ = ("body", "headers", "generation", "expires_at", "encoded")
+
+    def __init__(self, body: bytes, headers: dict, generation: int, expires_at: float):
+        self.body = body
+        self.headers = headers
+        self.generation = generation
+        self.expires_at = expires_at
+        self.encoded: dict[str, bytes] = {}
+
+
+def _miss_generations(request: Request) -> dict[str, int]:
+    """Namespace generations noted by this request's cache misses."""
+    generations = getattr(request.state, "hot_cache_generations", None)
+    if generations is None:
+        generations = request.state.hot_cache_generations = {}
+    return generations
+
+
+class HotResponseCache:
+    def __init__(self, ttl_seconds: float, max_entries: int, minimum_size: int, gzip_level: int, brotli_quality: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+        self._entries: OrderedDict[tuple, _CachedPayload] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._invalidated_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(request: Request, namespace: str) -> tuple:
+        return namespace, request.url.path, tuple(sorted(request.query_params.multi_items()))
+
+    def get(self, request: Request, namespace: str) -> Response | None:
+        """The cached response, or None after noting the generation the caller's query will read."""
+        if self.ttl_seconds <= 0:
+            return None
+        key = self._key(request, namespace)
+        with self._lock:
+            generation = self._generations.get(namespace, 0)
+            payload = self._entries.get(key)
+            if payload is not None and (payload.expires_at < time.monotonic() or payload.generation != generation):
+                del self._entries[key]
+                payload = None
+            if payload is None:
+                _miss_generations(request)[namespace] = generation
+                return None
+            self._entries.move_to_end(key)
+        return self._respond(request, payload, "HIT")
+
+    def put(self, request: Request, namespace: str, body: bytes, headers: dict | None = None) -> Response:
+        """Responds with `body`, caching it unless `namespace` was invalidated since this request's `get`."""
+        with self._lock:
+            generation = _miss_generations(request).pop(namespace, None)
+            payload = _CachedPayload(body, headers or {}, generation, time.monotonic() + self.ttl_seconds)
+            replica_may_lag = served_by_replica() and (
+                time.monotonic() - self._invalidated_at.get(namespace, float("-inf")) < replica_router.sticky_seconds
+            )
+            current = generation is not None and generation == self._generations.get(namespace, 0)
+            cached = self.ttl_seconds > 0 and current and not replica_may_lag
+            if cached:
+                self._entries[self._key(request, namespace)] = payload
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        if not cached:
+            # Served once; CompressionMiddleware encodes it like any other response
+            headers = {**payload.headers, "X-Cache": "MISS"}
+            return Response(content=payload.body, media_type="application/json", headers=headers)
+        return self._respond(request, payload, "MISS")
+
+    def invalidate(self, *namespaces: str):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+                self._invalidated_at[namespace] = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _respond(self, request: Request, payload: _CachedPayload, status: str) -> Response:
+        headers = {**payload.headers, "X-Cache": status, "Vary": "Accept-Encoding"}
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is None or len(payload.body) < self.minimum_size:
+            return Response(content=payload.body, media_type="application/json", headers=headers)
+        encoded = payload.encoded.get(encoding)
+        if encoded is None:
+            # Compressed once per entry and encoding, at the configured levels: this
+            # runs on the event loop, and higher levels cost far more than they save
+            encoded = payload.encoded.setdefault(encoding, compress(payload.body, encoding, self.levels[encoding]))
+        headers["Content-Encoding"] = encoding
+        return Response(content=encoded, media_type="application/json", headers=headers)
+
+
+hot_responses = HotResponseCache(
+    ttl_seconds=settings.HOT_CACHE_TTL_SECONDS,
+    max_entries=settings.HOT_CACHE_MAX_ENTRIES,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+)
+
+
+# --- Invalidation ---
+# Flushed ORM changes mark the namespaces they affect; they are dropped once
+# the transaction commits, which also stops reads that started before the
+# commit from caching what they saw (see HotResponseCache.put).
+
+_NAMESPACES_BY_MODEL = {
+    pharmacy_models.Pharmacy: ("pharmacies",),
+    pharmacy_models.Medicine: ("pharmacies",),
+    appointment_models.Appointment: ("appointments",),
+    profile_models.Doctor: ("appointments",),
+}
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_hot_namespaces(session, flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        namespaces = _NAMESPACES_BY_MODEL.get(type(instance))
+        if namespaces:
+            session.info.setdefault("hot_namespaces", set()).update(namespaces)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_hot_namespaces(session):
+    namespaces = session.info.pop("hot_namespaces", None)
+    if namespaces:
+        hot_responses.invalidate(*namespaces)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_hot_namespaces(session):
+    session.info.pop("hot_namespaces", None)
@@ -0,0 +1,209 @@
+"""
+Data-driven symptom checker.
+
+A rules file (see rules/default.json) declares the questionnaire and the
+triage rules. Every answer is reduced to named findings: a yes to a boolean
+question (`fever`), a chosen option (`duration.over_2_weeks`) or a numeric
+answer falling in a declared band (`temperature_c.high`, bands are
+`[min, max)` with null for open ends). Each finding gets one bit, so a whole
+questionnaire becomes one integer.
+
+Rules are compiled to masks:
+
+- `all`: findings that must all be present;
+- `none`: findings that must all be absent;
+- `any` (+ `min_any`, default 1) and each entry of `groups`: at least that
+  many of the listed findings must be present.
+
+Evaluating a rule is a couple of ANDs and a popcount. Rules are tried in
+severity order (the file's `severities`, most severe first, then file order);
+the first match supplies the assessment and every match is reported. Results
+are memoized per answer bitmask, so the identical questionnaires that make up
+most of a camp's batch are evaluated once.
+"""
+import datetime
+import functools
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_RULES_PATH = Path(__file__).parent / "rules" / "default.json"
+
+
+@dataclass(frozen=True)
+class Assessment:
+    severity: str
+    assessment: str
+    advice: str
+    specialization: str | None
+    matched_rules: tuple[str, ...]
+    findings: tuple[str, ...]
+    rules_version: str
+
+
+@dataclass(frozen=True)
+class _Rule:
+    id: str
+    rank: int
+    all_mask: int
+    none_mask: int
+    groups: tuple[tuple[int, int], ...]  # (mask, minimum present)
+    assessment: str
+    advice: str
+    specialization: str | None
+
+
+class RuleEngine:
+    def __init__(self, definition: dict, memo_size: int = 4096):
+        self.version = str(definition.get("version", "unversioned"))
+        self.questions = definition["questions"]
+        self.severities = list(definition["severities"])
+        self._bits: dict[str, int] = {}
+        self._encoders = {}
+        for question in self.questions:
+            self._compile_question(question)
+        self._features = sorted(self._bits, key=self._bits.get)
+
+        rank = {severity: index for index, severity in enumerate(self.severities)}
+        rules = []
+        for order, rule in enumerate(definition["rules"]):
+            if rule["severity"] not in rank:
+                raise ValueError(f"Rule {rule['id']!r} has unknown severity {rule['severity']!r}")
+            groups = []
+            if rule.get("any"):
+                groups.append((self._mask(rule["id"], rule["any"]), rule.get("min_any", 1)))
+            for group in rule.get("groups", ()):
+                groups.append((self._mask(rule["id"], group["any"]), group.get("min", 1)))
+            rules.append((rank[rule["severity"]], order, _Rule(
+                id=rule["id"],
+                rank=rank[rule["severity"]],
+                all_mask=self._mask(rule["id"], rule.get("all", ())),
+                none_mask=self._mask(rule["id"], rule.get("none", ())),
+                groups=tuple(groups),
+                assessment=rule["assessment"],
+                advice=rule["advice"],
+                specialization=rule.get("specialization"),
+            )))
+        self._rules = tuple(rule for _, _, rule in sorted(rules, key=lambda item: item[:2]))
+        self._default = definition["default"]
+        self.evaluate_bits = functools.lru_cache(maxsize=memo_size)(self._evaluate_bits)
+
+    @classmethod
+    def from_file(cls, path=None, memo_size: int = 4096) -> "RuleEngine":
+        with open(path or DEFAULT_RULES_PATH, encoding="utf-8") as handle:
+            return cls(json.load(handle), memo_size=memo_size)
+
+    # --- Compilation ---
+
+    def _feature(self, name: str) -> int:
+        if name in self._bits:
+            raise ValueError(f"Duplicate finding {name!r}")
+        self._bits[name] = bit = 1 << len(self._bits)
+        return bit
+
+    def _compile_question(self, question: dict):
+        qid = question["id"]
+        kind = question.get("type", "boolean")
+        if kind == "boolean":
+            bit = self._feature(qid)
+            self._encoders[qid] = lambda value: bit if value is True else 0 if value in (False, None) else _invalid(qid, value)
+        elif kind == "choice":
+            options = {option: self._feature(f"{qid}.{option}") for option in question["options"]}
+            self._encoders[qid] = lambda value: (
+                0 if value is None else isinstance(value, str) and options.get(value) or _invalid(qid, value)
+            )
+        elif kind == "number":
+            bands = [
+                (self._feature(f"{qid}.{name}"), low, high) for name, (low, high) in question.get("bands", {}).items()
+            ]
+
+            def encode_number(value, bands=bands, qid=qid):
+                if value is None:
+                    return 0
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    _invalid(qid, value)
+                bits = 0
+                for bit, low, high in bands:
+                    if (low is None or value >= low) and (high is None or value < high):
+                        bits |= bit
+                return bits
+
+            self._encoders[qid] = encode_number
+        else:
+            raise ValueError(f"Question {qid!r} has unknown type {kind!r}")
+
+    def _mask(self, rule_id: str, names) -> int:
+        mask = 0
+        for name in names:
+            if name not in self._bits:
+                raise ValueError(f"Rule {rule_id!r} refers to unknown finding {name!r}")
+            mask |= self._bits[name]
+        return mask
+
+    # --- Evaluation ---
+
+    def encode(self, answers: dict) -> int:
+        """Answer dict -> findings bitmask. Raises ValueError on unknown questions or invalid values."""
+        bits = 0
+        for qid, value in answers.items():
+            encoder = self._encoders.get(qid)
+            if encoder is None:
+                raise ValueError(f"Unknown question {qid!r}")
+            bits |= encoder(value)
+        return bits
+
+    def _evaluate_bits(self, bits: int) -> Assessment:
+        matched = [
+            rule for rule in self._rules
+            if bits & rule.all_mask == rule.all_mask
+            and not bits & rule.none_mask
+            and all((bits & mask).bit_count() >= minimum for mask, minimum in rule.groups)
+        ]
+        findings = tuple(name for name in self._features if bits & self._bits[name])
+        if matched:
+            primary = matched[0]
+            return Assessment(
+                severity=self.severities[primary.rank],
+                assessment=primary.assessment,
+                advice=primary.advice,
+                specialization=primary.specialization,
+                matched_rules=tuple(rule.id for rule in matched),
+                findings=findings,
+                rules_version=self.version,
+            )
+        return Assessment(
+            severity=self._default["severity"],
+            assessment=self._default["assessment"],
+            advice=self._default["advice"],
+            specialization=self._default.get("specialization"),
+            matched_rules=(),
+            findings=findings,
+            rules_version=self.version,
+        )
+
+    def assess(self, answers: dict) -> Assessment:
+        return self.evaluate_bits(self.encode(answers))
+
+    def assess_many(self, answer_sets) -> list[Assessment | ValueError]:
+        """Evaluates a batch; invalid answer sets yield their ValueError in place of a result."""
+        results = []
+        for answers in answer_sets:
+            try:
+                results.append(self.evaluate_bits(self.encode(answers)))
+            except ValueError as exc:
+                results.append(exc)
+        return results
+
+
+def _invalid(qid, value):
+    raise ValueError(f"Invalid answer {value!r} for {qid!r}")
+
+
+def report(assessment: Assessment, assessed_at: datetime.datetime) -> str:
+    """One-paragraph summary stored on the patient's next appointment for the doctor."""
+    findings = ", ".join(finding.replace("_", " ") for finding in assessment.findings) or "none reported"
+    rules = ", ".join(assessment.matched_rules) or "none"
+    return (
+        f"[{assessment.severity.upper()}] {assessment.assessment}. Findings: {findings}. "
+        f"Rules: {rules} (v{assessment.rules_version}). Assessed {assessed_at:%Y-%m-%d %H:%M} UTC."
+    )
@@ -0,0 +1,146 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from . import schemas
+from .engine import RuleEngine, report
+from .. import db
+from ..db import utcnow
+from ..appointment import models as appointment_models
+from ..auth.dependencies import role_checker
+from ..auth.principal import Principal
+from ..config import settings
+from ..profiles import models as profile_models
+
+router = APIRouter()
+
+symptom_engine = RuleEngine.from_file(settings.SYMPTOM_RULES_PATH, memo_size=settings.SYMPTOM_MEMO_SIZE)
+
+
+def _patient_ids(db: Session, current_user: Principal, requests) -> list[int | None]:
+    """Whose record each assessment belongs to; ASHA workers may only file for patients they manage."""
+    if current_user.role == "patient":
+        return [current_user.patient_id if request.attach_to_appointment else None for request in requests]
+    if current_user.role != "asha_worker":
+        return [None] * len(requests)
+    requested = {request.patient_profile_id for request in requests if request.patient_profile_id}
+    managed = set()
+    if requested:
+        managed = {patient_id for (patient_id,) in db.query(profile_models.Patient.patient_id).filter(
+            profile_models.Patient.patient_id.in_(requested),
+            profile_models.Patient.managed_by_asha_id == current_user.asha_worker_id,
+        )}
+    if requested - managed:
+        raise HTTPException(status_code=403, detail="Patient is not managed by this ASHA worker")
+    return [request.patient_profile_id if request.attach_to_appointment else None for request in requests]
+
+
+def _attach_reports(db: Session, reports: dict[int, str]) -> dict[int, int]:
+    """Stores each patient's report on their next booked appointment; returns patient id -> appointment id."""
+    if not reports:
+        return {}
+    Appointment = appointment_models.Appointment
+    upcoming = db.query(Appointment).filter(
+        Appointment.patient_profile_id.in_(reports),
+        Appointment.status == "booked",
+        Appointment.appointment_datetime >= utcnow(),
+    ).order_by(Appointment.patient_profile_id, Appointment.appointment_datetime, Appointment.id).all()
+    attached = {}
+    for appointment in upcoming:
+        if appointment.patient_profile_id not in attached:
+            appointment.triage_report = reports[appointment.patient_profile_id]
+            attached[appointment.patient_profile_id] = appointment.id
+    db.commit()
+    return attached
+
+
+def _result(assessment, text, appointment_id=None) -> dict:
+    return {
+        "severity": assessment.severity,
+        "assessment": assessment.assessment,
+        "advice": assessment.advice,
+        "specialization": assessment.specialization,
+        "matched_rules": list(assessment.matched_rules),
+        "findings": list(assessment.findings),
+        "rules_version": assessment.rules_version,
+        "report": text,
+        "appointment_id": appointment_id,
+    }
+
+
+@router.get("/questionnaire", response_model=schemas.Questionnaire)
+def get_questionnaire(
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient", "asha_worker", "doctor"]))
+):
+    """The questions the rule engine understands, with their ids, types, options and bands."""
+    return {"version": symptom_engine.version, "severities": symptom_engine.severities, "questions": symptom_engine.questions}
+
+
+@router.post("/assess", response_model=schemas.AssessmentResult)
+def assess_symptoms(
+    payload: schemas.AssessmentRequest,
+    db: Session = Depends(db.get_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient", "asha_worker", "doctor"]))
+):
+    """
+    Triage for one questionnaire.
+    - Patients' (and ASHA workers' for `patient_profile_id`) reports are attached to the
+      patient's next booked appointment, so the doctor sees them before the call.
+    """
+    try:
+        assessment = symptom_engine.assess(payload.answers)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc))
+    text = report(assessment, utcnow())
+    patient_id = _patient_ids(db, current_user, [payload])[0]
+    attached = _attach_reports(db, {patient_id: text} if patient_id else {})
+    return _result(assessment, text, attached.get(patient_id))
+
+
+@router.post("/assess/batch", response_model=List[schemas.BatchAssessmentItem])
+def assess_symptoms_batch(
+    payload: List[schemas.AssessmentRequest],
+    db: Session = Depends(db.get_db),
+    current_user: Principal = Depends(role_checker(allowed_roles=["asha_worker", "doctor"]))
+):
+    """
+    Triage for many questionnaires at once, e.g. an ASHA worker's camp.
+    - Invalid answer sets are reported per item and do not fail the batch.
+    - Reports for `patient_profile_id`s are attached to their next booked appointments in one transaction;
+      when one patient appears several times, the last assessment wins.
+    """
+    if len(payload) > settings.SYMPTOM_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.SYMPTOM_BATCH_MAX} assessments can be submitted at once",
+        )
+    patient_ids = _patient_ids(db, current_user, payload)
+    assessed_at = utcnow()
+    outcomes = symptom_engine.assess_many(request.answers for request in payload)
+    reports, texts = {}, []
+    for outcome, patient_id in zip(outcomes, patient_ids):
+        text = None if isinstance(outcome, ValueError) else report(outcome, assessed_at)
+        texts.append(text)
+        if text and patient_id:
+            reports[patient_id] = text
+    attached = _attach_reports(db, reports)
+
+    items = []
+    for index, (outcome, text, patient_id) in enumerate(zip(outcomes, texts, patient_ids)):
+        if isinstance(outcome, ValueError):
+            items.append({"index": index, "error": str(outcome)})
+        else:
+            appointment_id = attached.get(patient_id) if reports.get(patient_id) == text else None
+            items.append({"index": index, "result": _result(outcome, text, appointment_id)})
+    return items
+
+
+@router.post("/check")
+def check_symptoms(
+    payload: schemas.SymptomInput,
+    current_user: Principal = Depends(role_checker(allowed_roles=["patient", "asha_worker", "doctor"]))
+):
+    """The original three-question check, now answered by the rule engine."""
+    assessment = symptom_engine.assess(payload.model_dump())
+    return {"assessment": assessment.assessment, "advice": assessment.advice}
@@ -0,0 +1,44 @@
+from pydantic import BaseModel
+
+Answer = bool | int | float | str | None
+
+
+class SymptomInput(BaseModel):
+    """The original three-question form, kept for existing clients of /check."""
+    fever: bool | None = None
+    cough: bool | None = None
+    sore_throat: bool | None = None
+
+
+class AssessmentRequest(BaseModel):
+    """Answers keyed by question id (see GET /symptom-checker/questionnaire)."""
+    answers: dict[str, Answer]
+    # ASHA workers: the managed patient the answers are for
+    patient_profile_id: int | None = None
+    # Store the report on the patient's next booked appointment
+    attach_to_appointment: bool = True
+
+
+class AssessmentResult(BaseModel):
+    severity: str
+    assessment: str
+    advice: str
+    specialization: str | None = None
+    matched_rules: list[str]
+    findings: list[str]
+    rules_version: str
+    report: str
+    # The appointment the report was attached to, if any
+    appointment_id: int | None = None
+
+
+class BatchAssessmentItem(BaseModel):
+    index: int
+    result: AssessmentResult | None = None
+    error: str | None = None
+
+
+class Questionnaire(BaseModel):
+    version: str
+    severities: list[str]
+    questions: list[dict]
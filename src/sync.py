@@ -0,0 +1,194 @@
+"""
+Delta sync and conditional GET for a patient's records.
+
+Synced models carry `updated_at` and `version` columns that every UPDATE,
+including Core statements, sets through the column onupdate defaults. Rows
+that leave a patient's view (deleted, or an appointment moved to another
+patient) are recorded as tombstones by the mapper events at the bottom of this
+module, in the same transaction as the change. Bulk `Query.delete()` bypasses
+mapper events and must not be used on synced models.
+
+`updated_at` and `deleted_at` come from the writing worker's clock when the
+statement runs, not when its transaction commits, so a change can become
+visible after a sync has already read past its timestamp. A client therefore
+holds an opaque cursor with a watermark that trails the newest change it saw
+by SYNC_OVERLAP_SECONDS, plus the `(id, version)` of the rows (and the ids of
+the tombstones) it already received above the watermark. Each sync reads
+everything from the watermark on and skips what the cursor lists, so late
+commits and clock skew within the overlap are delivered once, and changes
+older than it are never re-read.
+"""
+import base64
+import datetime
+import json
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, false, func, select, true, union_all
+from sqlalchemy import event, inspect
+from fastapi import Request, Response, status
+
+from . import utils
+from .appointment import models as appointment_models
+from .config import settings
+from .db import Base, utcnow
+from .prescriptions import models as prescription_models
+
+
+class SyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+    __table_args__ = (
+        Index("ix_sync_tombstones_patient_entity_deleted", "patient_id", "entity", "deleted_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String(32), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    patient_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=utcnow)
+
+
+# Synced model -> (entity name, attribute holding the owning patient id)
+SYNCED_MODELS = {
+    appointment_models.Appointment: ("appointment", "patient_profile_id"),
+    prescription_models.Prescription: ("prescription", "patient_id"),
+}
+
+
+# --- Conditional GET ---
+
+async def collection_etag(db, model, patient_id) -> str:
+    """Weak validator for all of a patient's rows of `model`, from one index-only aggregate."""
+    owner = getattr(model, SYNCED_MODELS[model][1])
+    count, latest = (await db.execute(
+        select(func.count(), func.max(model.updated_at)).where(owner == patient_id)
+    )).one()
+    return f'W/"{count}-{latest.isoformat() if latest else 0}"'
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """Returns a 304 response when the request's If-None-Match already holds `etag`."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return None
+    # Weak comparison: W/ prefixes are ignored on both sides
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates or etag.removeprefix("W/") in candidates:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
+
+
+# --- Delta sync ---
+
+def encode_sync_cursor(at: datetime.datetime, seen: dict[int, int], gone: set[int]) -> str:
+    raw = json.dumps({"at": at.isoformat(), "seen": sorted(seen.items()), "gone": sorted(gone)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_sync_cursor(cursor: str) -> tuple[datetime.datetime, dict[int, int], set[int]]:
+    """Watermark, received `id -> version` above it and received tombstone ids. Raises ValueError."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return (
+            datetime.datetime.fromisoformat(state["at"]),
+            {int(entity_id): int(version) for entity_id, version in state["seen"]},
+            {int(tombstone_id) for tombstone_id in state["gone"]},
+        )
+    except (UnicodeDecodeError, ValueError, TypeError, KeyError, AttributeError):
+        # Keyset cursors issued before the overlap window: their position becomes the watermark
+        at, _ = utils.decode_cursor(cursor)
+        return at, {}, set()
+
+
+async def fetch_changes(db, model, patient_id, since: str | None, limit: int, options=()) -> dict:
+    """
+    Returns a patient's rows of `model` changed after the `since` cursor, plus
+    the ids that left their view. Without `since` every row is returned (paged)
+    and no tombstones are needed. An unchanged sync costs a single query.
+    Raises ValueError on a malformed cursor.
+    """
+    entity, owner_attribute = SYNCED_MODELS[model]
+    owner = getattr(model, owner_attribute)
+    since_at, seen, gone = decode_sync_cursor(since) if since else (None, {}, set())
+    now = utcnow()
+
+    changed = select(
+        model.id.label("entity_id"), model.updated_at.label("at"), model.version.label("key"), false().label("deleted")
+    ).where(owner == patient_id)
+    if since_at is not None:
+        changed = changed.where(model.updated_at >= since_at)
+    # Rows the client already has are read again and skipped, so leave room for them
+    changed = changed.order_by(model.updated_at, model.id).limit(limit + len(seen) + 1).subquery()
+    statement = select(changed)
+    if since_at is not None:
+        statement = union_all(statement, select(
+            SyncTombstone.entity_id, SyncTombstone.deleted_at, SyncTombstone.id, true()
+        ).where(
+            SyncTombstone.patient_id == patient_id,
+            SyncTombstone.entity == entity,
+            SyncTombstone.deleted_at >= since_at,
+        ))
+    rows = (await db.execute(statement)).all()
+
+    fetched = sorted((at, entity_id, version) for entity_id, at, version, deleted in rows if not deleted)
+    tombstones = [(at, entity_id, tombstone_id) for entity_id, at, tombstone_id, deleted in rows if deleted]
+    changes = [row for row in fetched if seen.get(row[1]) != row[2]]
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    # Everything visible below the watermark has been delivered; anything
+    # stamped within the overlap may still be committing and is read again
+    watermark = now - datetime.timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+    if has_more:
+        watermark = min(watermark, changes[-1][0])
+    if since_at is not None:
+        watermark = max(watermark, since_at)
+
+    delivered = [row for row in fetched if seen.get(row[1]) == row[2]] + changes
+    next_seen = {entity_id: version for at, entity_id, version in delivered if at >= watermark}
+    if has_more:
+        # Not read this time, so still above the last delivered change
+        fetched_ids = {entity_id for _, entity_id, _ in fetched}
+        next_seen.update((entity_id, version) for entity_id, version in seen.items() if entity_id not in fetched_ids)
+    next_gone = {tombstone_id for at, _, tombstone_id in tombstones if at >= watermark}
+
+    objects = []
+    if changes:
+        result = await db.execute(
+            select(model).options(*options).where(model.id.in_([entity_id for _, entity_id, _ in changes]))
+            .order_by(model.updated_at, model.id)
+        )
+        objects = result.unique().scalars().all()
+
+    return {
+        "changes": objects,
+        "deleted": sorted({entity_id for _, entity_id, tombstone_id in tombstones if tombstone_id not in gone}),
+        "cursor": encode_sync_cursor(watermark, next_seen, next_gone),
+        "has_more": has_more,
+    }
+
+
+# --- Tombstones ---
+
+def _record_tombstone(connection, entity, entity_id, patient_id):
+    connection.execute(SyncTombstone.__table__.insert().values(
+        entity=entity, entity_id=entity_id, patient_id=patient_id, deleted_at=utcnow()
+    ))
+
+
+def _after_delete(mapper, connection, target):
+    entity, owner_attribute = SYNCED_MODELS[mapper.class_]
+    patient_id = getattr(target, owner_attribute)
+    if patient_id is not None:
+        _record_tombstone(connection, entity, target.id, patient_id)
+
+
+def _after_update(mapper, connection, target):
+    entity, owner_attribute = SYNCED_MODELS[mapper.class_]
+    history = inspect(target).attrs[owner_attribute].history
+    for previous_patient_id in history.deleted or ():
+        if previous_patient_id is not None and previous_patient_id != getattr(target, owner_attribute):
+            _record_tombstone(connection, entity, target.id, previous_patient_id)
+
+
+for _model in SYNCED_MODELS:
+    event.listen(_model, "after_delete", _after_delete)
+    event.listen(_model, "after_update", _after_update)
@@ -1,19 +1,158 @@
+import base64
+import contextlib
+import functools
+import itertools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from .config import settings
+from .metrics import add_phase
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@functools.lru_cache(maxsize=None)
+def _crypt_context(rounds: int) -> CryptContext:
+    # Hashes made with any other cost report needs_update, which drives rehash-on-login
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+pwd_context = _crypt_context(settings.BCRYPT_ROUNDS)
+
+# Worker-side entry points; module-level so they can be pickled to the process pool
+def _hash_in_worker(password: str, rounds: int) -> str:
+    return _crypt_context(rounds).hash(password)
+
+def _verify_and_update_in_worker(password: str, hashed_password: str, rounds: int) -> tuple[bool, str | None]:
+    return _crypt_context(rounds).verify_and_update(password, hashed_password)
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the hashing queue is full; surfaced to clients as 503."""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated process pool so hashing never competes with
+    request handling for threadpool threads or the GIL.
+
+    At most `max_pending` hash/verify calls may be queued or running at once;
+    further calls fail fast with PasswordHashingBusy instead of piling up behind
+    a login storm. With `workers=0` bcrypt runs inline on the calling thread.
+
+    Batches go through the pool one worker-sized chunk at a time, taking a slot
+    per password, so a login waits behind at most one chunk of a batch and
+    still gets the quick 503 when the slots run out.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self._free_slots = max_pending
+        self._slots_changed = threading.Condition()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    @contextlib.contextmanager
+    def _admitted(self, count: int = 1, wait: bool = False):
+        """
+        Holds `count` slots, taken together so two waiting batches can never
+        each hold part of what the other needs; without `wait`, raises
+        PasswordHashingBusy unless they are free now.
+        """
+        with self._slots_changed:
+            if wait:
+                self._slots_changed.wait_for(lambda: self._free_slots >= count)
+            elif self._free_slots < count:
+                raise PasswordHashingBusy()
+            self._free_slots -= count
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._slots_changed:
+                self._free_slots += count
+                self._slots_changed.notify_all()
+            add_phase("bcrypt", time.perf_counter() - started)
+
+    def _run(self, fn, *args):
+        with self._admitted():
+            if self.workers <= 0:
+                return fn(*args)
+            return self._get_executor().submit(fn, *args).result()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash_in_worker, password, self.rounds)
+
+    def hash_many(self, passwords: list[str]) -> list[str]:
+        """
+        Hashes a batch in chunks of one password per worker process. The first
+        chunk is admitted like a single call; later ones wait for free slots
+        rather than failing a batch that is already under way.
+        """
+        chunk_size = max(min(self.workers, self.max_pending), 1)
+        hashes = []
+        for start in range(0, len(passwords), chunk_size):
+            chunk = passwords[start:start + chunk_size]
+            with self._admitted(len(chunk), wait=start > 0):
+                if self.workers <= 0:
+                    hashes.extend(_hash_in_worker(password, self.rounds) for password in chunk)
+                else:
+                    hashes.extend(self._get_executor().map(_hash_in_worker, chunk, itertools.repeat(self.rounds)))
+        return hashes
+
+    def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return self._run(_verify_and_update_in_worker, password, hashed_password, self.rounds)
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    rounds=settings.BCRYPT_ROUNDS,
+)
 
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify_and_update(plain_password, hashed_password)[0]
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Verifies a password and returns a replacement hash if the stored one uses an outdated cost."""
+    return password_hasher.verify_and_update(plain_password, hashed_password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
+
+def encode_cursor(position: datetime, row_id: int) -> str:
+    """Encodes a keyset position `(timestamp, id)` as an opaque, URL-safe cursor."""
+    raw = f"{position.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of `encode_cursor`. Raises ValueError on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        position, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(position), int(row_id)
+    except (UnicodeDecodeError, ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc